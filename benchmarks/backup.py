@@ -0,0 +1,87 @@
+"""Writer latency while an online backup copies a busy database.
+
+Fills a scratch SQLite file, keeps one thread committing small inserts the
+way report submissions do, and copies the file with copy_database for each
+step size. pages -1 is the old single-step copy that holds the read lock
+for the whole file; in rollback-journal mode that is what stalls writers:
+
+    python -m benchmarks.backup --rows 60000
+    python -m benchmarks.backup --journal-mode delete --pages -1 256 64
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+from benchmarks.common import scratch_environment, summarize_ms
+
+def seed(path, journal_mode, rows):
+    connection = sqlite3.connect(path)
+    connection.execute(f'PRAGMA journal_mode = {journal_mode}')
+    connection.execute('CREATE TABLE filler (id INTEGER PRIMARY KEY, payload BLOB)')
+    connection.executemany('INSERT INTO filler (payload) VALUES (?)', ((os.urandom(800),) for _ in range(rows)))
+    connection.commit()
+    connection.close()
+
+def measure(path, target, pages, sleep, warmup):
+    """Copy path to target while a writer commits.
+
+    Returns (copy seconds, stats, latencies before, latencies during). A
+    commit counts as during the copy if any part of it overlapped the copy,
+    so a commit the copy held up is counted even though it finishes after.
+    """
+    from src.models.backup import copy_database
+
+    commits = []
+    stop = threading.Event()
+
+    def writer():
+        connection = sqlite3.connect(path, timeout=10, isolation_level=None)
+        while not stop.is_set():
+            started = time.perf_counter()
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute('INSERT INTO filler (payload) VALUES (?)', (b'x' * 100,))
+            connection.execute('COMMIT')
+            commits.append((started, time.perf_counter()))
+            time.sleep(0.002)
+        connection.close()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    time.sleep(warmup)
+    copy_started = time.perf_counter()
+    stats = copy_database(path, target, pages=pages, sleep=sleep)
+    copy_finished = time.perf_counter()
+    # Let a commit blocked by the copy finish before stopping the writer
+    time.sleep(0.05)
+    stop.set()
+    thread.join()
+
+    before = [finished - started for started, finished in commits if finished < copy_started]
+    during = [finished - started for started, finished in commits if finished >= copy_started and started <= copy_finished]
+    return copy_finished - copy_started, stats, before, during
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=60000, help='800-byte rows to seed (about 50 MB at the default)')
+    parser.add_argument('--journal-mode', choices=('wal', 'delete'), nargs='+', default=['wal', 'delete'])
+    parser.add_argument('--pages', type=int, nargs='+', default=[-1, 256, 64], help='pages per step; -1 copies in one step')
+    parser.add_argument('--sleep', type=float, default=0.005, help='seconds between steps')
+    parser.add_argument('--warmup', type=float, default=1.0, help='seconds of writer baseline before each copy')
+    args = parser.parse_args()
+
+    directory = scratch_environment()
+    for journal_mode in args.journal_mode:
+        for pages in args.pages:
+            path = os.path.join(directory, f'{journal_mode}{pages}.db')
+            seed(path, journal_mode, args.rows)
+            elapsed, stats, before, during = measure(path, path + '.copy', pages, args.sleep if pages > 0 else 0, args.warmup)
+            fallback = ' single-step fallback' if stats['single_step'] else ''
+            print(f"{journal_mode:6} pages {pages:5}  copy {elapsed * 1000:6.0f} ms  {stats['steps']:4} steps  "
+                  f"{stats['restarts']} restarts{fallback}")
+            print(f"{'':6} writer before  {summarize_ms(before)}")
+            print(f"{'':6} writer during  {summarize_ms(during)}  ({len(during)} commits)")
+
+if __name__ == '__main__':
+    main()
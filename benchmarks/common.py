@@ -0,0 +1,40 @@
+import json
+import os
+import statistics
+import tempfile
+
+def scratch_environment(regions=(), **overrides):
+    """Point the app at a fresh temporary directory; call before importing src.main.
+
+    regions names extra region shards to create next to the primary
+    database. Returns the directory.
+    """
+    directory = tempfile.mkdtemp(prefix='meter-reading-bench-')
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(directory, 'main.db')}",
+        'REGION_DATABASES': json.dumps({region: f"sqlite:///{os.path.join(directory, f'{region}.db')}" for region in regions}),
+        'SHARED_CACHE_PATH': os.path.join(directory, 'shared_cache.db'),
+        'SNAPSHOT_DIR': os.path.join(directory, 'snapshots'),
+        'EXPORT_DIR': os.path.join(directory, 'exports'),
+        'ATTACHMENT_DIR': os.path.join(directory, 'attachments'),
+        'PROFILE_DIR': os.path.join(directory, 'profiles'),
+        'BACKUP_DIR': os.path.join(directory, 'backups')
+    })
+    os.environ.update({name: str(value) for name, value in overrides.items()})
+    return directory
+
+def login_headers(client, staff_number, pin=None):
+    """Authorization headers from a Flask test client login"""
+    response = client.post('/api/login', json={'staff_number': staff_number, 'pin': pin or staff_number[:4]})
+    return {'Authorization': f"Bearer {response.json['token']}"}
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else float('nan')
+
+def summarize_ms(values):
+    """p50/p95/max of a list of seconds, formatted in milliseconds"""
+    if not values:
+        return 'no samples'
+    return (f"p50 {statistics.median(values) * 1000:7.2f} ms  p95 {percentile(values, 0.95) * 1000:7.2f} ms  "
+            f"max {max(values) * 1000:7.2f} ms")
@@ -0,0 +1,73 @@
+"""How evenly a bulk escalation check spreads anomalies across engineers.
+
+Seeds a temporary database with --anomalies overdue open anomalies and
+--engineers extra Commercial Engineers, runs the escalation check once and
+prints how many anomalies each engineer received. --weighted doubles the
+first added engineer's weight and marks the second unavailable, to show
+that the split follows the escalation targets:
+
+    python -m benchmarks.escalation_balance --anomalies 2000 --engineers 4
+    python -m benchmarks.escalation_balance --anomalies 2000 --engineers 4 --weighted
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import login_headers, scratch_environment
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--anomalies', type=int, default=2000, help='overdue open anomalies to seed')
+    parser.add_argument('--engineers', type=int, default=4, help='Commercial Engineers to add to the default one')
+    parser.add_argument('--weighted', action='store_true', help='give engineers unequal weights before the check')
+    args = parser.parse_args()
+
+    scratch_environment()
+    from sqlalchemy import func
+    from src.main import app
+    from src.models.user import Anomaly, Escalation, User, db
+    from src.routes import email_service
+
+    # Escalation emails would otherwise dominate the timings
+    email_service.send_email = lambda *args, **kwargs: True
+
+    with app.app_context():
+        for i in range(args.engineers):
+            engineer = User(staff_number=f'7000{i}', role='Commercial Engineer')
+            engineer.set_pin('7000')
+            db.session.add(engineer)
+        db.session.commit()
+        reader_id = User.query.filter_by(staff_number='85891').first().id
+        reported = datetime.utcnow() - timedelta(days=10)
+        db.session.execute(Anomaly.__table__.insert(), [{
+            'type': 'Leak',
+            'staff_id': reader_id,
+            'timestamp': reported,
+            'resolution_status': 'Open',
+            'escalation_flag': False
+        } for _ in range(args.anomalies)])
+        db.session.commit()
+        engineers = dict(db.session.query(User.id, User.staff_number).filter_by(role='Commercial Engineer').all())
+
+    client = app.test_client()
+    headers = login_headers(client, '67890')
+    if args.weighted:
+        first, second = sorted(engineers)[1:3]
+        client.put(f'/api/escalation-targets/{first}', json={'weight': 2}, headers=headers)
+        client.put(f'/api/escalation-targets/{second}', json={'available': False}, headers=headers)
+
+    started = time.perf_counter()
+    response = client.post('/api/anomalies/check_escalation', headers=headers)
+    elapsed = time.perf_counter() - started
+    print(f"escalated {response.json['escalated_count']} anomalies in {elapsed * 1000:.0f} ms "
+          f"({elapsed / max(args.anomalies, 1) * 1e6:.0f} us each)")
+
+    with app.app_context():
+        received = dict(db.session.query(Escalation.escalated_to_id, func.count()).group_by(Escalation.escalated_to_id).all())
+    for target in client.get('/api/escalation-targets', headers=headers).json:
+        share = received.get(target['user_id'], 0) / max(args.anomalies, 1)
+        print(f"{target['staff_number']:>8}  weight {target['weight']:g}  available {target['available']!s:5}  "
+              f"received {received.get(target['user_id'], 0):6}  ({share:6.1%})")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Report submission throughput with and without group commit.
+
+Starts a threaded server on a temporary database and has --clients threads
+each post --per-client reports as fast as the server answers. Run once per
+mode and compare; group commit pays off once enough submissions arrive
+together to share an fsync:
+
+    python -m benchmarks.group_commit --mode direct --clients 32
+    python -m benchmarks.group_commit --mode group --clients 32
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+import urllib.request
+
+from benchmarks.common import scratch_environment, summarize_ms
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=('direct', 'group'), default='group')
+    parser.add_argument('--clients', type=int, default=32, help='concurrent submitting threads')
+    parser.add_argument('--per-client', type=int, default=40, help='reports each client submits')
+    parser.add_argument('--port', type=int, default=5066)
+    args = parser.parse_args()
+
+    scratch_environment(GROUP_COMMIT='1' if args.mode == 'group' else '0', LOGIN_IP_BURST='100000')
+    from werkzeug.serving import make_server
+    from src.main import app
+    from src.routes import email_service
+
+    # Confirmation emails would otherwise dominate the timings
+    email_service.send_email = lambda *args, **kwargs: True
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', args.port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{args.port}'
+
+    def post(path, body, headers=None):
+        request = urllib.request.Request(base_url + path, data=json.dumps(body).encode(),
+                                         headers=dict({'Content-Type': 'application/json'}, **(headers or {})))
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+
+    token = post('/api/login', {'staff_number': '85891', 'pin': '8589'})['token']
+    headers = {'Authorization': f'Bearer {token}'}
+    latencies = []
+    report_ids = set()
+    lock = threading.Lock()
+
+    def client():
+        for _ in range(args.per_client):
+            started = time.perf_counter()
+            body = post('/api/reports', {'itin': 'BENCH', 'report_date': '2026-10-01', 'percentage_attained': 50}, headers)
+            with lock:
+                latencies.append(time.perf_counter() - started)
+                report_ids.add(body['report']['id'])
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    print(f"{args.mode:6} {args.clients} clients: {len(latencies) / elapsed:7.1f} reports/s  {summarize_ms(latencies)}  "
+          f"unique ids {len(report_ids)}/{len(latencies)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+"""End-of-shift load simulation.
+
+Every meter reader logs in, submits a report, sometimes files an anomaly and
+checks their dashboard, while supervisors keep refreshing theirs. By default
+a throwaway server is started in a scratch directory, on a temporary SQLite
+database seeded with the virtual users:
+
+    python -m benchmarks.load_simulation --readers 100 --supervisors 10 --duration 60
+
+Pass --url to run against an already running instance instead. Every virtual
+user needs an account of its own there, listed in an --accounts CSV file of
+staff_number,pin,role lines; without one only the seeded default accounts are
+available, one virtual user each. Logins refused by the throttle are retried
+after Retry-After; users that never log in are counted and reported, since the
+numbers then only cover the others.
+"""
+import csv
+import argparse
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from datetime import date, timedelta
+
+from benchmarks.common import percentile, scratch_environment
+
+VIRTUAL_PIN = '4321'
+DEFAULT_READERS = ['85891', '80909', '86002', '53050', '84184']
+DEFAULT_SUPERVISORS = ['12345', '67890']
+ANOMALY_TYPES = ['Meter Tampering', 'Broken Meter', 'Access Denied', 'Dog on Premises']
+
+class Stats:
+    """Latencies and outcomes per endpoint, shared by all virtual users"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock_failures = defaultdict(int)
+        self.logins = 0
+        self.login_failures = defaultdict(int)
+        self.login_retries = 0
+
+    def record(self, endpoint, seconds, status, body):
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            if status is None or status >= 500 or status == 429:
+                self.errors[endpoint] += 1
+            if body and b'database is locked' in body:
+                self.lock_failures[endpoint] += 1
+
+    def record_login(self, status, retries):
+        with self.lock:
+            self.login_retries += retries
+            if status == 200:
+                self.logins += 1
+            else:
+                self.login_failures[status] += 1
+
+class VirtualUser(threading.Thread):
+    def __init__(self, base_url, staff_number, pin, stats, deadline, think_time):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.staff_number = staff_number
+        self.pin = pin
+        self.stats = stats
+        self.deadline = deadline
+        self.think_time = think_time
+        self.token = None
+        self.retry_after = None
+
+    def call(self, endpoint, method, path, body=None):
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+
+        started = time.perf_counter()
+        status, payload = None, b''
+        self.retry_after = None
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                status, payload = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, payload = e.code, e.read()
+            self.retry_after = e.headers.get('Retry-After')
+        except (urllib.error.URLError, OSError):
+            pass
+        self.stats.record(endpoint, time.perf_counter() - started, status, payload)
+        return status, payload
+
+    def think(self):
+        time.sleep(min(random.expovariate(1 / self.think_time), self.think_time * 5) if self.think_time else 0)
+
+    def login(self):
+        """Log in, waiting out throttling like a real client would, until the deadline"""
+        retries = 0
+        while True:
+            status, payload = self.call('POST /api/login', 'POST', '/api/login', {'staff_number': self.staff_number, 'pin': self.pin})
+            if status == 200:
+                self.token = json.loads(payload)['token']
+            if status != 429 or not self.retry_after or time.time() + float(self.retry_after) >= self.deadline:
+                break
+            retries += 1
+            time.sleep(float(self.retry_after))
+        self.stats.record_login(status, retries)
+        return self.token is not None
+
+    def run(self):
+        # Spread logins over the first think period, like people finishing at slightly different times
+        time.sleep(random.uniform(0, self.think_time))
+        if not self.login():
+            return
+        while time.time() < self.deadline:
+            self.iteration()
+
+class MeterReader(VirtualUser):
+    def iteration(self):
+        self.think()
+        status, payload = self.call('POST /api/reports', 'POST', '/api/reports', {
+            'itin': f'ITIN-{random.randint(1, 400)}',
+            'report_date': (date.today() - timedelta(days=random.randint(0, 3))).isoformat(),
+            'percentage_attained': round(random.uniform(40, 100), 1),
+            'reasons_not_attained': random.choice(['', 'Gate locked', 'Meter inaccessible']),
+        })
+        if random.random() < 0.3 and status == 201:
+            self.think()
+            self.call('POST /api/anomalies', 'POST', '/api/anomalies', {
+                'type': random.choice(ANOMALY_TYPES),
+                'description': 'Reported during end-of-shift simulation',
+                'report_id': json.loads(payload)['report']['id'],
+            })
+        self.think()
+        self.call('GET /api/dashboard/reader', 'GET', '/api/dashboard/reader')
+        self.call('GET /api/reports', 'GET', '/api/reports')
+
+class Supervisor(VirtualUser):
+    def iteration(self):
+        self.think()
+        self.call('GET /api/dashboard/supervisor', 'GET', '/api/dashboard/supervisor')
+        self.call('GET /api/dashboard/stats', 'GET', '/api/dashboard/stats')
+        self.think()
+        self.call('GET /api/anomalies', 'GET', '/api/anomalies')
+        self.call('GET /api/escalations', 'GET', '/api/escalations')
+
+def seed_users(readers, supervisors):
+    """Create the virtual accounts in the scratch database; returns their staff numbers"""
+    from werkzeug.security import generate_password_hash
+    from src.main import app
+    from src.models.user import User, db
+
+    pin_hash = generate_password_hash(VIRTUAL_PIN)
+    reader_numbers = [f'7{i:05d}' for i in range(readers)]
+    supervisor_numbers = [f'6{i:05d}' for i in range(supervisors)]
+    with app.app_context():
+        db.session.add_all(
+            [User(staff_number=n, role='Meter Reader', pin_hash=pin_hash) for n in reader_numbers] +
+            [User(staff_number=n, role='Supervisor', pin_hash=pin_hash) for n in supervisor_numbers]
+        )
+        db.session.commit()
+    return reader_numbers, supervisor_numbers
+
+def start_local_server():
+    """Run the app with the scratch environment set up by main; returns (process, base URL)"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+
+    env = dict(os.environ, FLASK_APP='src.main')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'flask', 'run', '--host', '127.0.0.1', '--port', str(port), '--with-threads'],
+        env=env,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(base_url + '/', timeout=1).read()
+            return process, base_url
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError('Local server did not start')
+
+def print_report(stats, elapsed):
+    print(f"\n{'endpoint':32} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'locked':>7}")
+    total = 0
+    total_errors = 0
+    for endpoint in sorted(stats.latencies):
+        latencies = stats.latencies[endpoint]
+        total += len(latencies)
+        total_errors += stats.errors[endpoint]
+        print(f"{endpoint:32} {len(latencies):9d} {len(latencies) / elapsed:8.1f} "
+              f"{statistics.median(latencies) * 1000:8.1f} {percentile(latencies, 0.95) * 1000:8.1f} "
+              f"{percentile(latencies, 0.99) * 1000:8.1f} {stats.errors[endpoint]:7d} {stats.lock_failures[endpoint]:7d}")
+    if total:
+        print(f"\n{total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s), error rate {total_errors / total * 100:.2f}%, "
+              f"SQLite lock failures {sum(stats.lock_failures.values())}")
+
+    failed = sum(stats.login_failures.values())
+    print(f"\nLogins: {stats.logins} succeeded, {failed} failed, {stats.login_retries} throttled retries")
+    if failed:
+        by_status = ', '.join(f"{count} x {status or 'no response'}" for status, count in sorted(stats.login_failures.items(), key=str))
+        print(f"WARNING: {failed} of {stats.logins + failed} virtual users never logged in ({by_status}); "
+              f"the numbers above only cover the other {stats.logins}")
+
+def read_accounts(path):
+    """(reader accounts, supervisor accounts) as (staff_number, pin) from a staff_number,pin,role CSV"""
+    readers, supervisors = [], []
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith('#'):
+                continue
+            staff_number, pin, role = (field.strip() for field in row[:3])
+            (readers if role == 'Meter Reader' else supervisors).append((staff_number, pin))
+    return readers, supervisors
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate the end-of-shift rush against a local server.')
+    parser.add_argument('--readers', type=int, default=50, help='concurrent virtual meter readers')
+    parser.add_argument('--supervisors', type=int, default=5, help='concurrent virtual supervisors')
+    parser.add_argument('--duration', type=float, default=60, help='seconds to run after start')
+    parser.add_argument('--think-time', type=float, default=2.0, help='mean seconds between actions')
+    parser.add_argument('--url', help='run against this already running instance instead of a local one')
+    parser.add_argument('--accounts', help='with --url: CSV of staff_number,pin,role, one distinct account per virtual user')
+    args = parser.parse_args(argv)
+
+    process = None
+    if args.url:
+        base_url = args.url.rstrip('/')
+        if args.accounts:
+            reader_accounts, supervisor_accounts = read_accounts(args.accounts)
+        else:
+            reader_accounts = [(n, n[:4]) for n in DEFAULT_READERS]
+            supervisor_accounts = [(n, n[:4]) for n in DEFAULT_SUPERVISORS]
+        # Sharing accounts would run into the per-staff login limit and overstate concurrency
+        if args.readers > len(reader_accounts) or args.supervisors > len(supervisor_accounts):
+            parser.error(
+                f"--url needs a distinct account per virtual user: {args.readers} readers and {args.supervisors} "
+                f"supervisors requested, {len(reader_accounts)} and {len(supervisor_accounts)} available; pass --accounts"
+            )
+        reader_numbers = [n for n, _ in reader_accounts[:args.readers]]
+        supervisor_numbers = [n for n, _ in supervisor_accounts[:args.supervisors]]
+        reader_pins = dict(reader_accounts + supervisor_accounts)
+    else:
+        # Databases, snapshots, exports and attachments all live in the scratch
+        # directory, so a run never touches the ones under src/database
+        workdir = scratch_environment(LOGIN_IP_BURST='1000000', LOGIN_IP_PER_MINUTE='1000000')
+        reader_numbers, supervisor_numbers = seed_users(args.readers, args.supervisors)
+        reader_pins = {n: VIRTUAL_PIN for n in reader_numbers + supervisor_numbers}
+        process, base_url = start_local_server()
+        print(f"Started local server at {base_url} in {workdir}")
+
+    stats = Stats()
+    started = time.time()
+    deadline = started + args.duration
+    users = [MeterReader(base_url, n, reader_pins[n], stats, deadline, args.think_time) for n in reader_numbers]
+    users += [Supervisor(base_url, n, reader_pins[n], stats, deadline, args.think_time) for n in supervisor_numbers]
+
+    try:
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+    print_report(stats, time.time() - started)
+
+if __name__ == '__main__':
+    main()
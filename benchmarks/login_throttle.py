@@ -0,0 +1,102 @@
+"""Report-list latency while a credential flood hits /api/login.
+
+Starts a threaded server on a temporary database, measures GET /api/reports
+alone, then again while --flooders threads post wrong PINs as fast as they
+can. With the throttle on, refused attempts never reach the PIN hash and
+the reader's latency barely moves; --no-throttle lifts the budgets to show
+what the flood costs without it. Also prints the cost of one throttle check
+against a full table of client buckets:
+
+    python -m benchmarks.login_throttle
+    python -m benchmarks.login_throttle --no-throttle
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.common import scratch_environment, summarize_ms
+
+def post(base_url, path, body):
+    request = urllib.request.Request(base_url + path, data=json.dumps(body).encode(), headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        e.read()
+        return None
+
+def timed_get(base_url, path, token):
+    request = urllib.request.Request(base_url + path, headers={'Authorization': f'Bearer {token}'})
+    started = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        response.read()
+    return time.perf_counter() - started
+
+def check_cost(keys, attempts=100000):
+    """Seconds per try_acquire with `keys` buckets already in the table"""
+    from src.routes.throttle import TokenBucketLimiter
+    limiter = TokenBucketLimiter(capacity=5, refill_per_second=5 / 60, max_keys=keys)
+    for i in range(keys):
+        limiter.try_acquire(f'10.0.{i // 256}.{i % 256}')
+    started = time.perf_counter()
+    for i in range(attempts):
+        limiter.try_acquire(f'flood-{i}')
+    return (time.perf_counter() - started) / attempts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--no-throttle', action='store_true', help='lift the login budgets')
+    parser.add_argument('--flooders', type=int, default=16, help='threads posting wrong PINs')
+    parser.add_argument('--samples', type=int, default=30, help='report list requests per phase')
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+
+    scratch_environment()
+    from werkzeug.serving import make_server
+    from src.main import app
+    from src.routes import throttle
+
+    if args.no_throttle:
+        throttle.login_limiter_by_ip.capacity = 1e9
+        throttle.login_limiter_by_staff.capacity = 1e9
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', args.port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{args.port}'
+
+    token = post(base_url, '/api/login', {'staff_number': '85891', 'pin': '8589'})['token']
+    baseline = [timed_get(base_url, '/api/reports', token) for _ in range(args.samples)]
+
+    stop = threading.Event()
+    attempts = []
+
+    def flood():
+        while not stop.is_set():
+            post(base_url, '/api/login', {'staff_number': '85891', 'pin': '0000'})
+            attempts.append(1)
+
+    flooders = [threading.Thread(target=flood) for _ in range(args.flooders)]
+    flood_started = time.perf_counter()
+    for thread in flooders:
+        thread.start()
+    time.sleep(1)
+    under_flood = [timed_get(base_url, '/api/reports', token) for _ in range(args.samples)]
+    stop.set()
+    flood_seconds = time.perf_counter() - flood_started
+    for thread in flooders:
+        thread.join()
+    server.shutdown()
+
+    mode = 'throttle off' if args.no_throttle else 'throttle on'
+    print(f"{mode}: baseline     {summarize_ms(baseline)}")
+    print(f"{mode}: under flood  {summarize_ms(under_flood)}  ({len(attempts) / flood_seconds:.0f} login attempts/s)")
+    for keys in (100, 10000):
+        print(f"throttle check with {keys:>5} buckets: {check_cost(keys) * 1e6:.1f} us")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Where the time goes when building a report pack, and what a worker pool buys.
+
+Seeds a temporary database with a month of reports and anomalies, then
+times loading the pack tables, building every sheet's rows sequentially,
+in a thread pool and in a process pool, and writing the workbook. Only the
+row building can be split across workers; the workbook is one zip of XML
+written by openpyxl in a single thread whichever way the rows were built:
+
+    python -m benchmarks.report_pack --readers 200 --reports-per-reader 30
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from benchmarks.common import scratch_environment
+
+def sheet_jobs(tables):
+    """(builder, argument) per sheet, in workbook order"""
+    from src.routes.export_service import _anomalies_sheet, _escalations_sheet, _reader_sheet, _summary_sheet
+
+    by_reader = {}
+    for report in tables['reports']:
+        by_reader.setdefault(report.staff_id, []).append(report)
+    return ([(_summary_sheet, tables)] + [(_reader_sheet, reports) for reports in by_reader.values()] +
+            [(_anomalies_sheet, tables), (_escalations_sheet, tables)])
+
+def call(job):
+    builder, argument = job
+    return builder(argument)
+
+def timed(label, function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    print(f"{label:34} {best * 1000:8.1f} ms")
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=200)
+    parser.add_argument('--reports-per-reader', type=int, default=30)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3, help='best of this many runs per step')
+    args = parser.parse_args()
+
+    scratch_environment()
+    from src.main import app
+    from src.models.user import Anomaly, Report, User, db
+    from src.routes.export_service import build_report_pack, load_pack_tables
+
+    start = date(2026, 9, 1)
+    end = date(2026, 9, 30)
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [
+            {'staff_number': f'9{i:05d}', 'role': 'Meter Reader', 'pin_hash': 'x', 'region': 'default'} for i in range(args.readers)
+        ])
+        db.session.commit()
+        staff_ids = [user_id for (user_id,) in db.session.query(User.id).filter(User.staff_number.like('9%')).all()]
+        db.session.execute(Report.__table__.insert(), [{
+            'itin': f'ITIN{i % 400}',
+            'report_date': start + timedelta(days=i % 30),
+            'percentage_attained': round(random.random() * 100, 1),
+            'reasons_not_attained': 'Gate locked',
+            'staff_id': staff_id,
+            'timestamp': datetime(2026, 9, 1) + timedelta(minutes=i)
+        } for staff_id in staff_ids for i in range(args.reports_per_reader)])
+        db.session.execute(Anomaly.__table__.insert(), [{
+            'type': 'Leak', 'staff_id': staff_id, 'timestamp': datetime(2026, 9, 2) + timedelta(hours=i),
+            'resolution_status': 'Open', 'escalation_flag': i % 3 == 0
+        } for staff_id in staff_ids for i in range(3)])
+        db.session.commit()
+
+        _, tables = timed('load pack tables', lambda: load_pack_tables(start, end), args.repeat)
+        jobs = sheet_jobs(tables)
+        print(f"{len(jobs)} sheets, {len(tables['reports'])} reports, {len(tables['anomalies'])} anomalies")
+
+        sequential, _ = timed('sheet rows, sequential', lambda: [call(job) for job in jobs], args.repeat)
+        with ThreadPoolExecutor(args.workers) as pool:
+            timed(f'sheet rows, {args.workers} threads', lambda: list(pool.map(call, jobs)), args.repeat)
+        with ProcessPoolExecutor(args.workers) as pool:
+            list(pool.map(call, jobs[:1]))
+            timed(f'sheet rows, {args.workers} processes', lambda: list(pool.map(call, jobs, chunksize=8)), args.repeat)
+        whole, content = timed('build_report_pack (rows + workbook)', lambda: build_report_pack(tables), args.repeat)
+        print(f"workbook {len(content) / 1024:.0f} KB; building rows is {sequential / whole:.0%} of the pack, "
+              f"the rest is openpyxl writing one workbook")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Response size and server time of /api/reports per shape and encoding.
+
+Seeds a temporary database with reports, then fetches the list as rows and
+as columnar JSON with each Accept-Encoding. The transfer estimate adds one
+round trip and the payload at the given link speed, which is what a field
+device on a poor connection waits for:
+
+    python -m benchmarks.response_encoding --reports 5000 --kbps 256 --rtt 0.3
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from benchmarks.common import login_headers, scratch_environment
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reports', type=int, default=5000, help='reports to seed')
+    parser.add_argument('--repeat', type=int, default=5, help='requests per combination')
+    parser.add_argument('--kbps', type=float, default=256, help='link speed for the transfer estimate')
+    parser.add_argument('--rtt', type=float, default=0.3, help='round trip time in seconds for the estimate')
+    args = parser.parse_args()
+
+    scratch_environment()
+    from src.main import app
+    from src.models.user import Report, User, db
+
+    with app.app_context():
+        staff_ids = [user_id for (user_id,) in db.session.query(User.id).filter_by(role='Meter Reader').all()]
+        db.session.execute(Report.__table__.insert(), [{
+            'itin': f'ITIN{i % 50}',
+            'report_date': date(2026, 9, 1) + timedelta(days=i % 30),
+            'percentage_attained': round(random.random() * 100, 1),
+            'reasons_not_attained': 'Gate locked',
+            'staff_id': staff_ids[i % len(staff_ids)]
+        } for i in range(args.reports)])
+        db.session.commit()
+
+    client = app.test_client()
+    headers = login_headers(client, '12345')
+    bytes_per_second = args.kbps * 1000 / 8
+
+    for shape in ('rows', 'columnar'):
+        query = {'shape': 'columnar'} if shape == 'columnar' else {}
+        for encoding in ('identity', 'gzip', 'deflate'):
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                response = client.get('/api/reports', query_string=query, headers=dict(headers, **{'Accept-Encoding': encoding}))
+            server = (time.perf_counter() - started) / args.repeat
+            size = len(response.data)
+            transfer = server + args.rtt + size / bytes_per_second
+            print(f"{shape:9} {encoding:9} {size:>10} B  server {server * 1000:7.1f} ms  "
+                  f"at {args.kbps:g} kbps / {args.rtt * 1000:g} ms RTT {transfer:6.2f} s")
+
+if __name__ == '__main__':
+    main()
@@ -6,11 +6,29 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from src.models.user import db
+from src.models.analytics import init_analytics
+from src.models.backup import backup_cli
+from src.models.counters import counters_cli
+from src.models.group_commit import init_group_commit
+from src.models.history_import import history_cli
+from src.models.maintenance import maintenance_cli
+from src.models.shared_cache import init_shared_cache
+from src.models.teams import teams_cli
+from src.models.sharding import configure_regions, create_region_tables
 from src.routes.user import user_bp
 from src.routes.auth import auth_bp
 from src.routes.reports import reports_bp
 from src.routes.anomalies import anomalies_bp
 from src.routes.email_service import email_bp
+from src.routes.export_service import export_bp, init_export_jobs
+from src.routes.sync import sync_bp
+from src.routes.attachments import attachments_bp
+from src.routes.profiling import profiling_bp, init_profiling
+from src.routes.itins import itins_bp
+from src.routes.analytics import analytics_bp
+from src.routes.batch import batch_bp
+from src.routes.teams import teams_bp
+from src.routes.static_assets import build_asset_manifest, asset_response
 
 from src.routes.dashboard import dashboard_bp
 
@@ -27,14 +45,36 @@ app.register_blueprint(reports_bp, url_prefix='/api')
 app.register_blueprint(anomalies_bp, url_prefix='/api')
 app.register_blueprint(dashboard_bp, url_prefix='/api')
 app.register_blueprint(email_bp, url_prefix='/api')
+app.register_blueprint(export_bp, url_prefix='/api')
+app.register_blueprint(sync_bp, url_prefix='/api')
+app.register_blueprint(attachments_bp, url_prefix='/api')
+app.register_blueprint(profiling_bp, url_prefix='/api')
+app.register_blueprint(itins_bp, url_prefix='/api')
+app.register_blueprint(analytics_bp, url_prefix='/api')
+app.register_blueprint(batch_bp, url_prefix='/api')
+app.register_blueprint(teams_bp, url_prefix='/api')
+init_profiling(app)
 
 # Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+    'DATABASE_URL',
+    f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+configure_regions(app)
 db.init_app(app)
+init_analytics(app)
+app.cli.add_command(counters_cli)
+app.cli.add_command(maintenance_cli)
+app.cli.add_command(history_cli)
+app.cli.add_command(teams_cli)
+app.cli.add_command(backup_cli)
+init_group_commit(app)
+init_shared_cache(app)
 
 with app.app_context():
     db.create_all()
+    create_region_tables(app)
     
     # Initialize default users if they don't exist
     from src.models.user import User
@@ -69,22 +109,25 @@ with app.app_context():
     
     db.session.commit()
 
+init_export_jobs(app)
+
+# Static files are indexed once at startup; requests never touch the filesystem
+static_assets = build_asset_manifest(app.static_folder)
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
+    if app.static_folder is None:
             return "Static folder not configured", 404
 
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
+    asset = static_assets.get(path) if path != "" else None
+    if asset is None:
+        asset = static_assets.get('index.html')
+        if asset is None:
             return "index.html not found", 404
 
+    return asset_response(asset)
+
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,107 @@
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, g
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from src.models.sharding import DEFAULT_REGION, SHARDED_TABLES, current_region, region_engine, region_names
+
+def _read_only_uri(uri):
+    """Read-only variant of the primary database URI"""
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite' and url.database and url.database != ':memory:':
+        return f"sqlite:///file:{url.database}?mode=ro&uri=true"
+    return uri
+
+def _read_only_engine(uri):
+    backend = make_url(uri).get_backend_name()
+
+    engine_options = {}
+    if backend == 'sqlite':
+        engine_options['connect_args'] = {'check_same_thread': False}
+    else:
+        engine_options['pool_pre_ping'] = True
+    engine_options['pool_size'] = int(os.environ.get('ANALYTICS_POOL_SIZE', '5'))
+
+    engine = create_engine(uri, **engine_options)
+
+    if backend == 'sqlite':
+        @event.listens_for(engine, 'connect')
+        def _set_query_only(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA query_only = ON')
+            cursor.close()
+    elif backend == 'postgresql':
+        engine = engine.execution_options(postgresql_readonly=True)
+    return engine
+
+def _use_wal(engine):
+    @event.listens_for(engine, 'connect')
+    def _set_wal(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode = WAL')
+        cursor.close()
+
+def init_analytics(app):
+    """Set up read-only engines, with their own pools, for long read-only queries.
+
+    ANALYTICS_DATABASE_URI can point at a replica (e.g. PostgreSQL). By default
+    the primary SQLite file is reopened read-only with query_only set, and the
+    primary is switched to WAL so these readers never block report writers.
+    Every region's shard gets a read-only engine of its own in the same way.
+    """
+    primary_uri = app.config['SQLALCHEMY_DATABASE_URI']
+    uri = app.config.get('ANALYTICS_DATABASE_URI') or os.environ.get('ANALYTICS_DATABASE_URI') or _read_only_uri(primary_uri)
+    engines = {DEFAULT_REGION: _read_only_engine(uri)}
+
+    with app.app_context():
+        if make_url(uri).get_backend_name() == 'sqlite' and make_url(primary_uri).get_backend_name() == 'sqlite':
+            _use_wal(region_engine(DEFAULT_REGION))
+        for region, region_uri in (app.config.get('REGION_DATABASES') or {}).items():
+            engines[region] = _read_only_engine(_read_only_uri(region_uri))
+            if make_url(region_uri).get_backend_name() == 'sqlite':
+                _use_wal(region_engine(region))
+
+    app.extensions['analytics'] = engines
+
+    @app.teardown_appcontext
+    def _close_analytics_session(exc):
+        session = g.pop('analytics_session', None)
+        if session is not None:
+            session.close()
+
+def region_read_session(region):
+    """Read-only session for one region: shard tables from its read-only engine, the rest from the primary's"""
+    engines = current_app.extensions['analytics']
+    primary = engines[DEFAULT_REGION]
+    shard = engines.get(region, primary)
+    if shard is primary:
+        return Session(bind=primary)
+    tables = current_app.extensions['sqlalchemy'].metadata.tables
+    return Session(bind=primary, binds={tables[name]: shard for name in SHARDED_TABLES})
+
+def analytics_session():
+    """Read-only session for dashboards, stats and exports, one per app context"""
+    if 'analytics_session' not in g:
+        g.analytics_session = region_read_session(current_region())
+    return g.analytics_session
+
+def fan_out(fn, regions=None):
+    """Run fn(session, region) against every region in parallel and return the results in region order"""
+    app = current_app._get_current_object()
+    regions = regions or region_names()
+
+    def run(region):
+        with app.app_context():
+            session = region_read_session(region)
+            try:
+                return fn(session, region)
+            finally:
+                session.close()
+
+    # Each worker runs in a copy of the caller's context, so context-bound
+    # collectors such as the request profiler's SQL capture see its queries
+    contexts = [contextvars.copy_context() for _ in regions]
+    with ThreadPoolExecutor(max_workers=len(regions)) as pool:
+        return list(pool.map(lambda context, region: context.run(run, region), contexts, regions))
@@ -0,0 +1,379 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup
+from src.models.sharding import region_engine, region_names
+
+backup_cli = AppGroup('backup', help='Online snapshots of the SQLite databases, with retention and restore checks.')
+
+BACKUP_DIR = os.environ.get(
+    'BACKUP_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'backups')
+)
+BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', '14'))
+# Pages copied per step; between steps the source is unlocked and writers carry on
+BACKUP_PAGES = int(os.environ.get('BACKUP_PAGES', '256'))
+BACKUP_SLEEP = float(os.environ.get('BACKUP_SLEEP', '0.005'))
+# After this many restarts caused by concurrent writes the rest is copied in one step
+BACKUP_MAX_RESTARTS = int(os.environ.get('BACKUP_MAX_RESTARTS', '3'))
+
+# How long the backup connection waits for a busy writer before giving up
+BUSY_TIMEOUT_MS = 5000
+
+region_option = click.option('--region', 'regions', multiple=True, help='Only this region (repeatable). Defaults to all.')
+
+class _TooManyRestarts(Exception):
+    pass
+
+def _source_paths(regions):
+    """Yield (region, database file) for every selected file-backed SQLite database"""
+    for region in regions or region_names():
+        engine = region_engine(region)
+        if engine.dialect.name != 'sqlite':
+            click.echo(f"[{region}] skipped: {engine.dialect.name} is not SQLite")
+            continue
+        path = engine.url.database
+        if not path or path == ':memory:':
+            click.echo(f"[{region}] skipped: in-memory database")
+            continue
+        yield region, path
+
+def _row_counts(connection):
+    tables = [name for (name,) in connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )]
+    return {table: connection.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _manifest_path(snapshot):
+    return snapshot[:-len('.db')] + '.json'
+
+def _read_manifest(snapshot):
+    try:
+        with open(_manifest_path(snapshot)) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+def _write_manifest(snapshot, manifest):
+    with open(_manifest_path(snapshot), 'w') as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+
+def _format_bytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+def copy_database(source_path, target_path, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP, max_restarts=BACKUP_MAX_RESTARTS):
+    """Copy a live database with the SQLite online backup API.
+
+    The copy runs in steps of `pages` pages. Each step takes a short read
+    lock and releases it again, so in WAL mode submissions are never blocked
+    and in rollback mode they only wait for one step. A write by another
+    connection makes SQLite restart the copy from the first page; after
+    max_restarts restarts the remainder is copied in a single step, which
+    reads one consistent snapshot instead of chasing a busy database.
+    Returns statistics about the copy.
+    """
+    stats = {'steps': 0, 'restarts': 0, 'pages': 0, 'single_step': False}
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal last_remaining
+        stats['steps'] += 1
+        stats['pages'] = total
+        if last_remaining is not None and remaining > last_remaining:
+            stats['restarts'] += 1
+            if stats['restarts'] > max_restarts:
+                raise _TooManyRestarts()
+        last_remaining = remaining
+
+    source = sqlite3.connect(source_path, timeout=BUSY_TIMEOUT_MS / 1000)
+    target = sqlite3.connect(target_path)
+    try:
+        try:
+            source.backup(target, pages=pages, progress=progress, sleep=sleep)
+        except _TooManyRestarts:
+            stats['single_step'] = True
+            source.backup(target, pages=-1)
+            stats['steps'] += 1
+        # Snapshots are single files; a WAL header would leave -wal/-shm files next to them
+        target.execute('PRAGMA journal_mode = DELETE')
+        stats['page_size'] = target.execute('PRAGMA page_size').fetchone()[0]
+        stats['pages'] = target.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+    return stats
+
+def create_snapshot(region, source_path, directory=BACKUP_DIR, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP):
+    """Back up one region's database into directory and write its manifest.
+
+    The file is written under a temporary name and only linked into place
+    once the copy is complete, so a crashed run never leaves a truncated
+    snapshot that looks usable. Names carry the time to the microsecond,
+    and the link refuses to replace an existing snapshot, so two runs can
+    never overwrite each other. Returns (snapshot path, manifest).
+    """
+    os.makedirs(directory, exist_ok=True)
+    created_at = datetime.utcnow()
+    snapshot = os.path.join(directory, f"{region}-{created_at.strftime('%Y%m%d-%H%M%S-%f')}.db")
+    partial = snapshot + '.partial'
+
+    started = time.perf_counter()
+    try:
+        stats = copy_database(source_path, partial, pages=pages, sleep=sleep)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    duration = time.perf_counter() - started
+
+    try:
+        connection = sqlite3.connect(partial)
+        try:
+            row_counts = _row_counts(connection)
+        finally:
+            connection.close()
+        # Unlike os.replace, link fails if another run already wrote this name
+        os.link(partial, snapshot)
+    finally:
+        os.remove(partial)
+
+    manifest = dict(
+        stats,
+        region=region,
+        source=source_path,
+        created_at=created_at.isoformat(),
+        duration_seconds=round(duration, 3),
+        size=os.path.getsize(snapshot),
+        sha256=_sha256(snapshot),
+        row_counts=row_counts,
+        verified_at=None
+    )
+    _write_manifest(snapshot, manifest)
+    return snapshot, manifest
+
+def verify_snapshot(snapshot):
+    """Restore a snapshot into a temporary file and compare it with its manifest.
+
+    Checks the checksum, runs quick_check on the restored copy and compares
+    every table's row count with the counts taken when the snapshot was
+    written. Returns a list of problems; empty means the snapshot restores
+    cleanly. A successful check is recorded in the manifest.
+    """
+    manifest = _read_manifest(snapshot)
+    if manifest is None:
+        return ['manifest is missing or unreadable']
+    if _sha256(snapshot) != manifest['sha256']:
+        return ['checksum does not match the manifest']
+
+    problems = []
+    handle, restored_path = tempfile.mkstemp(suffix='.db', prefix='restore-')
+    os.close(handle)
+    try:
+        source = sqlite3.connect(f'file:{snapshot}?mode=ro', uri=True)
+        restored = sqlite3.connect(restored_path)
+        try:
+            source.backup(restored)
+            problems.extend(row[0] for row in restored.execute('PRAGMA quick_check') if row[0] != 'ok')
+            row_counts = _row_counts(restored)
+        finally:
+            restored.close()
+            source.close()
+    finally:
+        os.remove(restored_path)
+
+    expected = manifest['row_counts']
+    for table in sorted(set(expected) | set(row_counts)):
+        if expected.get(table) != row_counts.get(table):
+            problems.append(f"{table}: expected {expected.get(table)} rows, restored {row_counts.get(table)}")
+
+    if not problems:
+        manifest['verified_at'] = datetime.utcnow().isoformat()
+        _write_manifest(snapshot, manifest)
+    return problems
+
+def _snapshot_pattern(region):
+    # Snapshots written before names carried microseconds end at the seconds
+    return re.compile(rf'^{re.escape(region)}-(\d{{8}})-(\d{{6}})(?:-(\d{{6}}))?\.db$')
+
+def list_snapshots(region, directory=BACKUP_DIR):
+    """Snapshot paths for a region, oldest first.
+
+    Names must match exactly, so a region whose name is a prefix of
+    another's (east and east-2) never lists or prunes the other's files.
+    """
+    if not os.path.isdir(directory):
+        return []
+    pattern = _snapshot_pattern(region)
+    found = []
+    for name in os.listdir(directory):
+        match = pattern.match(name)
+        if match:
+            found.append((match.group(1), match.group(2), match.group(3) or '000000', name))
+    return [os.path.join(directory, name) for *_, name in sorted(found)]
+
+def prune_snapshots(region, keep, directory=BACKUP_DIR):
+    """Delete all but the newest `keep` snapshots of a region; returns the deleted paths"""
+    snapshots = list_snapshots(region, directory)
+    expired = snapshots[:-keep] if keep > 0 else snapshots
+    for snapshot in expired:
+        os.remove(snapshot)
+        if os.path.exists(_manifest_path(snapshot)):
+            os.remove(_manifest_path(snapshot))
+    return expired
+
+def quarantine_snapshot(snapshot):
+    """Rename a snapshot that failed verification, and its manifest, out of the listed names.
+
+    The files are kept for inspection, but list_snapshots and prune_snapshots
+    never see them again, so a later restore cannot pick them up. Returns the
+    new snapshot path.
+    """
+    quarantined = snapshot + '.failed'
+    os.replace(snapshot, quarantined)
+    if os.path.exists(_manifest_path(snapshot)):
+        os.replace(_manifest_path(snapshot), _manifest_path(snapshot) + '.failed')
+    return quarantined
+
+def run_backups(regions, directory, keep, pages, sleep, verify):
+    """Snapshot, verify and prune every selected region; returns False if anything failed"""
+    ok = True
+    for region, source_path in _source_paths(regions):
+        # A full disk or a permissions problem fails this region, not the scheduler
+        try:
+            snapshot, manifest = create_snapshot(region, source_path, directory, pages=pages, sleep=sleep)
+        except (sqlite3.Error, OSError) as e:
+            click.echo(f"[{region}] backup failed: {e}")
+            ok = False
+            continue
+
+        fallback = ', finished in one step after repeated restarts' if manifest['single_step'] else ''
+        click.echo(
+            f"[{region}] {os.path.basename(snapshot)}: {manifest['pages']} pages "
+            f"({_format_bytes(manifest['size'])}) in {manifest['duration_seconds']:.2f}s, "
+            f"{manifest['steps']} steps, {manifest['restarts']} restarts{fallback}"
+        )
+
+        if verify:
+            started = time.perf_counter()
+            try:
+                problems = verify_snapshot(snapshot)
+            except (sqlite3.Error, OSError) as e:
+                problems = [f"restore failed: {e}"]
+            if problems:
+                ok = False
+                for problem in problems:
+                    click.echo(f"[{region}] verify failed: {problem}")
+                # A snapshot that does not restore must neither be restored from
+                # nor push a good one out of retention
+                try:
+                    click.echo(f"[{region}] quarantined as {os.path.basename(quarantine_snapshot(snapshot))}")
+                except OSError as e:
+                    click.echo(f"[{region}] quarantine failed: {e}")
+                continue
+            click.echo(f"[{region}] verified in {time.perf_counter() - started:.2f}s")
+
+        try:
+            for expired in prune_snapshots(region, keep, directory):
+                click.echo(f"[{region}] removed {os.path.basename(expired)}")
+        except OSError as e:
+            click.echo(f"[{region}] prune failed: {e}")
+            ok = False
+    return ok
+
+backup_options = [
+    click.option('--dir', 'directory', default=BACKUP_DIR, show_default=True, help='Where snapshots are written.'),
+    click.option('--keep', default=BACKUP_KEEP, show_default=True, help='Snapshots kept per region.'),
+    click.option('--pages', default=BACKUP_PAGES, show_default=True, help='Pages copied per step.'),
+    click.option('--sleep', default=BACKUP_SLEEP, show_default=True, help='Seconds between steps.'),
+    click.option('--verify/--no-verify', default=True, show_default=True, help='Restore each snapshot into a temporary file and check it.'),
+    region_option
+]
+
+def _with_backup_options(command):
+    for option in reversed(backup_options):
+        command = option(command)
+    return command
+
+@backup_cli.command('run')
+@_with_backup_options
+def run_command(directory, keep, pages, sleep, verify, regions):
+    """Snapshot every database without blocking writers.
+
+    Each snapshot is restored into a temporary file and checked before the
+    oldest ones beyond --keep are removed. Exits non-zero on any failure, so
+    it can run from cron.
+    """
+    if not run_backups(regions, directory, keep, pages, sleep, verify):
+        raise SystemExit(1)
+
+@backup_cli.command('schedule')
+@click.option('--every', 'interval', default=360, show_default=True, help='Minutes between runs.')
+@_with_backup_options
+def schedule_command(interval, directory, keep, pages, sleep, verify, regions):
+    """Run backups every --every minutes until interrupted, for hosts without cron."""
+    while True:
+        started = time.monotonic()
+        click.echo(f"Backup run at {datetime.utcnow().isoformat(timespec='seconds')}Z")
+        if not run_backups(regions, directory, keep, pages, sleep, verify):
+            click.echo("Backup run had failures; trying again at the next interval")
+        time.sleep(max(0, interval * 60 - (time.monotonic() - started)))
+
+@backup_cli.command('verify')
+@click.argument('snapshots', nargs=-1)
+@click.option('--dir', 'directory', default=BACKUP_DIR, show_default=True, help='Where snapshots are kept.')
+@region_option
+def verify_command(snapshots, directory, regions):
+    """Restore snapshots into temporary files and check them.
+
+    Without arguments the newest snapshot of every region is checked.
+    """
+    if not snapshots:
+        snapshots = [found[-1] for found in (list_snapshots(region, directory) for region in regions or region_names()) if found]
+    if not snapshots:
+        raise click.ClickException(f"No snapshots in {directory}")
+
+    failed = False
+    for snapshot in snapshots:
+        started = time.perf_counter()
+        problems = verify_snapshot(snapshot)
+        name = os.path.basename(snapshot)
+        if problems:
+            failed = True
+            for problem in problems:
+                click.echo(f"{name}: {problem}")
+        else:
+            click.echo(f"{name}: ok in {time.perf_counter() - started:.2f}s")
+    if failed:
+        raise SystemExit(1)
+
+@backup_cli.command('list')
+@click.option('--dir', 'directory', default=BACKUP_DIR, show_default=True, help='Where snapshots are kept.')
+@region_option
+def list_command(directory, regions):
+    """Show the snapshots kept for every region."""
+    for region in regions or region_names():
+        snapshots = list_snapshots(region, directory)
+        click.echo(f"[{region}] {len(snapshots)} snapshots")
+        for snapshot in snapshots:
+            manifest = _read_manifest(snapshot) or {}
+            verified = manifest.get('verified_at') or 'not verified'
+            duration = manifest.get('duration_seconds')
+            took = f"{duration:.2f}s" if duration is not None else '-'
+            click.echo(f"  {os.path.basename(snapshot):<40} {_format_bytes(os.path.getsize(snapshot)):>10} {took:>8}  {verified}")
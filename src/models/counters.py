@@ -0,0 +1,196 @@
+from datetime import date
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+from src.models.user import User, Report, Anomaly, UserCounter, db
+from src.models.sharding import DEFAULT_REGION, region_session
+
+counters_cli = AppGroup('counters', help='Per-user counter maintenance.')
+
+COUNTER_FIELDS = ['pending_reports', 'open_anomalies', 'escalated_anomalies', 'reports_this_month']
+
+def _month_bounds(today=None):
+    start = (today or date.today()).replace(day=1)
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start, end
+
+def _current_month():
+    return _month_bounds()[0].strftime('%Y-%m')
+
+def compute_counters(connection, user_ids):
+    """Count everything from the base tables for the given users"""
+    start, end = _month_bounds()
+    reports = Report.__table__
+    anomalies = Anomaly.__table__
+
+    def grouped(column, *criteria):
+        query = select(column, func.count()).where(column.in_(user_ids), *criteria).group_by(column)
+        return dict(connection.execute(query).all())
+
+    pending = grouped(reports.c.staff_id, reports.c.status == 'Pending')
+    this_month = grouped(reports.c.staff_id, reports.c.report_date >= start, reports.c.report_date < end)
+    open_ = grouped(anomalies.c.staff_id, anomalies.c.resolution_status == 'Open')
+    escalated = grouped(anomalies.c.staff_id, anomalies.c.escalation_flag == True)
+
+    return {
+        user_id: {
+            'pending_reports': pending.get(user_id, 0),
+            'open_anomalies': open_.get(user_id, 0),
+            'escalated_anomalies': escalated.get(user_id, 0),
+            'reports_this_month': this_month.get(user_id, 0)
+        }
+        for user_id in user_ids
+    }
+
+def _store_counters(connection, counts):
+    table = UserCounter.__table__
+    month = _current_month()
+    connection.execute(table.delete().where(table.c.user_id.in_(list(counts))))
+    if counts:
+        connection.execute(table.insert(), [
+            dict(values, user_id=user_id, month=month) for user_id, values in counts.items()
+        ])
+
+def get_counters(session, user_ids):
+    """Counters for the given users, computed on the fly for any missing or stale row"""
+    month = _current_month()
+    rows = session.query(UserCounter).filter(
+        UserCounter.user_id.in_(user_ids),
+        UserCounter.month == month
+    ).all()
+    counters = {row.user_id: row.to_dict() for row in rows}
+    missing = [user_id for user_id in user_ids if user_id not in counters]
+    if missing:
+        counters.update(compute_counters(session.connection(bind_arguments={'mapper': UserCounter}), missing))
+    return counters
+
+# Keep counters in step with report and anomaly writes, inside the same transaction
+
+def _old_value(state, key, default):
+    history = state.attrs[key].history
+    if history.deleted:
+        value = history.deleted[0]
+    elif history.unchanged:
+        value = history.unchanged[0]
+    else:
+        value = history.added[0] if history.added else None
+    return default if value is None else value
+
+def _new_value(obj, key, default):
+    value = getattr(obj, key)
+    return default if value is None else value
+
+def _report_contribution(staff_id, status, report_date, month_start, month_end):
+    return staff_id, {
+        'pending_reports': 1 if status == 'Pending' else 0,
+        'reports_this_month': 1 if report_date and month_start <= report_date < month_end else 0
+    }
+
+def _anomaly_contribution(staff_id, resolution_status, escalation_flag):
+    return staff_id, {
+        'open_anomalies': 1 if resolution_status == 'Open' else 0,
+        'escalated_anomalies': 1 if escalation_flag else 0
+    }
+
+def _apply(deltas, contribution, sign):
+    staff_id, values = contribution
+    if staff_id is None:
+        return
+    user_deltas = deltas.setdefault(staff_id, dict.fromkeys(COUNTER_FIELDS, 0))
+    for key, value in values.items():
+        user_deltas[key] += sign * value
+
+@event.listens_for(Session, 'after_flush')
+def _update_counters(session, flush_context):
+    month_start, month_end = _month_bounds()
+    deltas = {}
+
+    for obj in session.new:
+        if isinstance(obj, Report):
+            _apply(deltas, _report_contribution(obj.staff_id, _new_value(obj, 'status', 'Pending'), obj.report_date, month_start, month_end), 1)
+        elif isinstance(obj, Anomaly):
+            _apply(deltas, _anomaly_contribution(obj.staff_id, _new_value(obj, 'resolution_status', 'Open'), _new_value(obj, 'escalation_flag', False)), 1)
+
+    for obj in session.deleted:
+        state = inspect(obj)
+        if isinstance(obj, Report):
+            _apply(deltas, _report_contribution(_old_value(state, 'staff_id', None), _old_value(state, 'status', 'Pending'), _old_value(state, 'report_date', None), month_start, month_end), -1)
+        elif isinstance(obj, Anomaly):
+            _apply(deltas, _anomaly_contribution(_old_value(state, 'staff_id', None), _old_value(state, 'resolution_status', 'Open'), _old_value(state, 'escalation_flag', False)), -1)
+
+    for obj in session.dirty:
+        if not session.is_modified(obj, include_collections=False):
+            continue
+        state = inspect(obj)
+        if isinstance(obj, Report):
+            _apply(deltas, _report_contribution(_old_value(state, 'staff_id', None), _old_value(state, 'status', 'Pending'), _old_value(state, 'report_date', None), month_start, month_end), -1)
+            _apply(deltas, _report_contribution(obj.staff_id, _new_value(obj, 'status', 'Pending'), obj.report_date, month_start, month_end), 1)
+        elif isinstance(obj, Anomaly):
+            _apply(deltas, _anomaly_contribution(_old_value(state, 'staff_id', None), _old_value(state, 'resolution_status', 'Open'), _old_value(state, 'escalation_flag', False)), -1)
+            _apply(deltas, _anomaly_contribution(obj.staff_id, _new_value(obj, 'resolution_status', 'Open'), _new_value(obj, 'escalation_flag', False)), 1)
+
+    deltas = {user_id: d for user_id, d in deltas.items() if any(d.values())}
+    if not deltas:
+        return
+
+    connection = session.connection(bind_arguments={'mapper': UserCounter})
+    table = UserCounter.__table__
+    month = month_start.strftime('%Y-%m')
+    stale = []
+    for user_id, user_deltas in deltas.items():
+        result = connection.execute(
+            table.update().where(
+                table.c.user_id == user_id,
+                table.c.month == month
+            ).values({key: table.c[key] + value for key, value in user_deltas.items()})
+        )
+        if result.rowcount == 0:
+            stale.append(user_id)
+
+    # No row yet, or it belongs to last month: recount from the (already flushed) tables
+    if stale:
+        _store_counters(connection, compute_counters(connection, stale))
+
+@counters_cli.command('check')
+@click.option('--repair', is_flag=True, help='Rewrite counters that have drifted.')
+def check_counters_command(repair):
+    """Compare stored counters with the base tables, region by region."""
+    regions = current_app.config.get('REGION_DATABASES') or {}
+    users_by_region = {}
+    for user_id, region in db.session.query(User.id, User.region).all():
+        users_by_region.setdefault(region if region in regions else DEFAULT_REGION, []).append(user_id)
+
+    total = 0
+    total_drifted = 0
+    for region, user_ids in users_by_region.items():
+        with region_session(region) as session:
+            connection = session.connection(bind_arguments={'mapper': UserCounter})
+            expected = compute_counters(connection, user_ids)
+            stored = get_counters(session, user_ids)
+            stored_rows = {row.user_id for row in session.query(UserCounter).filter(
+                UserCounter.user_id.in_(user_ids),
+                UserCounter.month == _current_month()
+            ).all()}
+
+            drifted = {user_id: counts for user_id, counts in expected.items()
+                       if user_id not in stored_rows or stored[user_id] != counts}
+            for user_id, counts in drifted.items():
+                if user_id in stored_rows:
+                    click.echo(f"user {user_id}: stored {stored[user_id]} expected {counts}")
+                else:
+                    click.echo(f"user {user_id}: no counter row for this month")
+
+            if repair and drifted:
+                _store_counters(connection, drifted)
+                session.commit()
+
+        total += len(expected)
+        total_drifted += len(drifted)
+
+    if repair and total_drifted:
+        click.echo(f"Repaired {total_drifted} counters")
+    else:
+        click.echo(f"{total_drifted} of {total} counters drifted")
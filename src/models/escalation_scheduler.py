@@ -0,0 +1,82 @@
+import heapq
+
+from sqlalchemy import func, select
+from src.models.user import RESOLVED_STATUSES, User, Anomaly, Escalation, EscalationTarget, db
+from src.models.sharding import sharding_enabled
+from src.models.analytics import fan_out
+
+def open_escalation_counts(session):
+    """Unresolved escalated anomalies per engineer in one region, from a single grouped query"""
+    statement = select(
+        Escalation.escalated_to_id,
+        func.count(func.distinct(Escalation.anomaly_id))
+    ).join(
+        Anomaly, Escalation.anomaly_id == Anomaly.id
+    ).where(
+        Escalation.resolution_status.notin_(RESOLVED_STATUSES),
+        Anomaly.resolution_status.notin_(RESOLVED_STATUSES)
+    ).group_by(Escalation.escalated_to_id)
+    return dict(session.execute(statement, bind_arguments={'mapper': Escalation}).all())
+
+def engineer_loads():
+    """(engineer, weight, available, open escalations) for every Commercial Engineer.
+
+    Escalations live with the anomaly's region, so with sharding the counts
+    are summed over every region's database.
+    """
+    engineers = db.session.query(User, EscalationTarget).outerjoin(
+        EscalationTarget, EscalationTarget.user_id == User.id
+    ).filter(User.role == 'Commercial Engineer').order_by(User.id).all()
+
+    if sharding_enabled():
+        shards = fan_out(lambda session, region: open_escalation_counts(session))
+    else:
+        shards = [open_escalation_counts(db.session)]
+    counts = {}
+    for shard in shards:
+        for user_id, count in shard.items():
+            counts[user_id] = counts.get(user_id, 0) + count
+
+    return [
+        (
+            engineer,
+            target.weight if target else 1.0,
+            target.available if target else True,
+            counts.get(engineer.id, 0)
+        )
+        for engineer, target in engineers
+    ]
+
+class EscalationScheduler:
+    """Hands out escalations to the least-loaded available Commercial Engineer.
+
+    Loads are read once, when the scheduler is built, and every assignment
+    updates an in-memory heap, so escalating a whole backlog costs one
+    aggregate query plus O(log engineers) per anomaly. An engineer's load is
+    what their open escalations would be per unit of weight after taking one
+    more, so an engineer with weight 2 receives twice the share of one with
+    weight 1. Unavailable engineers and those with weight 0 get nothing.
+    """
+
+    def __init__(self, loads):
+        self._heap = []
+        for engineer, weight, available, open_escalations in loads:
+            if available and weight > 0:
+                self._heap.append(((open_escalations + 1) / weight, engineer.id, open_escalations, weight, engineer))
+        heapq.heapify(self._heap)
+
+    @classmethod
+    def load(cls):
+        return cls(engineer_loads())
+
+    def __bool__(self):
+        return bool(self._heap)
+
+    def assign(self):
+        """The engineer to receive the next escalation, or None when nobody is available"""
+        if not self._heap:
+            return None
+        _, engineer_id, open_escalations, weight, engineer = self._heap[0]
+        open_escalations += 1
+        heapq.heapreplace(self._heap, ((open_escalations + 1) / weight, engineer_id, open_escalations, weight, engineer))
+        return engineer
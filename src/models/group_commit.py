@@ -0,0 +1,127 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from sqlalchemy.orm import Session
+from src.models.sharding import DEFAULT_REGION, region_engine
+
+class GroupCommitWriter:
+    """Single writer thread that commits queued inserts in small batches.
+
+    A batch closes after max_batch rows or max_wait seconds from its first
+    row, whichever comes first, and is committed with one fsync. Each caller
+    gets a Future that resolves to its committed object. A writer thread
+    that died is restarted by the next submit, and write() gives up on a
+    stuck writer after `timeout` seconds.
+    """
+
+    def __init__(self, app, region=DEFAULT_REGION, max_batch=64, max_wait=0.005, timeout=5.0):
+        self.app = app
+        self.region = region
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, model, **values):
+        future = Future()
+        self._ensure_started()
+        self._queue.put((model, values, future))
+        return future
+
+    def write(self, model, **values):
+        """Commit one row through the writer and return it.
+
+        Returns None when the writer did not pick the row up within the
+        timeout; the row was withdrawn and the caller should commit it
+        itself. Raises TimeoutError if the writer picked it up but did not
+        finish in a second timeout, when it may or may not be committed.
+        """
+        future = self.submit(model, **values)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            if future.cancel():
+                return None
+        return future.result(timeout=self.timeout)
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        connection = None
+        with self.app.app_context():
+            while True:
+                # Rows whose caller gave up waiting are left for the caller to commit
+                batch = [item for item in self._next_batch() if item[2].set_running_or_notify_cancel()]
+                if not batch:
+                    continue
+                try:
+                    if connection is None:
+                        # The writer keeps one connection for itself so it never waits on the
+                        # pool behind the very requests that are waiting on it
+                        connection = region_engine(self.region).connect()
+                    self._commit(connection, batch)
+                except Exception as e:
+                    if connection is None:
+                        for item in batch:
+                            item[2].set_exception(e)
+                        continue
+                    # Commit rows one by one so a single bad row only fails its own caller
+                    failed = False
+                    for item in batch:
+                        try:
+                            self._commit(connection, [item])
+                        except Exception as item_error:
+                            item[2].set_exception(item_error)
+                            failed = True
+                    if failed:
+                        # The connection may be what is broken; open a new one for the next batch
+                        try:
+                            connection.close()
+                        except Exception:
+                            pass
+                        connection = None
+
+    def _commit(self, connection, batch):
+        with Session(bind=connection, expire_on_commit=False) as session:
+            objects = [model(**values) for model, values, _ in batch]
+            session.add_all(objects)
+            session.commit()
+        for obj, (_, _, future) in zip(objects, batch):
+            future.set_result(obj)
+
+def init_group_commit(app):
+    """Enable group commit for report submissions when GROUP_COMMIT=1, one writer per region"""
+    if os.environ.get('GROUP_COMMIT', '0') != '1':
+        return
+    regions = [DEFAULT_REGION] + list(app.config.get('REGION_DATABASES') or {})
+    app.extensions['group_commit'] = {
+        region: GroupCommitWriter(
+            app,
+            region=region,
+            max_batch=int(os.environ.get('GROUP_COMMIT_MAX_BATCH', '64')),
+            max_wait=float(os.environ.get('GROUP_COMMIT_MAX_WAIT_MS', '5')) / 1000,
+            timeout=float(os.environ.get('GROUP_COMMIT_TIMEOUT_MS', '5000')) / 1000
+        )
+        for region in regions
+    }
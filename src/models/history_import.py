@@ -0,0 +1,193 @@
+import glob
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import select
+from src.models.user import User, Report, ImportedWorkbook, UserCounter, db
+from src.models.sharding import DEFAULT_REGION, region_session
+from src.models.counters import compute_counters, _store_counters
+from src.models.shared_cache import bump_data_version
+from src.routes.export_service import invalidate_snapshots
+from src.models.workbook_parser import normalize_staff_number, parse_workbook
+
+history_cli = AppGroup('history', help='Import historical meter-reading workbooks.')
+
+MAX_REPORTED_ERRORS = 20
+
+def _workbook_paths(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            yield from sorted(glob.glob(os.path.join(path, '**', '*.xlsx'), recursive=True))
+        else:
+            yield path
+
+def _existing_keys(connection, keys):
+    """(staff_id, itin, report_date) keys from this batch that are already stored"""
+    table = Report.__table__
+    itins = sorted({itin for _, itin, _ in keys})
+    dates = [report_date for _, _, report_date in keys]
+    existing = set()
+    # Chunked IN lists keep SQLite under its bound-parameter limit; (itin, report_date) is indexed
+    for start in range(0, len(itins), 500):
+        existing.update(connection.execute(
+            select(table.c.staff_id, table.c.itin, table.c.report_date).where(
+                table.c.itin.in_(itins[start:start + 500]),
+                table.c.report_date >= min(dates),
+                table.c.report_date <= max(dates)
+            )
+        ).all())
+    return existing & keys
+
+def insert_reports(rows, staff, default_status, chunk_size):
+    """Insert parsed rows into each reader's region, skipping (staff, itin, date) duplicates.
+
+    Returns (imported, duplicate, rejected, touched_staff_ids_by_region, dates).
+    """
+    by_region = {}
+    rejected = 0
+    for staff_number, itin, report_date, percentage, reasons, status, notes in rows:
+        user = staff.get(staff_number)
+        if user is None:
+            rejected += 1
+            continue
+        user_id, region = user
+        by_region.setdefault(region, []).append({
+            'staff_id': user_id,
+            'itin': itin,
+            'report_date': report_date,
+            'percentage_attained': percentage,
+            'reasons_not_attained': reasons,
+            'status': status or default_status,
+            'notes_comments': notes
+        })
+
+    imported = duplicate = 0
+    touched = {}
+    dates = set()
+    for region, values in by_region.items():
+        with region_session(region) as session:
+            for start in range(0, len(values), chunk_size):
+                chunk = values[start:start + chunk_size]
+                connection = session.connection(bind_arguments={'mapper': Report})
+                keys = {(value['staff_id'], value['itin'], value['report_date']) for value in chunk}
+                seen = _existing_keys(connection, keys)
+
+                fresh = []
+                for value in chunk:
+                    key = (value['staff_id'], value['itin'], value['report_date'])
+                    if key in seen:
+                        duplicate += 1
+                        continue
+                    seen.add(key)
+                    fresh.append(value)
+
+                if fresh:
+                    connection.execute(Report.__table__.insert(), fresh)
+                    imported += len(fresh)
+                    touched.setdefault(region, set()).update(value['staff_id'] for value in fresh)
+                    dates.update(value['report_date'] for value in fresh)
+                session.commit()
+    return imported, duplicate, rejected, touched, dates
+
+@history_cli.command('import')
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('--workers', default=os.cpu_count() or 1, show_default=True, help='Parser processes.')
+@click.option('--chunk-size', default=1000, show_default=True, help='Rows per INSERT batch.')
+@click.option('--default-status', default='Approved', show_default=True, help='Status for rows without one.')
+@click.option('--force', is_flag=True, help='Re-read workbooks already recorded as imported.')
+def import_command(paths, workers, chunk_size, default_status, force):
+    """Load legacy .xlsx reading sheets (files or directories) into reports.
+
+    Workbooks are parsed in a process pool and written from this process in
+    chunks. A workbook is recorded once all its rows are stored, so an
+    interrupted run can simply be started again: finished files are skipped
+    and rows of a half-imported file are caught by the duplicate check.
+    """
+    started = time.perf_counter()
+    regions = current_app.config.get('REGION_DATABASES') or {}
+
+    # One lookup for every reader instead of a query per row
+    staff = {
+        normalize_staff_number(staff_number): (user_id, region if region in regions else DEFAULT_REGION)
+        for user_id, staff_number, region in db.session.query(User.id, User.staff_number, User.region).all()
+    }
+
+    done = {} if force else {
+        path: (size, modified_at)
+        for path, size, modified_at in db.session.query(ImportedWorkbook.path, ImportedWorkbook.size, ImportedWorkbook.modified_at).all()
+    }
+    pending = []
+    skipped = 0
+    for path in _workbook_paths(paths):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        if done.get(path) == (stat.st_size, stat.st_mtime):
+            skipped += 1
+        else:
+            pending.append((path, stat.st_size, stat.st_mtime))
+    click.echo(f"{len(pending)} workbooks to import, {skipped} already imported")
+
+    totals = {'imported': 0, 'duplicate': 0, 'rejected': 0, 'failed': 0}
+    touched = {}
+    changed_dates = set()
+    files = {path: (size, modified_at) for path, size, modified_at in pending}
+
+    # spawn: parsers must not inherit this process's database connections
+    with ProcessPoolExecutor(max_workers=max(1, workers), mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(parse_workbook, path) for path in files]
+        for number, future in enumerate(as_completed(futures), start=1):
+            try:
+                path, rows, errors = future.result()
+            except Exception as e:
+                totals['failed'] += 1
+                click.echo(f"[{number}/{len(files)}] failed: {e}")
+                continue
+
+            imported, duplicate, rejected, file_touched, dates = insert_reports(rows, staff, default_status, chunk_size)
+            rejected += len(errors)
+            for region, user_ids in file_touched.items():
+                touched.setdefault(region, set()).update(user_ids)
+            changed_dates.update(dates)
+
+            size, modified_at = files[path]
+            record = db.session.query(ImportedWorkbook).filter_by(path=path).first() or ImportedWorkbook(path=path)
+            record.size = size
+            record.modified_at = modified_at
+            record.rows_imported = imported
+            record.rows_duplicate = duplicate
+            record.rows_rejected = rejected
+            record.finished_at = datetime.utcnow()
+            db.session.add(record)
+            db.session.commit()
+
+            totals['imported'] += imported
+            totals['duplicate'] += duplicate
+            totals['rejected'] += rejected
+            click.echo(f"[{number}/{len(files)}] {os.path.basename(path)}: {imported} imported, {duplicate} duplicate, {rejected} rejected")
+            for error in errors[:MAX_REPORTED_ERRORS]:
+                click.echo(f"    {error}")
+            unknown = {row[0] for row in rows if row[0] not in staff}
+            if unknown:
+                click.echo(f"    unknown staff numbers: {', '.join(sorted(str(s) for s in unknown))}")
+
+    # Core inserts bypass the ORM flush hooks, so bring counters and snapshots up to date here
+    for region, user_ids in touched.items():
+        with region_session(region) as session:
+            connection = session.connection(bind_arguments={'mapper': UserCounter})
+            _store_counters(connection, compute_counters(connection, list(user_ids)))
+            session.commit()
+    invalidate_snapshots(changed_dates)
+    if totals['imported']:
+        bump_data_version(reports=True)
+
+    click.echo(
+        f"Imported {totals['imported']} reports ({totals['duplicate']} duplicates skipped, "
+        f"{totals['rejected']} rows rejected, {totals['failed']} workbooks failed) "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
@@ -0,0 +1,205 @@
+import time
+
+import click
+from flask.cli import AppGroup
+from src.models.sharding import DEFAULT_REGION, region_engine, region_names
+
+maintenance_cli = AppGroup('maintenance', help='SQLite statistics, vacuum and integrity checks.')
+
+# How long a maintenance statement waits for a busy writer before giving up
+BUSY_TIMEOUT_MS = 5000
+
+region_option = click.option('--region', 'regions', multiple=True, help='Only this region (repeatable). Defaults to all.')
+
+def _sqlite_connections(regions):
+    """Yield (region, connection) for every selected SQLite database"""
+    for region in regions or region_names():
+        engine = region_engine(region)
+        if engine.dialect.name != 'sqlite':
+            click.echo(f"[{region}] skipped: {engine.dialect.name} is not SQLite")
+            continue
+        with engine.connect() as connection:
+            connection.exec_driver_sql(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+            yield region, connection
+
+def _pragma(connection, statement):
+    return connection.exec_driver_sql(f'PRAGMA {statement}').scalar()
+
+def _cross_database_references(connection, foreign_keys):
+    """Split foreign_key_check rows into local problems and references to tables this file lacks.
+
+    Region shards only hold the sharded tables, so every staff_id there
+    points at a user table that lives on the primary. SQLite reports each
+    such row as an orphan; those are returned separately as
+    (table, column, parent, parent_column) so they can be checked against
+    the primary instead.
+    """
+    tables = {name for (name,) in connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'").all()}
+    local, remote = [], set()
+    for table, rowid, parent, fkid in foreign_keys:
+        if parent in tables:
+            local.append((table, rowid, parent, fkid))
+            continue
+        for row in connection.exec_driver_sql(f'PRAGMA foreign_key_list("{table}")').all():
+            if row[0] == fkid:
+                remote.add((table, row[3], parent, row[4] or 'rowid'))
+    return local, sorted(remote)
+
+def _missing_parents(connection, primary, reference):
+    """Values of a cross-database reference that the primary has no parent row for"""
+    table, column, parent, parent_column = reference
+    values = {value for (value,) in connection.exec_driver_sql(
+        f'SELECT DISTINCT "{column}" FROM "{table}" WHERE "{column}" IS NOT NULL'
+    ).all()}
+    existing = {value for (value,) in primary.exec_driver_sql(f'SELECT "{parent_column}" FROM "{parent}"').all()}
+    return sorted(values - existing)
+
+def _format_bytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+@maintenance_cli.command('analyze')
+@click.option('--full', is_flag=True, help='Run a full ANALYZE instead of PRAGMA optimize.')
+@click.option('--analysis-limit', default=1000, show_default=True, help='Rows sampled per index by PRAGMA optimize.')
+@region_option
+def analyze_command(full, analysis_limit, regions):
+    """Refresh the query planner statistics.
+
+    PRAGMA optimize with an analysis limit only re-analyzes tables whose
+    statistics look stale and reads a bounded sample, so it is cheap enough
+    to run from cron while the app serves traffic.
+    """
+    for region, connection in _sqlite_connections(regions):
+        started = time.perf_counter()
+        if full:
+            connection.exec_driver_sql('ANALYZE')
+        else:
+            connection.exec_driver_sql(f'PRAGMA analysis_limit = {int(analysis_limit)}')
+            connection.exec_driver_sql('PRAGMA optimize')
+        connection.commit()
+        click.echo(f"[{region}] {'ANALYZE' if full else 'optimize'} done in {time.perf_counter() - started:.2f}s")
+
+@maintenance_cli.command('vacuum')
+@click.option('--pages', default=2000, show_default=True, help='Maximum number of free pages to release.')
+@click.option('--step', default=200, show_default=True, help='Pages released per transaction.')
+@click.option('--enable', is_flag=True, help='Switch the database to incremental auto-vacuum (runs one full VACUUM).')
+@region_option
+def vacuum_command(pages, step, enable, regions):
+    """Release free pages back to the filesystem with incremental vacuum.
+
+    Pages are released in short transactions of --step pages so writers only
+    ever wait for one small step. Databases created without incremental
+    auto-vacuum need a one-off --enable, which rewrites the whole file and
+    should be run in a quiet period.
+    """
+    for region, connection in _sqlite_connections(regions):
+        mode = _pragma(connection, 'auto_vacuum')
+        if mode != 2:
+            if not enable:
+                click.echo(f"[{region}] auto_vacuum is not INCREMENTAL; run with --enable once during a quiet period")
+                continue
+            started = time.perf_counter()
+            connection.exec_driver_sql('PRAGMA auto_vacuum = INCREMENTAL')
+            connection.commit()
+            # VACUUM cannot run inside a transaction
+            connection.connection.driver_connection.execute('VACUUM')
+            click.echo(f"[{region}] switched to incremental auto-vacuum in {time.perf_counter() - started:.2f}s")
+
+        page_size = _pragma(connection, 'page_size')
+        free_before = _pragma(connection, 'freelist_count')
+        remaining = min(pages, free_before)
+        started = time.perf_counter()
+        while remaining > 0:
+            batch = min(step, remaining)
+            # sqlite3's execute() steps a statement only once, which frees a single
+            # page; executescript() runs it to completion in its own transaction
+            connection.connection.driver_connection.executescript(f'PRAGMA incremental_vacuum({batch})')
+            remaining -= batch
+
+        # In WAL mode the file only shrinks once the freed pages are checkpointed
+        if _pragma(connection, 'journal_mode') == 'wal':
+            connection.exec_driver_sql('PRAGMA wal_checkpoint(PASSIVE)').all()
+        connection.commit()
+
+        free_after = _pragma(connection, 'freelist_count')
+        released = free_before - free_after
+        click.echo(
+            f"[{region}] released {released} pages ({_format_bytes(released * page_size)}) "
+            f"in {time.perf_counter() - started:.2f}s; {free_after} free pages left"
+        )
+
+@maintenance_cli.command('integrity')
+@click.option('--full', is_flag=True, help='Run integrity_check, which also verifies index contents.')
+@region_option
+def integrity_command(full, regions):
+    """Check the database files for corruption; exits non-zero on any problem."""
+    failed = False
+    primary_engine = region_engine(DEFAULT_REGION)
+    for region, connection in _sqlite_connections(regions):
+        started = time.perf_counter()
+        pragma = 'integrity_check' if full else 'quick_check'
+        problems = [row[0] for row in connection.exec_driver_sql(f'PRAGMA {pragma}').all()]
+        foreign_keys, references = _cross_database_references(
+            connection, connection.exec_driver_sql('PRAGMA foreign_key_check').all()
+        )
+        missing = {}
+        if references:
+            with primary_engine.connect() as primary:
+                for reference in references:
+                    values = _missing_parents(connection, primary, reference)
+                    if values:
+                        missing[reference] = values
+        connection.commit()
+
+        if problems == ['ok'] and not foreign_keys and not missing:
+            click.echo(f"[{region}] {pragma} ok in {time.perf_counter() - started:.2f}s")
+            continue
+
+        failed = True
+        for problem in problems:
+            if problem != 'ok':
+                click.echo(f"[{region}] {problem}")
+        for table, rowid, parent, _ in foreign_keys:
+            click.echo(f"[{region}] {table} row {rowid} references a missing {parent}")
+        for (table, column, parent, parent_column), values in missing.items():
+            shown = ', '.join(str(value) for value in values[:20])
+            more = f" and {len(values) - 20} more" if len(values) > 20 else ''
+            click.echo(f"[{region}] {table}.{column} references {parent}.{parent_column} values missing on the primary: {shown}{more}")
+
+    if failed:
+        raise SystemExit(1)
+
+@maintenance_cli.command('sizes')
+@region_option
+def sizes_command(regions):
+    """Row counts and on-disk size of every table and index."""
+    for region, connection in _sqlite_connections(regions):
+        page_size = _pragma(connection, 'page_size')
+        page_count = _pragma(connection, 'page_count')
+        free_pages = _pragma(connection, 'freelist_count')
+
+        objects = connection.exec_driver_sql(
+            "SELECT name, type, tbl_name FROM sqlite_master "
+            "WHERE type IN ('table', 'index') AND name NOT LIKE 'sqlite_%' ORDER BY tbl_name, type DESC, name"
+        ).all()
+        try:
+            sizes = dict(connection.exec_driver_sql(
+                "SELECT name, SUM(pgsize) FROM dbstat GROUP BY name"
+            ).all())
+        except Exception:
+            # Built without SQLITE_ENABLE_DBSTAT_VTAB
+            sizes = {}
+
+        row_counts = {}
+        click.echo(f"[{region}] {_format_bytes(page_count * page_size)} in {page_count} pages, "
+                   f"{free_pages} free ({_format_bytes(free_pages * page_size)})")
+        click.echo(f"  {'name':<40} {'type':<6} {'rows':>10} {'size':>10}")
+        for name, object_type, table_name in objects:
+            if table_name not in row_counts:
+                row_counts[table_name] = connection.exec_driver_sql(f'SELECT COUNT(*) FROM "{table_name}"').scalar()
+            size = _format_bytes(sizes[name]) if name in sizes else '-'
+            label = name if object_type == 'table' else f"  {name}"
+            click.echo(f"  {label:<40} {object_type:<6} {row_counts[table_name]:>10} {size:>10}")
+        connection.commit()
@@ -0,0 +1,132 @@
+import json
+import os
+from flask import current_app
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import inspect, literal
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.util import find_tables
+
+DEFAULT_REGION = 'default'
+
+# Per-region data; users, export jobs and everything else stay in the primary database
+SHARDED_TABLES = ('report', 'anomaly', 'anomaly_status_change', 'attachment', 'escalation', 'tombstone', 'user_counter', 'team_scope')
+
+def _bind_key(region):
+    return f'region_{region}'
+
+def configure_regions(app):
+    """Register one database bind per region from REGION_DATABASES.
+
+    REGION_DATABASES is a JSON object of region name to database URI. The
+    'default' region, and any user whose region is not listed, uses the
+    primary database. Must run before db.init_app.
+    """
+    regions = app.config.get('REGION_DATABASES') or json.loads(os.environ.get('REGION_DATABASES', '{}'))
+    regions.pop(DEFAULT_REGION, None)
+    app.config['REGION_DATABASES'] = regions
+
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for region, uri in regions.items():
+        binds[_bind_key(region)] = uri
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+def add_missing_columns(engine, tables):
+    """ALTER TABLE ... ADD COLUMN for model columns the database does not have yet.
+
+    create_all never changes a table that already exists, so columns added to
+    existing models would otherwise be missing from older database files.
+    Scalar defaults become the column's DEFAULT, which also fills existing
+    rows; callable defaults such as updated_at are evaluated once and written
+    to the existing rows. Returns the "table.column" names added.
+    """
+    added = []
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                definition = f'"{column.name}" {column.type.compile(dialect=engine.dialect)}'
+                default = column.default
+                if default is not None and default.is_scalar:
+                    value = literal(default.arg, column.type).compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True})
+                    definition += f' DEFAULT {value}'
+                    if not column.nullable:
+                        definition += ' NOT NULL'
+                connection.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN {definition}')
+                if default is not None and default.is_callable:
+                    connection.execute(table.update().values({column.name: default.arg(None)}))
+                added.append(f'{table.name}.{column.name}')
+    return added
+
+def create_region_tables(app):
+    with app.app_context():
+        db = app.extensions['sqlalchemy']
+        tables = [db.metadata.tables[name] for name in SHARDED_TABLES]
+        for region in app.config['REGION_DATABASES']:
+            db.metadata.create_all(db.engines[_bind_key(region)], tables=tables)
+        # create_all skips tables that already exist, so add columns and indexes introduced since
+        engines = [(db.engine, list(db.metadata.sorted_tables))] + [
+            (db.engines[_bind_key(region)], tables) for region in app.config['REGION_DATABASES']
+        ]
+        for engine, engine_tables in engines:
+            for added in add_missing_columns(engine, engine_tables):
+                app.logger.info('Added missing column %s to %s', added, engine.url)
+            for table in engine_tables:
+                for index in table.indexes:
+                    index.create(engine, checkfirst=True)
+
+def sharding_enabled():
+    return bool(current_app.config.get('REGION_DATABASES'))
+
+def region_names():
+    return [DEFAULT_REGION] + list(current_app.config.get('REGION_DATABASES') or {})
+
+def filter_by_region(query, region_column, region):
+    """Limit a user query to the users whose data lives in the given region"""
+    if not sharding_enabled():
+        return query
+    configured = list(current_app.config['REGION_DATABASES'])
+    if region == DEFAULT_REGION:
+        return query.filter(region_column.notin_(configured))
+    return query.filter(region_column == region)
+
+def region_engine(region):
+    db = current_app.extensions['sqlalchemy']
+    if region in (current_app.config.get('REGION_DATABASES') or {}):
+        return db.engines[_bind_key(region)]
+    return db.engine
+
+def _is_sharded(mapper, clause):
+    if mapper is not None:
+        return inspect(mapper).local_table.name in SHARDED_TABLES
+    if clause is not None:
+        return any(getattr(table, 'name', None) in SHARDED_TABLES for table in find_tables(clause, include_crud=True))
+    return False
+
+class RegionSession(FlaskSession):
+    """Session that sends sharded tables to the active region's database"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        region = self.info.get('region', DEFAULT_REGION)
+        if bind is None and region != DEFAULT_REGION and _is_sharded(mapper, clause):
+            return self._db.engines[_bind_key(region)]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def current_region():
+    return current_app.extensions['sqlalchemy'].session.info.get('region', DEFAULT_REGION)
+
+def activate_region(user):
+    """Route this request's sharded queries to the user's region"""
+    if user is not None and sharding_enabled():
+        region = user.region if user.region in current_app.config['REGION_DATABASES'] else DEFAULT_REGION
+        current_app.extensions['sqlalchemy'].session.info['region'] = region
+
+def region_session(region):
+    """Standalone session whose sharded tables live in one region's database"""
+    db = current_app.extensions['sqlalchemy']
+    engine = region_engine(region)
+    return Session(bind=db.engine, binds={db.metadata.tables[name]: engine for name in SHARDED_TABLES})
@@ -0,0 +1,266 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from src.models.user import User, Report, Anomaly, Escalation
+from src.models.sharding import current_region, sharding_enabled
+
+# Models whose changes make cached dashboard payloads stale. Users only count
+# when added or removed or when the fields that scope them change; logins
+# update them all the time.
+VERSIONED_MODELS = (Report, Anomaly, Escalation)
+VERSIONED_USER_FIELDS = ('role', 'region')
+DATA_VERSION = 'data'
+# Bumped only when reports change, for payloads that read nothing else
+REPORTS_VERSION = 'reports'
+
+class SharedCache:
+    """Key/value cache in a local SQLite file, shared by every worker process on the host.
+
+    Entries expire after their TTL, and once the stored values exceed
+    max_bytes the least recently used ones are evicted. A version table
+    holds counters that writers bump, so keys that embed a version go stale
+    as soon as the data changes, in every worker at once.
+    """
+
+    def __init__(self, path, namespace='', max_bytes=64 * 1024 * 1024, lock_timeout=10.0):
+        self.path = path
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.lock_timeout = lock_timeout
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._connect().executescript('''
+            CREATE TABLE IF NOT EXISTS cache_entry (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_cache_entry_accessed_at ON cache_entry (accessed_at);
+            CREATE TABLE IF NOT EXISTS cache_version (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS cache_lock (
+                key TEXT PRIMARY KEY,
+                expires_at REAL NOT NULL
+            );
+        ''')
+
+    def _connect(self):
+        # One connection per thread, and a new one after a pre-forking server forks us
+        if getattr(self._local, 'pid', None) != os.getpid():
+            # Autocommit; every statement here is a single short write or read
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def get(self, key):
+        key = self.namespace + key
+        connection = self._connect()
+        now = time.time()
+        row = connection.execute(
+            'SELECT value, accessed_at FROM cache_entry WHERE key = ? AND expires_at > ?', (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        # Recency only needs to be roughly right for eviction; skip the write on hot keys
+        if now - row[1] > 1:
+            connection.execute('UPDATE cache_entry SET accessed_at = ? WHERE key = ?', (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        key = self.namespace + key
+        connection = self._connect()
+        payload = json.dumps(value, separators=(',', ':'), default=str)
+        now = time.time()
+        connection.execute(
+            'INSERT OR REPLACE INTO cache_entry (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)',
+            (key, payload, len(payload), now + ttl, now)
+        )
+        self._evict(connection, now)
+
+    def _evict(self, connection, now):
+        total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM cache_entry').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        connection.execute('DELETE FROM cache_entry WHERE expires_at <= ?', (now,))
+        total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM cache_entry').fetchone()[0]
+        excess = total - self.max_bytes
+        if excess <= 0:
+            return
+        evicted = 0
+        keys = []
+        for key, size in connection.execute('SELECT key, size FROM cache_entry ORDER BY accessed_at'):
+            keys.append(key)
+            evicted += size
+            if evicted >= excess:
+                break
+        connection.executemany('DELETE FROM cache_entry WHERE key = ?', [(key,) for key in keys])
+
+    def version(self, name=DATA_VERSION):
+        row = self._connect().execute('SELECT version FROM cache_version WHERE name = ?', (self.namespace + name,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, name=DATA_VERSION):
+        self._connect().execute(
+            'INSERT INTO cache_version (name, version) VALUES (?, 1) '
+            'ON CONFLICT(name) DO UPDATE SET version = version + 1',
+            (self.namespace + name,)
+        )
+
+    def get_or_compute(self, key, ttl, compute):
+        """Cached value for key, computing it in only one worker when it is missing.
+
+        Workers that lose the race for the compute lock poll for the result
+        instead of running the same aggregate; if the winner takes longer than
+        lock_timeout they compute it themselves. The cache is only an
+        optimisation, so if its file is locked, full or corrupt the value is
+        computed directly.
+        """
+        lock = self.namespace + key
+        try:
+            value = self.get(key)
+            if value is not None:
+                return value
+
+            connection = self._connect()
+            deadline = time.time() + self.lock_timeout
+            while True:
+                now = time.time()
+                connection.execute('DELETE FROM cache_lock WHERE key = ? AND expires_at <= ?', (lock, now))
+                acquired = connection.execute(
+                    'INSERT OR IGNORE INTO cache_lock (key, expires_at) VALUES (?, ?)', (lock, now + self.lock_timeout)
+                ).rowcount
+                if acquired:
+                    break
+                time.sleep(0.05)
+                value = self.get(key)
+                if value is not None:
+                    return value
+                if time.time() > deadline:
+                    return compute()
+        except sqlite3.Error as error:
+            _log_cache_error('read', error)
+            return compute()
+
+        try:
+            value = compute()
+            try:
+                self.set(key, value, ttl)
+            except sqlite3.Error as error:
+                _log_cache_error('write', error)
+            return value
+        finally:
+            try:
+                connection.execute('DELETE FROM cache_lock WHERE key = ?', (lock,))
+            except sqlite3.Error as error:
+                # The lock expires after lock_timeout anyway
+                _log_cache_error('unlock', error)
+
+def _log_cache_error(action, error):
+    if has_app_context():
+        current_app.logger.warning('Shared cache %s failed: %s', action, error)
+
+def init_shared_cache(app):
+    path = os.environ.get(
+        'SHARED_CACHE_PATH',
+        os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'shared_cache.db')
+    )
+    max_bytes = int(os.environ.get('SHARED_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+    # Apps pointed at different databases can share the file without seeing each other's entries
+    namespace = hashlib.sha1(app.config['SQLALCHEMY_DATABASE_URI'].encode()).hexdigest()[:12] + ':'
+    app.extensions['shared_cache'] = SharedCache(path, namespace=namespace, max_bytes=max_bytes)
+
+def shared_cache():
+    return current_app.extensions.get('shared_cache')
+
+def cached_payload(endpoint, user, params, ttl, compute, version=DATA_VERSION):
+    """Compute a payload once per data version, shared by every worker.
+
+    The key carries the role scope (every region for Commercial Engineers,
+    the supervisor for team-scoped Supervisors, otherwise the user's region),
+    the request parameters and the current data version, which any commit
+    touching reports, anomalies, escalations, user roles or regions, or
+    teams bumps. Payloads built from reports alone can pass
+    version=REPORTS_VERSION so anomaly and escalation writes leave them
+    cached. If the cache file cannot be used the payload is computed.
+    """
+    # teams imports this module for bump_data_version
+    from src.models.teams import team_supervisor_id
+
+    cache = shared_cache()
+    if cache is None:
+        return compute()
+    supervisor_id = team_supervisor_id(user)
+    if supervisor_id is not None:
+        scope = f"region={current_region()}:team={supervisor_id}"
+    elif user.role == 'Commercial Engineer' and sharding_enabled():
+        scope = 'all'
+    else:
+        scope = f"region={current_region()}"
+    try:
+        data_version = cache.version(version)
+    except sqlite3.Error as error:
+        _log_cache_error('read', error)
+        return compute()
+    key = f"{endpoint}:{scope}:{params}:v{data_version}"
+    return cache.get_or_compute(key, ttl, compute)
+
+def bump_data_version(reports=False):
+    """Invalidate cached payloads; reports=True also for report-only payloads"""
+    cache = shared_cache() if has_app_context() else None
+    if cache is None:
+        return
+    try:
+        cache.bump()
+        if reports:
+            cache.bump(REPORTS_VERSION)
+    except sqlite3.Error as error:
+        # Runs after the data is committed; stale payloads age out with their TTL
+        _log_cache_error('version bump', error)
+
+# Bump the data version once per commit that touched dashboard data
+
+@event.listens_for(Session, 'after_flush')
+def _note_versioned_changes(session, flush_context):
+    if session.info.get('reports_changed'):
+        return
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, VERSIONED_MODELS + (User,)):
+            session.info['data_changed'] = True
+            if isinstance(obj, Report):
+                session.info['reports_changed'] = True
+                return
+    for obj in session.dirty:
+        if isinstance(obj, VERSIONED_MODELS) and session.is_modified(obj, include_collections=False):
+            session.info['data_changed'] = True
+            if isinstance(obj, Report):
+                session.info['reports_changed'] = True
+                return
+        if isinstance(obj, User) and any(inspect(obj).attrs[key].history.has_changes() for key in VERSIONED_USER_FIELDS):
+            # Report-only payloads are keyed by the user's region and team too
+            session.info['data_changed'] = True
+            session.info['reports_changed'] = True
+            return
+
+@event.listens_for(Session, 'after_commit')
+def _bump_after_commit(session):
+    reports_changed = session.info.pop('reports_changed', False)
+    if session.info.pop('data_changed', None):
+        bump_data_version(reports=reports_changed)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_versioned_changes(session):
+    session.info.pop('data_changed', None)
+    session.info.pop('reports_changed', None)
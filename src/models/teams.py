@@ -0,0 +1,170 @@
+import time
+
+import click
+from flask import current_app, g, has_app_context
+from flask.cli import AppGroup
+from sqlalchemy import and_, event, exists, inspect, select
+from sqlalchemy.orm import Session
+from src.models.user import User, Team, TeamMember, TeamScope, db
+from src.models.sharding import DEFAULT_REGION, region_names, region_session
+from src.models.shared_cache import bump_data_version
+
+teams_cli = AppGroup('teams', help='Team hierarchy and supervisor scope maintenance.')
+
+def compute_scope(teams, members):
+    """(supervisor_id, user_id) pairs for every team supervisor.
+
+    teams maps team id to (parent_id, supervisor_id) and members maps team id
+    to its user ids. A supervisor sees themselves, the members of their teams
+    and the members of every team nested below them, however deep.
+    """
+    children = {}
+    for team_id, (parent_id, _) in teams.items():
+        children.setdefault(parent_id, []).append(team_id)
+
+    pairs = set()
+    for team_id, (_, supervisor_id) in teams.items():
+        if supervisor_id is None:
+            continue
+        pairs.add((supervisor_id, supervisor_id))
+        stack = [team_id]
+        seen = set()
+        while stack:
+            current = stack.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            pairs.update((supervisor_id, user_id) for user_id in members.get(current, ()))
+            stack.extend(children.get(current, ()))
+    return pairs
+
+def rebuild_team_scope():
+    """Recompute the closure table and store each reader's rows in their region's database.
+
+    Returns the number of rows written. The hierarchy is small, so the whole
+    table is replaced in one transaction per region.
+    """
+    # Its own session: this runs from after_commit, when the caller's session cannot query
+    with region_session(DEFAULT_REGION) as session:
+        teams = {team_id: (parent_id, supervisor_id) for team_id, parent_id, supervisor_id in
+                 session.query(Team.id, Team.parent_id, Team.supervisor_id).all()}
+        members = {}
+        for team_id, user_id in session.query(TeamMember.team_id, TeamMember.user_id).all():
+            members.setdefault(team_id, []).append(user_id)
+        user_regions = dict(session.query(User.id, User.region).all())
+    pairs = compute_scope(teams, members)
+
+    configured = current_app.config.get('REGION_DATABASES') or {}
+    by_region = {}
+    for supervisor_id, reader_id in pairs:
+        region = user_regions.get(reader_id)
+        region = region if region in configured else DEFAULT_REGION
+        by_region.setdefault(region, []).append({'supervisor_id': supervisor_id, 'reader_id': reader_id})
+
+    table = TeamScope.__table__
+    for region in region_names():
+        with region_session(region) as session:
+            connection = session.connection(bind_arguments={'mapper': TeamScope})
+            connection.execute(table.delete())
+            if by_region.get(region):
+                connection.execute(table.insert(), by_region[region])
+            session.commit()
+
+    # Cached payloads are keyed per supervisor but not per team layout
+    bump_data_version(reports=True)
+    return len(pairs)
+
+def team_supervisor_id(user):
+    """The user's id when their queries are limited to their teams, else None.
+
+    Only Supervisors who own a team are scoped; Commercial Engineers, and
+    Supervisors not yet given a team, keep seeing every reader in their
+    region.
+    """
+    if user is None or user.role != 'Supervisor':
+        return None
+    memo = g.setdefault('team_supervisors', {}) if has_app_context() else {}
+    if user.id not in memo:
+        owns_team = db.session.query(exists().where(Team.supervisor_id == user.id)).scalar()
+        memo[user.id] = user.id if owns_team else None
+    return memo[user.id]
+
+def scope_to_team(query, supervisor_id, staff_column):
+    """Join a query against the closure table so it only returns the supervisor's readers.
+
+    The join starts from the supervisor's (supervisor_id, reader_id) primary
+    key range and reaches the data through indexes on staff_id, so the scan
+    is proportional to the team rather than the region.
+    """
+    if supervisor_id is None:
+        return query
+    return query.join(TeamScope, and_(TeamScope.reader_id == staff_column, TeamScope.supervisor_id == supervisor_id))
+
+def team_reader_ids(session, supervisor_id):
+    """Ids of every user in the supervisor's scope, read from the closure table"""
+    return session.execute(
+        select(TeamScope.reader_id).where(TeamScope.supervisor_id == supervisor_id),
+        bind_arguments={'mapper': TeamScope}
+    ).scalars().all()
+
+def in_team_scope(user, staff_id):
+    """False only when a team-scoped supervisor asks about someone outside their teams"""
+    supervisor_id = team_supervisor_id(user)
+    if supervisor_id is None:
+        return True
+    return db.session.query(exists().where(
+        TeamScope.supervisor_id == supervisor_id,
+        TeamScope.reader_id == staff_id
+    )).scalar()
+
+# Rebuild the closure table after any commit that changed teams, memberships or users
+
+@event.listens_for(Session, 'after_flush')
+def _note_team_changes(session, flush_context):
+    if session.info.get('teams_changed'):
+        return
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, (Team, TeamMember, User)):
+            session.info['teams_changed'] = True
+            return
+    for obj in session.dirty:
+        if isinstance(obj, (Team, TeamMember)) and session.is_modified(obj, include_collections=False):
+            session.info['teams_changed'] = True
+            return
+        if isinstance(obj, User) and any(inspect(obj).attrs[key].history.has_changes() for key in ('role', 'region')):
+            session.info['teams_changed'] = True
+            return
+
+@event.listens_for(Session, 'after_commit')
+def _rebuild_after_commit(session):
+    if session.info.pop('teams_changed', None) and has_app_context():
+        rebuild_team_scope()
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_team_changes(session):
+    session.info.pop('teams_changed', None)
+
+@teams_cli.command('rebuild')
+def rebuild_command():
+    """Recompute the supervisor scope table from the team hierarchy."""
+    started = time.perf_counter()
+    count = rebuild_team_scope()
+    click.echo(f"Rebuilt team scope: {count} supervisor/reader pairs in {time.perf_counter() - started:.2f}s")
+
+@teams_cli.command('show')
+@click.argument('staff_number')
+def show_command(staff_number):
+    """List the users a supervisor's queries are limited to."""
+    user = User.query.filter_by(staff_number=staff_number).first()
+    if user is None:
+        raise click.ClickException(f"No user with staff number {staff_number}")
+    supervisor_id = team_supervisor_id(user)
+    if supervisor_id is None:
+        click.echo(f"{staff_number} is not scoped to a team; they see every reader in their region")
+        return
+    reader_ids = set()
+    for region in region_names():
+        with region_session(region) as session:
+            reader_ids.update(team_reader_ids(session, supervisor_id))
+    staff_numbers = sorted(number for (number,) in db.session.query(User.staff_number).filter(User.id.in_(reader_ids)).all())
+    click.echo(f"{staff_number} sees {len(staff_numbers)} users: {', '.join(staff_numbers)}")
@@ -1,8 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+import json
 from werkzeug.security import generate_password_hash, check_password_hash
+from src.models.sharding import RegionSession, DEFAULT_REGION
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RegionSession})
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -11,6 +13,7 @@ class User(db.Model):
     role = db.Column(db.String(50), nullable=False)
     security_question = db.Column(db.String(255))
     security_answer_hash = db.Column(db.String(255))
+    region = db.Column(db.String(50), nullable=False, default=DEFAULT_REGION, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def __repr__(self):
@@ -33,10 +36,48 @@ class User(db.Model):
             'id': self.id,
             'staff_number': self.staff_number,
             'role': self.role,
+            'region': self.region,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class Team(db.Model):
+    """Group of users under one supervisor; teams nest through parent_id"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    parent_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=True, index=True)
+    supervisor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    supervisor = db.relationship('User', foreign_keys=[supervisor_id])
+    members = db.relationship('TeamMember', backref='team', lazy=True, cascade='all, delete-orphan')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'parent_id': self.parent_id,
+            'supervisor_id': self.supervisor_id,
+            'supervisor_staff_number': self.supervisor.staff_number if self.supervisor else None,
+            'member_ids': sorted(member.user_id for member in self.members),
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class TeamMember(db.Model):
+    """A user's team; each user belongs to at most one"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=False, index=True)
+
+class TeamScope(db.Model):
+    """Closure of the team hierarchy: every user a supervisor may see, rebuilt by src.models.teams"""
+    supervisor_id = db.Column(db.Integer, primary_key=True)
+    reader_id = db.Column(db.Integer, primary_key=True)
+
 class Report(db.Model):
+    __table_args__ = (
+        db.Index('ix_report_itin_report_date', 'itin', 'report_date'),
+        db.Index('ix_report_staff_id_report_date', 'staff_id', 'report_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     itin = db.Column(db.String(50), nullable=False)
     report_date = db.Column(db.Date, nullable=False)
@@ -46,6 +87,7 @@ class Report(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default='Pending')
     notes_comments = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     staff = db.relationship('User', backref=db.backref('reports', lazy=True))
 
@@ -60,10 +102,18 @@ class Report(db.Model):
             'staff_number': self.staff.staff_number if self.staff else None,
             'timestamp': self.timestamp.isoformat() if self.timestamp else None,
             'status': self.status,
-            'notes_comments': self.notes_comments
+            'notes_comments': self.notes_comments,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+# Anomaly statuses that stop the resolution clock
+RESOLVED_STATUSES = ['Resolved', 'Closed']
+
 class Anomaly(db.Model):
+    __table_args__ = (
+        db.Index('ix_anomaly_staff_id_timestamp', 'staff_id', 'timestamp'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     report_id = db.Column(db.Integer, db.ForeignKey('report.id'), nullable=True)
     type = db.Column(db.String(100), nullable=False)
@@ -73,6 +123,8 @@ class Anomaly(db.Model):
     assigned_to_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     resolution_status = db.Column(db.String(20), default='Open')
     staff_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    resolved_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     report = db.relationship('Report', backref=db.backref('anomalies', lazy=True))
     assigned_to = db.relationship('User', foreign_keys=[assigned_to_id], backref=db.backref('assigned_anomalies', lazy=True))
@@ -90,7 +142,61 @@ class Anomaly(db.Model):
             'assigned_to_staff_number': self.assigned_to.staff_number if self.assigned_to else None,
             'resolution_status': self.resolution_status,
             'staff_id': self.staff_id,
-            'staff_number': self.staff.staff_number if self.staff else None
+            'staff_number': self.staff.staff_number if self.staff else None,
+            'attachments': [attachment.to_dict() for attachment in self.attachments],
+            'resolved_at': self.resolved_at.isoformat() if self.resolved_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class AnomalyStatusChange(db.Model):
+    """One resolution_status transition, recorded automatically on flush"""
+    id = db.Column(db.Integer, primary_key=True)
+    anomaly_id = db.Column(db.Integer, db.ForeignKey('anomaly.id'), nullable=False, index=True)
+    from_status = db.Column(db.String(20))
+    to_status = db.Column(db.String(20), nullable=False)
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    anomaly = db.relationship('Anomaly', backref=db.backref('status_changes', lazy=True, order_by='AnomalyStatusChange.id'))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'anomaly_id': self.anomaly_id,
+            'from_status': self.from_status,
+            'to_status': self.to_status,
+            'changed_at': self.changed_at.isoformat() if self.changed_at else None
+        }
+
+class Attachment(db.Model):
+    """Photo or other evidence on an anomaly, uploaded in resumable chunks"""
+    id = db.Column(db.Integer, primary_key=True)
+    anomaly_id = db.Column(db.Integer, db.ForeignKey('anomaly.id'), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    content_type = db.Column(db.String(100), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False)
+    received_bytes = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False, default='Uploading')
+    storage_path = db.Column(db.String(500), nullable=False)
+    thumbnail_path = db.Column(db.String(500))
+    uploaded_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    anomaly = db.relationship('Anomaly', backref=db.backref('attachments', lazy=True, order_by='Attachment.id'))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'anomaly_id': self.anomaly_id,
+            'filename': self.filename,
+            'content_type': self.content_type,
+            'size': self.size,
+            'sha256': self.sha256,
+            'received_bytes': self.received_bytes,
+            'status': self.status,
+            'has_thumbnail': self.thumbnail_path is not None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
 class Escalation(db.Model):
@@ -99,6 +205,8 @@ class Escalation(db.Model):
     escalation_timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     escalated_to_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     resolution_status = db.Column(db.String(20), default='Pending')
+    notified_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     anomaly = db.relationship('Anomaly', backref=db.backref('escalations', lazy=True))
     escalated_to = db.relationship('User', backref=db.backref('escalations_received', lazy=True))
@@ -110,6 +218,96 @@ class Escalation(db.Model):
             'escalation_timestamp': self.escalation_timestamp.isoformat() if self.escalation_timestamp else None,
             'escalated_to_id': self.escalated_to_id,
             'escalated_to_staff_number': self.escalated_to.staff_number if self.escalated_to else None,
-            'resolution_status': self.resolution_status
+            'resolution_status': self.resolution_status,
+            'notified_at': self.notified_at.isoformat() if self.notified_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class EscalationTarget(db.Model):
+    """Commercial Engineer's share of new escalations; engineers without a row get weight 1"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    weight = db.Column(db.Float, nullable=False, default=1.0)
+    available = db.Column(db.Boolean, nullable=False, default=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'weight': self.weight,
+            'available': self.available,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class UserCounter(db.Model):
+    """Denormalized per-user counts kept up to date by src.models.counters"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    pending_reports = db.Column(db.Integer, nullable=False, default=0)
+    open_anomalies = db.Column(db.Integer, nullable=False, default=0)
+    escalated_anomalies = db.Column(db.Integer, nullable=False, default=0)
+    reports_this_month = db.Column(db.Integer, nullable=False, default=0)
+    month = db.Column(db.String(7), nullable=False)
+
+    def to_dict(self):
+        return {
+            'pending_reports': self.pending_reports,
+            'open_anomalies': self.open_anomalies,
+            'escalated_anomalies': self.escalated_anomalies,
+            'reports_this_month': self.reports_this_month
+        }
+
+class ExportJob(db.Model):
+    """Background report export requested through POST /api/exports"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    filters = db.Column(db.Text, nullable=False, default='{}')
+    format = db.Column(db.String(10), nullable=False, default='excel')
+    status = db.Column(db.String(20), nullable=False, default='Queued')
+    total_rows = db.Column(db.Integer)
+    processed_rows = db.Column(db.Integer, nullable=False, default=0)
+    file_path = db.Column(db.String(500))
+    error = db.Column(db.Text)
+    # host:pid of the process running the job, to spot jobs orphaned by a restart
+    worker = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'format': self.format,
+            'filters': json.loads(self.filters) if self.filters else {},
+            'total_rows': self.total_rows,
+            'processed_rows': self.processed_rows,
+            'progress': round(self.processed_rows / self.total_rows * 100, 1) if self.total_rows else (100.0 if self.status == 'Completed' else 0.0),
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
         }
 
+class Tombstone(db.Model):
+    """Record of a deleted report, anomaly or escalation, kept for delta sync"""
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(50), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    staff_id = db.Column(db.Integer, nullable=True)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def to_dict(self):
+        return {
+            'table': self.table_name,
+            'id': self.row_id,
+            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None
+        }
+
+
+class ImportedWorkbook(db.Model):
+    """Legacy workbook already loaded by `flask history import`, so reruns can skip it"""
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String(500), unique=True, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    modified_at = db.Column(db.Float, nullable=False)
+    rows_imported = db.Column(db.Integer, nullable=False, default=0)
+    rows_duplicate = db.Column(db.Integer, nullable=False, default=0)
+    rows_rejected = db.Column(db.Integer, nullable=False, default=0)
+    finished_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,114 @@
+import os
+import re
+from datetime import date, datetime
+
+from openpyxl import load_workbook
+
+# Parsing for `flask history import`. Kept free of Flask and database imports
+# because it runs in worker processes that start from a fresh interpreter.
+
+# Header spellings seen in the legacy sheets, normalised to lower case without punctuation
+COLUMN_ALIASES = {
+    'staff_number': ['staff number', 'staff no', 'staff', 'staff id', 'reader', 'employee number'],
+    'itin': ['itin', 'itinerary', 'itin no', 'itin number'],
+    'report_date': ['report date', 'date', 'reading date'],
+    'percentage_attained': ['percentage attained', 'attained', 'percentage', 'attained %', '% attained', 'attainment'],
+    'reasons_not_attained': ['reasons not attained', 'reasons', 'reason'],
+    'status': ['status'],
+    'notes_comments': ['notes comments', 'notes', 'comments', 'remarks']
+}
+REQUIRED_COLUMNS = ('itin', 'report_date', 'percentage_attained')
+HEADER_SEARCH_ROWS = 10
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%Y/%m/%d')
+
+def normalize_staff_number(value):
+    """85891, 85891.0, ' 85891 ' and 'KP85891' all become '85891'"""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    digits = re.sub(r'\D', '', str(value))
+    return digits.lstrip('0') or None
+
+def _header_key(value):
+    return re.sub(r'[^a-z%]+', ' ', str(value).lower()).strip()
+
+def _find_columns(row):
+    lookup = {alias: field for field, aliases in COLUMN_ALIASES.items() for alias in aliases}
+    columns = {}
+    for index, value in enumerate(row):
+        field = lookup.get(_header_key(value)) if value is not None else None
+        if field and field not in columns:
+            columns[field] = index
+    return columns if all(field in columns for field in REQUIRED_COLUMNS) else None
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognised date {text!r}")
+
+def _parse_percentage(value):
+    if isinstance(value, str):
+        value = value.strip().rstrip('%')
+    return float(value)
+
+def _text(value):
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text or None
+
+def parse_workbook(path):
+    """Read one legacy workbook into plain report tuples.
+
+    Runs in a worker process, so it only returns picklable values and never
+    touches the database. Rows without a staff number fall back to the one in
+    the file name (the sheets are one per reader per month).
+    """
+    file_staff_number = normalize_staff_number(next(iter(re.findall(r'\d{4,}', os.path.basename(path))), None))
+    rows = []
+    errors = []
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            columns = None
+            for row_number, row in enumerate(sheet.iter_rows(values_only=True), start=1):
+                if columns is None:
+                    if row_number <= HEADER_SEARCH_ROWS:
+                        columns = _find_columns(row)
+                        continue
+                    break
+                if not any(cell not in (None, '') for cell in row):
+                    continue
+
+                cell = lambda field: row[columns[field]] if field in columns and columns[field] < len(row) else None
+                try:
+                    itin = _text(cell('itin'))
+                    if not itin:
+                        raise ValueError('missing ITIN')
+                    rows.append((
+                        normalize_staff_number(cell('staff_number')) or file_staff_number,
+                        itin,
+                        _parse_date(cell('report_date')),
+                        _parse_percentage(cell('percentage_attained')),
+                        _text(cell('reasons_not_attained')),
+                        _text(cell('status')),
+                        _text(cell('notes_comments'))
+                    ))
+                except (TypeError, ValueError) as e:
+                    errors.append(f"{sheet.title}!{row_number}: {e}")
+    finally:
+        workbook.close()
+
+    # Sheets formatted as percentages store 0.85 for 85%
+    if rows and max(row[3] for row in rows) <= 1:
+        rows = [row[:3] + (row[3] * 100,) + row[4:] for row in rows]
+    return path, rows, errors
@@ -0,0 +1,327 @@
+from flask import Blueprint, jsonify, request
+from src.models.user import RESOLVED_STATUSES, User, Anomaly, Report
+from src.models.sharding import activate_region, sharding_enabled
+from src.models.analytics import analytics_session, fan_out
+from src.models.shared_cache import REPORTS_VERSION, cached_payload
+from src.models.teams import scope_to_team, team_supervisor_id
+from src.routes.forecasting import project_month_end
+from src.routes.itins import day_offsets, pivot_matrix
+from src.routes.response_encoding import compress_response
+from src.routes.batch import batch_user
+from calendar import monthrange
+from datetime import datetime, timedelta
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+import json
+import jwt
+import os
+from sqlalchemy import String, func, select, type_coerce
+
+analytics_bp = Blueprint('analytics', __name__)
+
+SECRET_KEY = os.environ.get('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
+
+ANALYTICS_CACHE_TTL = int(os.environ.get('ANALYTICS_CACHE_TTL', '300'))
+ANOMALY_SLA_HOURS = float(os.environ.get('ANOMALY_SLA_HOURS', '72'))
+# e.g. {"Tamper": 24, "Meter Fault": 120}
+ANOMALY_SLA_HOURS_BY_TYPE = json.loads(os.environ.get('ANOMALY_SLA_HOURS_BY_TYPE', '{}'))
+
+FORECAST_CACHE_TTL = int(os.environ.get('FORECAST_CACHE_TTL', '86400'))
+FORECAST_HISTORY_DAYS = int(os.environ.get('FORECAST_HISTORY_DAYS', '84'))
+FORECAST_TARGET = float(os.environ.get('FORECAST_TARGET', '95'))
+FORECAST_CONFIDENCE = float(os.environ.get('FORECAST_CONFIDENCE', '0.8'))
+# Series with fewer reports in the history window only get their month-to-date average
+FORECAST_MIN_REPORTS = int(os.environ.get('FORECAST_MIN_REPORTS', '6'))
+FORECAST_RIDGE = float(os.environ.get('FORECAST_RIDGE', '1.0'))
+
+AGE_BUCKETS = [0, 24, 72, 168, 720, np.inf]
+AGE_BUCKET_LABELS = ['<1d', '1-3d', '3-7d', '7-30d', '>30d']
+
+ANOMALY_COLUMNS = [
+    'id', 'type', 'staff_id', 'assigned_to_id', 'timestamp',
+    'resolved_at', 'updated_at', 'resolution_status'
+]
+
+def get_user_from_token(token):
+    try:
+        if token.startswith('Bearer '):
+            token = token[7:]
+        
+        payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+        user_id = payload['user_id']
+        user = batch_user(user_id) or User.query.get(user_id)
+        activate_region(user)
+        return user
+    except:
+        return None
+
+def anomaly_rows(session, supervisor_id, start_date, end_date):
+    """Anomaly columns for the range as plain tuples.
+
+    A Core select on the session's connection skips ORM row handling, and the
+    datetimes come back as stored text for pandas to parse in one pass.
+    """
+    statement = select(
+        Anomaly.id, Anomaly.type, Anomaly.staff_id, Anomaly.assigned_to_id,
+        type_coerce(Anomaly.timestamp, String), type_coerce(Anomaly.resolved_at, String),
+        type_coerce(Anomaly.updated_at, String), Anomaly.resolution_status
+    ).where(
+        Anomaly.timestamp >= start_date,
+        Anomaly.timestamp < end_date
+    )
+    statement = scope_to_team(statement, supervisor_id, Anomaly.staff_id)
+    return session.connection(bind_arguments={'mapper': Anomaly}).execute(statement).all()
+
+def _json_number(value, decimals=2):
+    return None if value is None or pd.isna(value) else round(float(value), decimals)
+
+def sla_frame(rows, staff_numbers, sla_hours, now):
+    """One row per anomaly with time-to-resolution, age, SLA and breach columns"""
+    columns = zip(*rows) if rows else [[] for _ in ANOMALY_COLUMNS]
+    df = pd.DataFrame(dict(zip(ANOMALY_COLUMNS, columns)), columns=ANOMALY_COLUMNS)
+    for column in ('timestamp', 'resolved_at', 'updated_at'):
+        df[column] = pd.to_datetime(df[column], format='ISO8601')
+
+    df['resolved'] = df['resolution_status'].isin(RESOLVED_STATUSES)
+    # Anomalies resolved before transitions were recorded have no resolved_at;
+    # their last update is the best estimate available
+    df['estimated'] = df['resolved'] & df['resolved_at'].isna()
+    resolved_at = df['resolved_at'].fillna(df['updated_at']).where(df['resolved'])
+
+    df['ttr_hours'] = (resolved_at - df['timestamp']).dt.total_seconds() / 3600
+    df['age_hours'] = ((now - df['timestamp']).dt.total_seconds() / 3600).where(~df['resolved'])
+    df['sla_hours'] = df['type'].map(ANOMALY_SLA_HOURS_BY_TYPE).fillna(sla_hours).astype(float)
+    df['breached'] = np.where(df['resolved'], df['ttr_hours'] > df['sla_hours'], df['age_hours'] > df['sla_hours'])
+    df['age_bucket'] = pd.cut(df['age_hours'], AGE_BUCKETS, labels=AGE_BUCKET_LABELS, right=False)
+
+    df['reader'] = df['staff_id'].map(staff_numbers).fillna('Unknown')
+    df['assignee'] = df['assigned_to_id'].map(staff_numbers).fillna('Unassigned')
+    return df
+
+def summarize(df, key):
+    """Per-group counts, time-to-resolution percentiles, breach rate and open-anomaly aging"""
+    grouped = df.groupby(key, observed=True)
+    summary = grouped.agg(
+        total=('id', 'size'),
+        resolved=('resolved', 'sum'),
+        breached=('breached', 'sum'),
+        mean_ttr_hours=('ttr_hours', 'mean'),
+        median_ttr_hours=('ttr_hours', 'median')
+    )
+    summary['p90_ttr_hours'] = grouped['ttr_hours'].quantile(0.9)
+    summary['open'] = summary['total'] - summary['resolved']
+    summary['breach_rate'] = summary['breached'] / summary['total']
+
+    aging = pd.crosstab(df[key], df['age_bucket']).reindex(index=summary.index, columns=AGE_BUCKET_LABELS, fill_value=0)
+
+    return [
+        {
+            key: name,
+            'total': int(row.total),
+            'resolved': int(row.resolved),
+            'open': int(row.open),
+            'breached': int(row.breached),
+            'breach_rate': _json_number(row.breach_rate, 4),
+            'mean_ttr_hours': _json_number(row.mean_ttr_hours),
+            'median_ttr_hours': _json_number(row.median_ttr_hours),
+            'p90_ttr_hours': _json_number(row.p90_ttr_hours),
+            'aging': {label: int(aging.at[name, label]) for label in AGE_BUCKET_LABELS}
+        }
+        for name, row in summary.sort_values('breach_rate', ascending=False).iterrows()
+    ]
+
+def anomaly_sla_payload(user, start_date, end_date, sla_hours):
+    if user.role == 'Commercial Engineer' and sharding_enabled():
+        shards = fan_out(lambda session, region: anomaly_rows(session, None, start_date, end_date))
+    else:
+        shards = [anomaly_rows(analytics_session(), team_supervisor_id(user), start_date, end_date)]
+    rows = [row for shard in shards for row in shard]
+
+    staff_numbers = dict(analytics_session().query(User.id, User.staff_number).all())
+    df = sla_frame(rows, staff_numbers, sla_hours, pd.Timestamp(datetime.utcnow()))
+
+    ttr = df['ttr_hours'].dropna()
+    distribution = pd.cut(ttr, AGE_BUCKETS, labels=AGE_BUCKET_LABELS, right=False).value_counts().reindex(AGE_BUCKET_LABELS, fill_value=0)
+
+    return {
+        'start_date': start_date.date().isoformat(),
+        'end_date': (end_date - timedelta(days=1)).date().isoformat(),
+        'sla_hours': sla_hours,
+        'sla_hours_by_type': ANOMALY_SLA_HOURS_BY_TYPE,
+        'total': int(len(df)),
+        'resolved': int(df['resolved'].sum()),
+        'open': int((~df['resolved']).sum()),
+        'breached': int(df['breached'].sum()),
+        'breach_rate': _json_number(df['breached'].mean() if len(df) else None, 4),
+        'estimated_resolution_times': int(df['estimated'].sum()),
+        'time_to_resolution': {
+            'percentiles_hours': {
+                f"p{int(q * 100)}": _json_number(ttr.quantile(q) if len(ttr) else None)
+                for q in (0.5, 0.75, 0.9, 0.95)
+            },
+            'distribution': {label: int(distribution[label]) for label in AGE_BUCKET_LABELS}
+        },
+        'open_aging': {
+            label: int(count) for label, count in
+            df['age_bucket'].value_counts().reindex(AGE_BUCKET_LABELS, fill_value=0).items()
+        },
+        'by_type': summarize(df, 'type'),
+        'by_reader': summarize(df, 'reader'),
+        'by_assignee': summarize(df, 'assignee')
+    }
+
+@analytics_bp.route('/analytics/anomaly-sla', methods=['GET'])
+def get_anomaly_sla():
+    """Time-to-resolution, aging and SLA breach rates per type, reader and assignee.
+
+    Query params: start_date/end_date (default the last 90 days) and
+    sla_hours to override the default target. Results are cached per data
+    version, and for at most ANALYTICS_CACHE_TTL seconds because open
+    anomalies keep aging.
+    """
+    token = request.headers.get('Authorization')
+    user = get_user_from_token(token)
+    
+    if not user:
+        return jsonify({'error': 'Invalid or missing token'}), 401
+
+    if user.role not in ['Supervisor', 'Commercial Engineer']:
+        return jsonify({'error': 'Permission denied'}), 403
+
+    try:
+        end_date = datetime.strptime(request.args['end_date'], '%Y-%m-%d') if request.args.get('end_date') else datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d') if request.args.get('start_date') else end_date - timedelta(days=89)
+    except ValueError:
+        return jsonify({'error': 'Dates must be in YYYY-MM-DD format'}), 400
+    end_date += timedelta(days=1)
+
+    sla_hours = request.args.get('sla_hours', ANOMALY_SLA_HOURS, type=float)
+    if sla_hours <= 0:
+        return jsonify({'error': 'sla_hours must be positive'}), 400
+
+    params = f"{start_date.date()}:{end_date.date()}:sla={sla_hours}:{datetime.utcnow().strftime('%Y-%m-%dT%H')}"
+    return jsonify(cached_payload(
+        'analytics/anomaly-sla', user, params, ANALYTICS_CACHE_TTL,
+        lambda: anomaly_sla_payload(user, start_date, end_date, sla_hours)
+    ))
+
+def forecast_rows(session, supervisor_id, start_date, end_date):
+    """(staff_id, itin, day, percentage) for the history window, as a Core select"""
+    statement = select(
+        Report.staff_id,
+        Report.itin,
+        func.date(Report.report_date),
+        Report.percentage_attained
+    ).where(
+        Report.report_date >= start_date,
+        Report.report_date <= end_date
+    )
+    statement = scope_to_team(statement, supervisor_id, Report.staff_id)
+    return session.connection(bind_arguments={'mapper': Report}).execute(statement).all()
+
+def forecast_entries(keys, projection, target):
+    """One JSON entry per series, most likely to miss the target first"""
+    entries = []
+    for i, key in enumerate(keys):
+        enough = projection['history_reports'][i] >= FORECAST_MIN_REPORTS
+        projected = projection['projected'][i] if enough else projection['month_to_date'][i]
+        entries.append({
+            'key': key,
+            'projected': _json_number(projected),
+            'lower': _json_number(projection['lower'][i]) if enough else None,
+            'upper': _json_number(projection['upper'][i]) if enough else None,
+            'month_to_date': _json_number(projection['month_to_date'][i]),
+            'reports_this_month': int(projection['month_reports'][i]),
+            'expected_reports_remaining': _json_number(projection['expected_reports_remaining'][i], 1) if enough else None,
+            'trend_per_week': _json_number(projection['trend_per_week'][i]) if enough else None,
+            'miss_probability': _json_number(projection['miss_probability'][i], 3) if enough else None,
+            'at_risk': bool(projected < target) if not pd.isna(projected) else None,
+            'insufficient_history': not enough
+        })
+    entries.sort(key=lambda entry: (
+        -(entry['miss_probability'] if entry['miss_probability'] is not None else -1),
+        entry['projected'] if entry['projected'] is not None else float('inf')
+    ))
+    return entries
+
+def forecast_payload(user, as_of, target, confidence):
+    month_start = as_of.replace(day=1)
+    month_end = as_of.replace(day=monthrange(as_of.year, as_of.month)[1])
+    start_date = min(month_start, as_of - timedelta(days=FORECAST_HISTORY_DAYS - 1))
+    history_days = (as_of - start_date).days + 1
+
+    if user.role == 'Commercial Engineer' and sharding_enabled():
+        shards = fan_out(lambda session, region: forecast_rows(session, None, start_date, as_of))
+    else:
+        shards = [forecast_rows(analytics_session(), team_supervisor_id(user), start_date, as_of)]
+    rows = [row for shard in shards for row in shard]
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    staff_ids, itin_values, report_dates, percentages = zip(*rows) if rows else ((), (), (), ())
+    offsets = day_offsets(report_dates, start_date)
+    percentages = np.array(percentages, dtype=np.float64)
+    projections = {}
+    for level, keys in (('readers', staff_ids), ('itins', itin_values)):
+        keys, matrix = pivot_matrix(keys, offsets, percentages, history_days)
+        projection = project_month_end(
+            matrix, start_date, (month_start - start_date).days, (month_end - as_of).days,
+            ridge=FORECAST_RIDGE, z=z, target=target
+        )
+        projections[level] = forecast_entries(keys.tolist(), projection, target)
+
+    staff_numbers = dict(analytics_session().query(User.id, User.staff_number).all())
+    readers = []
+    for entry in projections['readers']:
+        staff_id = entry.pop('key')
+        readers.append(dict(entry, staff_id=staff_id, staff_number=staff_numbers.get(staff_id)))
+    itins = [dict(entry, itin=entry.pop('key')) for entry in projections['itins']]
+
+    return {
+        'as_of': as_of.isoformat(),
+        'month_end': month_end.isoformat(),
+        'days_remaining': (month_end - as_of).days,
+        'target': target,
+        'confidence': confidence,
+        'history_start': start_date.isoformat(),
+        'readers_at_risk': sum(1 for entry in readers if entry['at_risk']),
+        'itins_at_risk': sum(1 for entry in itins if entry['at_risk']),
+        'readers': readers,
+        'itins': itins
+    }
+
+@analytics_bp.route('/analytics/forecast', methods=['GET'])
+def get_forecast():
+    """Projected month-end percentage_attained per reader and per ITIN.
+
+    Each series is fitted with a weekly trend and day-of-week effects over
+    the last FORECAST_HISTORY_DAYS days and projected over the rest of the
+    month, with a confidence band and the probability of ending below
+    target. Query params: as_of (YYYY-MM-DD, default today), target and
+    confidence. Forecasts stay cached until a report is added or changed.
+    """
+    token = request.headers.get('Authorization')
+    user = get_user_from_token(token)
+    
+    if not user:
+        return jsonify({'error': 'Invalid or missing token'}), 401
+
+    if user.role not in ['Supervisor', 'Commercial Engineer']:
+        return jsonify({'error': 'Permission denied'}), 403
+
+    try:
+        as_of = datetime.strptime(request.args['as_of'], '%Y-%m-%d').date() if request.args.get('as_of') else datetime.now().date()
+    except ValueError:
+        return jsonify({'error': 'as_of must be in YYYY-MM-DD format'}), 400
+
+    target = request.args.get('target', FORECAST_TARGET, type=float)
+    confidence = request.args.get('confidence', FORECAST_CONFIDENCE, type=float)
+    if not 0 < confidence < 1:
+        return jsonify({'error': 'confidence must be between 0 and 1'}), 400
+
+    params = f"{as_of}:target={target}:confidence={confidence}"
+    return compress_response(jsonify(cached_payload(
+        'analytics/forecast', user, params, FORECAST_CACHE_TTL,
+        lambda: forecast_payload(user, as_of, target, confidence),
+        version=REPORTS_VERSION
+    )))
@@ -1,8 +1,16 @@
 from flask import Blueprint, jsonify, request
-from src.models.user import User, Anomaly, Escalation, db
+from src.models.user import RESOLVED_STATUSES, User, Anomaly, AnomalyStatusChange, Escalation, EscalationTarget, db
+from src.models.sharding import activate_region, sharding_enabled
+from src.models.analytics import fan_out
+from src.models.escalation_scheduler import EscalationScheduler, engineer_loads
+from src.models.teams import in_team_scope, scope_to_team, team_supervisor_id
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, selectinload
 import jwt
 import os
 from src.routes.email_service import send_escalation_notification
+from src.routes.response_encoding import list_response
+from src.routes.batch import batch_user
 from datetime import datetime, timedelta
 
 anomalies_bp = Blueprint('anomalies', __name__)
@@ -16,10 +24,34 @@ def get_user_from_token(token):
         
         payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
         user_id = payload['user_id']
-        return User.query.get(user_id)
+        user = batch_user(user_id) or User.query.get(user_id)
+        activate_region(user)
+        return user
     except:
         return None
 
+@event.listens_for(Session, 'before_flush')
+def _record_status_changes(session, flush_context, instances):
+    """Log every resolution_status transition and keep resolved_at in step"""
+    now = datetime.utcnow()
+    for obj in list(session.new):
+        if isinstance(obj, Anomaly) and obj.resolution_status in RESOLVED_STATUSES and obj.resolved_at is None:
+            obj.resolved_at = now
+    for obj in list(session.dirty):
+        if not isinstance(obj, Anomaly):
+            continue
+        history = inspect(obj).attrs.resolution_status.history
+        if not history.added or history.added[0] == (history.deleted[0] if history.deleted else None):
+            continue
+        from_status = history.deleted[0] if history.deleted else None
+        to_status = history.added[0]
+        session.add(AnomalyStatusChange(anomaly=obj, from_status=from_status, to_status=to_status, changed_at=now))
+        if to_status in RESOLVED_STATUSES and from_status not in RESOLVED_STATUSES:
+            obj.resolved_at = now
+        elif to_status not in RESOLVED_STATUSES:
+            # Reopened: the clock runs again from the original report
+            obj.resolved_at = None
+
 @anomalies_bp.route('/anomalies', methods=['POST'])
 def create_anomaly():
     token = request.headers.get('Authorization')
@@ -65,26 +97,33 @@ def get_anomalies():
     resolution_status = request.args.get('resolution_status')
     escalation_flag = request.args.get('escalation_flag')
 
-    query = Anomaly.query
+    query = Anomaly.query.options(
+        selectinload(Anomaly.staff),
+        selectinload(Anomaly.assigned_to),
+        selectinload(Anomaly.attachments)
+    )
 
     # If user is not a supervisor, only show their own anomalies
     if user.role not in ['Supervisor', 'Commercial Engineer']:
         query = query.filter_by(staff_id=user.id)
-    elif staff_id:
-        query = query.filter_by(staff_id=staff_id)
+    else:
+        # Supervisors who own a team only see their team's readers
+        query = scope_to_team(query, team_supervisor_id(user), Anomaly.staff_id)
+        if staff_id:
+            query = query.filter(Anomaly.staff_id == staff_id)
 
     if anomaly_type:
-        query = query.filter_by(type=anomaly_type)
+        query = query.filter(Anomaly.type == anomaly_type)
 
     if resolution_status:
-        query = query.filter_by(resolution_status=resolution_status)
+        query = query.filter(Anomaly.resolution_status == resolution_status)
 
     if escalation_flag:
         escalation_flag_bool = escalation_flag.lower() == 'true'
-        query = query.filter_by(escalation_flag=escalation_flag_bool)
+        query = query.filter(Anomaly.escalation_flag == escalation_flag_bool)
 
     anomalies = query.order_by(Anomaly.timestamp.desc()).all()
-    return jsonify([anomaly.to_dict() for anomaly in anomalies])
+    return list_response([anomaly.to_dict() for anomaly in anomalies])
 
 @anomalies_bp.route('/anomalies/<int:anomaly_id>', methods=['PUT'])
 def update_anomaly(anomaly_id):
@@ -99,6 +138,8 @@ def update_anomaly(anomaly_id):
     # Check if user has permission to update this anomaly
     if user.role not in ['Supervisor', 'Commercial Engineer'] and anomaly.staff_id != user.id:
         return jsonify({'error': 'Permission denied'}), 403
+    if not in_team_scope(user, anomaly.staff_id):
+        return jsonify({'error': 'Permission denied'}), 403
 
     data = request.json
     
@@ -124,14 +165,23 @@ def escalate_anomaly():
     anomaly_id = data.get('anomaly_id')
     escalated_to_id = data.get('escalated_to_id')
 
-    if not anomaly_id or not escalated_to_id:
-        return jsonify({'error': 'Anomaly ID and escalated_to_id are required'}), 400
+    if not anomaly_id:
+        return jsonify({'error': 'Anomaly ID is required'}), 400
 
     anomaly = Anomaly.query.get_or_404(anomaly_id)
     
     # Check if user has permission to escalate this anomaly
     if user.role not in ['Supervisor', 'Commercial Engineer'] and anomaly.staff_id != user.id:
         return jsonify({'error': 'Permission denied'}), 403
+    if not in_team_scope(user, anomaly.staff_id):
+        return jsonify({'error': 'Permission denied'}), 403
+
+    # Without an explicit target, go to the least-loaded available engineer
+    if not escalated_to_id:
+        engineer = EscalationScheduler.load().assign()
+        if not engineer:
+            return jsonify({'error': 'No Commercial Engineer is available for escalations'}), 503
+        escalated_to_id = engineer.id
 
     # Update anomaly escalation flag
     anomaly.escalation_flag = True
@@ -148,8 +198,9 @@ def escalate_anomaly():
     # Send escalation notification email
     try:
         escalated_to_user = User.query.get(escalated_to_id)
-        if escalated_to_user:
-            send_escalation_notification(anomaly, escalated_to_user)
+        if escalated_to_user and send_escalation_notification(anomaly, escalated_to_user):
+            escalation.notified_at = datetime.utcnow()
+            db.session.commit()
     except Exception as e:
         print(f"Failed to send escalation email: {str(e)}")
 
@@ -170,8 +221,19 @@ def get_escalations():
     if user.role not in ['Supervisor', 'Commercial Engineer']:
         return jsonify({'error': 'Permission denied'}), 403
 
-    escalations = Escalation.query.order_by(Escalation.escalation_timestamp.desc()).all()
-    return jsonify([escalation.to_dict() for escalation in escalations])
+    query = Escalation.query.options(selectinload(Escalation.escalated_to))
+    supervisor_id = team_supervisor_id(user)
+    if supervisor_id is not None:
+        query = scope_to_team(query.join(Anomaly, Escalation.anomaly_id == Anomaly.id), supervisor_id, Anomaly.staff_id)
+    query = query.order_by(Escalation.escalation_timestamp.desc())
+
+    # Escalations live with the anomaly's region, so Commercial Engineers read every shard
+    if user.role == 'Commercial Engineer' and sharding_enabled():
+        shards = fan_out(lambda session, region: [escalation.to_dict() for escalation in query.with_session(session).all()])
+        rows = sorted((row for shard in shards for row in shard), key=lambda row: row['escalation_timestamp'] or '', reverse=True)
+        return list_response(rows)
+
+    return list_response([escalation.to_dict() for escalation in query.all()])
 
 @anomalies_bp.route('/anomalies/check_escalation', methods=['POST'])
 def check_escalation():
@@ -195,12 +257,15 @@ def check_escalation():
         Anomaly.escalation_flag == False
     ).all()
 
+    # Spread the backlog over the available engineers by weight and current load
+    scheduler = EscalationScheduler.load()
+
     escalated_count = 0
     for anomaly in anomalies_to_escalate:
         anomaly.escalation_flag = True
         
         # Find a commercial engineer to escalate to
-        commercial_engineer = User.query.filter_by(role='Commercial Engineer').first()
+        commercial_engineer = scheduler.assign()
         if commercial_engineer:
             escalation = Escalation(
                 anomaly_id=anomaly.id,
@@ -211,7 +276,8 @@ def check_escalation():
             
             # Send escalation notification email
             try:
-                send_escalation_notification(anomaly, commercial_engineer)
+                if send_escalation_notification(anomaly, commercial_engineer):
+                    escalation.notified_at = datetime.utcnow()
             except Exception as e:
                 print(f"Failed to send escalation email: {str(e)}")
 
@@ -222,3 +288,59 @@ def check_escalation():
         'escalated_count': escalated_count
     }), 200
 
+@anomalies_bp.route('/escalation-targets', methods=['GET'])
+def get_escalation_targets():
+    """Every Commercial Engineer with their weight, availability and open escalations"""
+    token = request.headers.get('Authorization')
+    user = get_user_from_token(token)
+    
+    if not user:
+        return jsonify({'error': 'Invalid or missing token'}), 401
+
+    if user.role not in ['Supervisor', 'Commercial Engineer']:
+        return jsonify({'error': 'Permission denied'}), 403
+
+    return jsonify([
+        {
+            'user_id': engineer.id,
+            'staff_number': engineer.staff_number,
+            'weight': weight,
+            'available': available,
+            'open_escalations': open_escalations,
+            'load': round(open_escalations / weight, 2) if weight > 0 else None
+        }
+        for engineer, weight, available, open_escalations in engineer_loads()
+    ])
+
+@anomalies_bp.route('/escalation-targets/<int:user_id>', methods=['PUT'])
+def update_escalation_target(user_id):
+    """Set an engineer's weight (share of new escalations) or mark them unavailable"""
+    token = request.headers.get('Authorization')
+    user = get_user_from_token(token)
+    
+    if not user:
+        return jsonify({'error': 'Invalid or missing token'}), 401
+
+    if user.role != 'Commercial Engineer':
+        return jsonify({'error': 'Permission denied'}), 403
+
+    engineer = User.query.get_or_404(user_id)
+    if engineer.role != 'Commercial Engineer':
+        return jsonify({'error': 'Escalation targets must be Commercial Engineers'}), 400
+
+    data = request.json or {}
+    target = db.session.get(EscalationTarget, user_id) or EscalationTarget(user_id=user_id, weight=1.0, available=True)
+    if 'weight' in data:
+        try:
+            weight = float(data['weight'])
+        except (TypeError, ValueError):
+            return jsonify({'error': 'weight must be a number'}), 400
+        if weight < 0:
+            return jsonify({'error': 'weight cannot be negative'}), 400
+        target.weight = weight
+    if 'available' in data:
+        target.available = bool(data['available'])
+
+    db.session.add(target)
+    db.session.commit()
+    return jsonify(target.to_dict())
@@ -0,0 +1,239 @@
+from flask import Blueprint, current_app, jsonify, request, send_file
+from src.models.user import User, Anomaly, Attachment, db
+from src.models.sharding import activate_region, current_region
+from src.models.teams import in_team_scope
+from src.routes.batch import batch_user
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from PIL import Image
+import hashlib
+import jwt
+import os
+import re
+
+attachments_bp = Blueprint('attachments', __name__)
+
+SECRET_KEY = os.environ.get('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
+
+ATTACHMENT_DIR = os.environ.get(
+    'ATTACHMENT_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'attachments')
+)
+ATTACHMENT_MAX_BYTES = int(os.environ.get('ATTACHMENT_MAX_BYTES', str(20 * 1024 * 1024)))
+ATTACHMENT_MAX_CHUNK_BYTES = int(os.environ.get('ATTACHMENT_MAX_CHUNK_BYTES', str(1024 * 1024)))
+THUMBNAIL_SIZE = (256, 256)
+
+_thumbnail_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('THUMBNAIL_WORKERS', '2')), thread_name_prefix='thumbnail')
+
+def get_user_from_token(token):
+    try:
+        if token.startswith('Bearer '):
+            token = token[7:]
+        
+        payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+        user_id = payload['user_id']
+        user = batch_user(user_id) or User.query.get(user_id)
+        activate_region(user)
+        return user
+    except:
+        return None
+
+def can_access(user, anomaly):
+    if user.role in ['Supervisor', 'Commercial Engineer']:
+        return in_team_scope(user, anomaly.staff_id)
+    return anomaly.staff_id == user.id
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def generate_thumbnail(app, region, attachment_id):
+    """Background job: write a JPEG thumbnail next to an uploaded image"""
+    with app.app_context():
+        db.session.info['region'] = region
+        attachment = db.session.get(Attachment, attachment_id)
+        if attachment is None:
+            return
+        try:
+            thumbnail_path = f"{attachment.storage_path}.thumb.jpg"
+            with Image.open(attachment.storage_path) as image:
+                image.thumbnail(THUMBNAIL_SIZE)
+                image.convert('RGB').save(thumbnail_path, 'JPEG', quality=80)
+            attachment.thumbnail_path = thumbnail_path
+            # has_thumbnail changed; let /api/sync hand the anomaly out again
+            attachment.anomaly.updated_at = datetime.utcnow()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception('Failed to generate thumbnail for attachment %s', attachment_id)
+
+@attachments_bp.route('/anomalies/<int:anomaly_id>/attachments', methods=['POST'])
+def create_attachment(anomaly_id):
+    """Start an upload; the file itself is sent in chunks afterwards"""
+    token = request.headers.get('Authorization')
+    user = get_user_from_token(token)
+    
+    if not user:
+        return jsonify({'error': 'Invalid or missing token'}), 401
+
+    anomaly = Anomaly.query.get_or_404(anomaly_id)
+    if not can_access(user, anomaly):
+        return jsonify({'error': 'Permission denied'}), 403
+
+    data = request.json or {}
+    filename = os.path.basename(data.get('filename') or '')
+    content_type = data.get('content_type') or 'application/octet-stream'
+    size = data.get('size')
+    sha256 = (data.get('sha256') or '').lower()
+
+    if not filename or not isinstance(size, int) or not re.fullmatch(r'[0-9a-f]{64}', sha256):
+        return jsonify({'error': 'Filename, size in bytes, and SHA-256 checksum are required'}), 400
+    if size <= 0 or size > ATTACHMENT_MAX_BYTES:
+        return jsonify({'error': f'Attachments must be between 1 and {ATTACHMENT_MAX_BYTES} bytes'}), 400
+
+    attachment = Attachment(
+        anomaly_id=anomaly.id,
+        filename=filename,
+        content_type=content_type,
+        size=size,
+        sha256=sha256,
+        uploaded_by_id=user.id,
+        storage_path=''
+    )
+    db.session.add(attachment)
+    db.session.flush()
+
+    directory = os.path.join(ATTACHMENT_DIR, current_region(), str(anomaly.id))
+    os.makedirs(directory, exist_ok=True)
+    attachment.storage_path = os.path.join(directory, f"{attachment.id}.bin")
+    open(attachment.storage_path, 'wb').close()
+    db.session.commit()
+
+    return jsonify({
+        'message': 'Upload started',
+        'attachment': attachment.to_dict(),
+        'max_chunk_bytes': ATTACHMENT_MAX_CHUNK_BYTES
+    }), 201
+
+@attachments_bp.route('/attachments/<int:attachment_id>', methods=['GET'])
+def get_attachment(attachment_id):
+    """Attachment metadata; received_bytes tells a client where to resume"""
+    token = request.headers.get('Authorization')
+    user = get_user_from_token(token)
+    
+    if not user:
+        return jsonify({'error': 'Invalid or missing token'}), 401
+
+    attachment = Attachment.query.get_or_404(attachment_id)
+    if not can_access(user, attachment.anomaly):
+        return jsonify({'error': 'Permission denied'}), 403
+
+    return jsonify(attachment.to_dict())
+
+@attachments_bp.route('/attachments/<int:attachment_id>/chunks', methods=['PUT'])
+def upload_chunk(attachment_id):
+    """Append one chunk at ?offset=N, which must equal the bytes received so far.
+
+    An optional X-Chunk-SHA256 header is checked against the chunk. Once the
+    last byte arrives the whole file is verified against the declared checksum.
+    """
+    token = request.headers.get('Authorization')
+    user = get_user_from_token(token)
+    
+    if not user:
+        return jsonify({'error': 'Invalid or missing token'}), 401
+
+    attachment = Attachment.query.get_or_404(attachment_id)
+    if attachment.uploaded_by_id != user.id:
+        return jsonify({'error': 'Permission denied'}), 403
+    if attachment.status != 'Uploading':
+        return jsonify({'error': f'Attachment is {attachment.status.lower()}'}), 409
+
+    offset = request.args.get('offset', type=int)
+    chunk = request.get_data(cache=False)
+
+    if offset != attachment.received_bytes:
+        return jsonify({
+            'error': 'Chunk offset does not match bytes received',
+            'received_bytes': attachment.received_bytes
+        }), 409
+    if not chunk or len(chunk) > ATTACHMENT_MAX_CHUNK_BYTES or offset + len(chunk) > attachment.size:
+        return jsonify({'error': f'Chunks must be 1 to {ATTACHMENT_MAX_CHUNK_BYTES} bytes and stay within the declared size'}), 400
+
+    chunk_sha256 = request.headers.get('X-Chunk-SHA256')
+    if chunk_sha256 and hashlib.sha256(chunk).hexdigest() != chunk_sha256.lower():
+        return jsonify({'error': 'Chunk checksum mismatch', 'received_bytes': attachment.received_bytes}), 422
+
+    with open(attachment.storage_path, 'r+b') as f:
+        f.seek(offset)
+        f.write(chunk)
+        f.truncate()
+
+    # Only advance if nobody else did in the meantime
+    updated = Attachment.query.filter_by(id=attachment.id, received_bytes=offset).update(
+        {'received_bytes': offset + len(chunk)}, synchronize_session='fetch'
+    )
+    if not updated:
+        db.session.rollback()
+        return jsonify({'error': 'Concurrent upload for this attachment'}), 409
+
+    if attachment.received_bytes == attachment.size:
+        if file_sha256(attachment.storage_path) == attachment.sha256:
+            attachment.status = 'Complete'
+            # Attachments reach devices inside their anomaly, which sync selects by updated_at
+            attachment.anomaly.updated_at = datetime.utcnow()
+        else:
+            # Start over; the partial file cannot be trusted
+            attachment.received_bytes = 0
+            open(attachment.storage_path, 'wb').close()
+            db.session.commit()
+            return jsonify({'error': 'File checksum mismatch, upload restarted', 'attachment': attachment.to_dict()}), 422
+
+    db.session.commit()
+
+    if attachment.status == 'Complete' and attachment.content_type.startswith('image/'):
+        _thumbnail_pool.submit(generate_thumbnail, current_app._get_current_object(), current_region(), attachment.id)
+
+    return jsonify(attachment.to_dict())
+
+@attachments_bp.route('/attachments/<int:attachment_id>/download', methods=['GET'])
+def download_attachment(attachment_id):
+    token = request.headers.get('Authorization')
+    user = get_user_from_token(token)
+    
+    if not user:
+        return jsonify({'error': 'Invalid or missing token'}), 401
+
+    attachment = Attachment.query.get_or_404(attachment_id)
+    if not can_access(user, attachment.anomaly):
+        return jsonify({'error': 'Permission denied'}), 403
+    if attachment.status != 'Complete':
+        return jsonify({'error': 'Upload is not complete'}), 409
+
+    return send_file(
+        attachment.storage_path,
+        mimetype=attachment.content_type,
+        as_attachment=True,
+        download_name=attachment.filename,
+        conditional=True,
+        etag=attachment.sha256
+    )
+
+@attachments_bp.route('/attachments/<int:attachment_id>/thumbnail', methods=['GET'])
+def download_thumbnail(attachment_id):
+    token = request.headers.get('Authorization')
+    user = get_user_from_token(token)
+    
+    if not user:
+        return jsonify({'error': 'Invalid or missing token'}), 401
+
+    attachment = Attachment.query.get_or_404(attachment_id)
+    if not can_access(user, attachment.anomaly):
+        return jsonify({'error': 'Permission denied'}), 403
+    if not attachment.thumbnail_path:
+        return jsonify({'error': 'Thumbnail not available'}), 404
+
+    return send_file(attachment.thumbnail_path, mimetype='image/jpeg', conditional=True, max_age=86400)
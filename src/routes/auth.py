@@ -1,13 +1,28 @@
 from flask import Blueprint, jsonify, request
 from src.models.user import User, db
+from src.routes.throttle import login_limiter_by_ip, login_limiter_by_staff, try_acquire_all
 import jwt
 from datetime import datetime, timedelta
+import math
 import os
 
 auth_bp = Blueprint('auth', __name__)
 
 SECRET_KEY = os.environ.get('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
 
+def throttle_attempt(endpoint, staff_number):
+    """Reject over-budget attempts before any PIN hash is checked"""
+    retry_after = try_acquire_all(
+        (login_limiter_by_ip, f"{endpoint}:{request.remote_addr}"),
+        (login_limiter_by_staff, f"{endpoint}:{staff_number}")
+    )
+    if not retry_after:
+        return None
+
+    response = jsonify({'error': 'Too many attempts. Please try again later'})
+    response.headers['Retry-After'] = str(math.ceil(retry_after))
+    return response, 429
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     data = request.json
@@ -17,11 +32,17 @@ def login():
     if not staff_number or not pin:
         return jsonify({'error': 'Staff number and PIN are required'}), 400
 
+    throttled = throttle_attempt('login', staff_number)
+    if throttled:
+        return throttled
+
     user = User.query.filter_by(staff_number=staff_number).first()
     
     if not user or not user.check_pin(pin):
         return jsonify({'error': 'Invalid staff number or PIN'}), 401
 
+    login_limiter_by_staff.reset(f"login:{staff_number}")
+
     # Generate JWT token
     token = jwt.encode({
         'user_id': user.id,
@@ -80,6 +101,10 @@ def forgot_pin():
     if not staff_number or not security_answer or not new_pin:
         return jsonify({'error': 'Staff number, security answer, and new PIN are required'}), 400
 
+    throttled = throttle_attempt('forgot_pin', staff_number)
+    if throttled:
+        return throttled
+
     user = User.query.filter_by(staff_number=staff_number).first()
     
     if not user:
@@ -0,0 +1,145 @@
+from flask import Blueprint, current_app, g, jsonify, request
+from src.models.user import User, db
+from src.routes.response_encoding import compress_response
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from werkzeug.test import EnvironBuilder
+import json
+import jwt
+import os
+
+batch_bp = Blueprint('batch', __name__)
+
+SECRET_KEY = os.environ.get('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
+
+BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', '10'))
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', '4'))
+
+# Request headers passed through to every sub-request
+FORWARDED_HEADERS = ['Authorization', 'X-Profile', 'User-Agent']
+
+# Login and PIN endpoints are throttled per client; a batch must not spend that budget
+EXCLUDED_PATHS = ['/api/batch', '/api/login', '/api/forgot_pin', '/api/change_pin', '/api/verify_token']
+
+def validate_batch(items):
+    """Return an error message for a malformed batch, or None"""
+    if not isinstance(items, list) or not items:
+        return 'requests must be a non-empty list'
+    if len(items) > BATCH_MAX_REQUESTS:
+        return f'At most {BATCH_MAX_REQUESTS} requests per batch'
+
+    ids = set()
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+            return f'Request {index} needs a path'
+        item.setdefault('id', str(index))
+        if item['id'] in ids:
+            return f"Duplicate request id {item['id']}"
+        ids.add(item['id'])
+        if item.get('method', 'GET').upper() != 'GET':
+            return f"Request {item['id']}: only GET sub-requests are supported"
+        path = urlsplit(item['path']).path
+        if not path.startswith('/api/') or path.rstrip('/') in EXCLUDED_PATHS:
+            return f"Request {item['id']}: path must be an /api/ endpoint other than {', '.join(EXCLUDED_PATHS)}"
+
+    for item in items:
+        depends_on = item.setdefault('depends_on', [])
+        if not isinstance(depends_on, list) or any(dependency not in ids for dependency in depends_on):
+            return f"Request {item['id']}: depends_on must list ids from this batch"
+    return None
+
+def dependency_waves(items):
+    """Group requests into waves; each wave only depends on earlier ones"""
+    done = set()
+    remaining = list(items)
+    waves = []
+    while remaining:
+        wave = [item for item in remaining if all(dependency in done for dependency in item['depends_on'])]
+        if not wave:
+            return None
+        waves.append(wave)
+        done.update(item['id'] for item in wave)
+        remaining = [item for item in remaining if item['id'] not in done]
+    return waves
+
+def batch_user(user_id):
+    """The user the enclosing batch already loaded, or None outside a batch.
+
+    Route modules check this before querying, so a batch of ten calls loads
+    the caller once rather than once per sub-request.
+    """
+    user = g.get('batch_user')
+    return user if user is not None and user.id == user_id else None
+
+def run_sub_request(app, item, headers, remote_addr, user):
+    """Dispatch one GET through the normal request pipeline, in its own request context"""
+    environ = EnvironBuilder(
+        path=item['path'], method='GET', headers=headers, environ_base={'REMOTE_ADDR': remote_addr}
+    ).get_environ()
+    with app.request_context(environ):
+        # Copies the already loaded row into this thread's session without a query
+        g.batch_user = db.session.merge(user, load=False)
+        try:
+            response = app.full_dispatch_request()
+        except Exception as e:
+            app.logger.exception('Batch sub-request %s failed', item['path'])
+            return {'id': item['id'], 'status': 500, 'content_type': 'application/json', 'body': {'error': str(e)}}
+        body = response.get_data()
+        if response.mimetype == 'application/json':
+            body = json.loads(body) if body else None
+        else:
+            body = body.decode('utf-8', errors='replace')
+        return {
+            'id': item['id'],
+            'status': response.status_code,
+            'content_type': response.mimetype,
+            'body': body
+        }
+
+@batch_bp.route('/batch', methods=['POST'])
+def batch():
+    """Run several GET API calls in one round trip.
+
+    Body: {"requests": [{"id": "reports", "path": "/api/reports?status=Pending",
+    "depends_on": []}, ...]}. The token is checked and the user loaded once
+    up front; sub-requests reuse that user, and the caller's user is
+    returned alongside the results, so the SPA does not need a separate
+    verify_token call. Requests without depends_on run
+    concurrently; the others wait for the requests they list.
+    """
+    token = request.headers.get('Authorization')
+
+    if not token:
+        return jsonify({'error': 'Token is required'}), 401
+
+    try:
+        payload = jwt.decode(token[7:] if token.startswith('Bearer ') else token, SECRET_KEY, algorithms=['HS256'])
+        user = User.query.get(payload['user_id'])
+    except jwt.ExpiredSignatureError:
+        return jsonify({'error': 'Token has expired', 'valid': False}), 401
+    except (jwt.InvalidTokenError, KeyError):
+        return jsonify({'error': 'Invalid token', 'valid': False}), 401
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+
+    items = (request.json or {}).get('requests')
+    error = validate_batch(items)
+    if error:
+        return jsonify({'error': error}), 400
+    waves = dependency_waves(items)
+    if waves is None:
+        return jsonify({'error': 'depends_on contains a cycle'}), 400
+
+    headers = {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+    remote_addr = request.remote_addr
+    app = current_app._get_current_object()
+    results = {}
+    with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(items))) as pool:
+        for wave in waves:
+            for result in pool.map(lambda item: run_sub_request(app, item, headers, remote_addr, user), wave):
+                results[result['id']] = result
+
+    return compress_response(jsonify({
+        'user': user.to_dict(),
+        'responses': [results[item['id']] for item in items]
+    }))
@@ -1,14 +1,24 @@
 from flask import Blueprint, jsonify, request
 from src.models.user import User, Report, Anomaly, db
+from src.models.sharding import activate_region, current_region, filter_by_region, sharding_enabled
+from src.models.analytics import analytics_session, fan_out
+from src.models.counters import get_counters
+from src.models.shared_cache import cached_payload
+from src.models.teams import scope_to_team, team_reader_ids, team_supervisor_id
+from src.routes.batch import batch_user
 import jwt
 import os
 from datetime import datetime, timedelta
 from sqlalchemy import func
+from sqlalchemy.orm import selectinload
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
 SECRET_KEY = os.environ.get('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
 
+# Upper bound on staleness for figures that depend on the clock rather than the data
+DASHBOARD_CACHE_TTL = int(os.environ.get('DASHBOARD_CACHE_TTL', '300'))
+
 def get_user_from_token(token):
     try:
         if token.startswith('Bearer '):
@@ -16,7 +26,9 @@ def get_user_from_token(token):
         
         payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
         user_id = payload['user_id']
-        return User.query.get(user_id)
+        user = batch_user(user_id) or User.query.get(user_id)
+        activate_region(user)
+        return user
     except:
         return None
 
@@ -28,16 +40,18 @@ def get_reader_dashboard():
     if not user:
         return jsonify({'error': 'Invalid or missing token'}), 401
 
+    session = analytics_session()
+
     # Get current month's reports for this user
     current_month = datetime.now().replace(day=1)
     previous_month = (current_month - timedelta(days=1)).replace(day=1)
     
-    current_month_reports = Report.query.filter(
+    current_month_reports = session.query(Report).filter(
         Report.staff_id == user.id,
         Report.report_date >= current_month
     ).all()
     
-    previous_month_reports = Report.query.filter(
+    previous_month_reports = session.query(Report).filter(
         Report.staff_id == user.id,
         Report.report_date >= previous_month,
         Report.report_date < current_month
@@ -48,10 +62,10 @@ def get_reader_dashboard():
     previous_avg = sum(r.percentage_attained for r in previous_month_reports) / len(previous_month_reports) if previous_month_reports else 0
 
     # Get recent anomalies
-    recent_anomalies = Anomaly.query.filter_by(staff_id=user.id).order_by(Anomaly.timestamp.desc()).limit(5).all()
+    recent_anomalies = session.query(Anomaly).options(selectinload(Anomaly.attachments)).filter_by(staff_id=user.id).order_by(Anomaly.timestamp.desc()).limit(5).all()
 
     # Get pending reports
-    pending_reports = Report.query.filter_by(staff_id=user.id, status='Pending').count()
+    pending_reports = get_counters(session, [user.id])[user.id]['pending_reports']
 
     return jsonify({
         'current_month_average': round(current_avg, 2),
@@ -74,66 +88,94 @@ def get_supervisor_dashboard():
     if user.role not in ['Supervisor', 'Commercial Engineer']:
         return jsonify({'error': 'Permission denied'}), 403
 
+    payload = cached_payload('dashboard/supervisor', user, datetime.now().strftime('%Y-%m'), DASHBOARD_CACHE_TTL, lambda: supervisor_dashboard_payload(user))
+    return jsonify(dict(payload, user=user.to_dict()))
+
+def supervisor_dashboard_payload(user):
+    # Commercial Engineers see every region; everyone else sees their own,
+    # and Supervisors who own a team only their team's readers
+    if user.role == 'Commercial Engineer' and sharding_enabled():
+        shards = fan_out(supervisor_dashboard_shard)
+    else:
+        shards = [supervisor_dashboard_shard(analytics_session(), current_region(), team_supervisor_id(user))]
+
+    anomaly_distribution = {}
+    for shard in shards:
+        for anomaly_type, count in shard['anomaly_distribution']:
+            anomaly_distribution[anomaly_type] = anomaly_distribution.get(anomaly_type, 0) + count
+
+    return {
+        'reader_performance': [reader for shard in shards for reader in shard['reader_performance']],
+        'total_reports': sum(shard['total_reports'] for shard in shards),
+        'total_anomalies': sum(shard['total_anomalies'] for shard in shards),
+        'escalated_anomalies': sum(shard['escalated_anomalies'] for shard in shards),
+        'anomaly_distribution': [{'type': anomaly_type, 'count': count} for anomaly_type, count in anomaly_distribution.items()]
+    }
+
+def supervisor_dashboard_shard(session, region, supervisor_id=None):
+    """Supervisor dashboard figures for one region's readers and data, optionally one supervisor's teams"""
     # Get all meter readers
-    meter_readers = User.query.filter_by(role='Meter Reader').all()
+    meter_readers = filter_by_region(session.query(User).filter_by(role='Meter Reader'), User.region, region)
+    if supervisor_id is not None:
+        # Users live in the primary database, the scope table next to the region's data
+        meter_readers = meter_readers.filter(User.id.in_(team_reader_ids(session, supervisor_id)))
+    meter_readers = meter_readers.all()
     
     # Get current month data
     current_month = datetime.now().replace(day=1)
     
+    # Current month averages for every reader in one grouped query
+    monthly = {
+        staff_id: (count, avg)
+        for staff_id, count, avg in scope_to_team(session.query(
+            Report.staff_id,
+            func.count(Report.id),
+            func.avg(Report.percentage_attained)
+        ), supervisor_id, Report.staff_id).filter(
+            Report.report_date >= current_month
+        ).group_by(Report.staff_id).all()
+    }
+
+    counters = get_counters(session, [reader.id for reader in meter_readers])
+
     reader_performance = []
     for reader in meter_readers:
-        # Get current month reports
-        reports = Report.query.filter(
-            Report.staff_id == reader.id,
-            Report.report_date >= current_month
-        ).all()
-        
-        # Calculate average percentage
-        avg_percentage = sum(r.percentage_attained for r in reports) / len(reports) if reports else 0
-        
-        # Get pending reports
-        pending_reports = Report.query.filter_by(staff_id=reader.id, status='Pending').count()
-        
-        # Get open anomalies
-        open_anomalies = Anomaly.query.filter_by(staff_id=reader.id, resolution_status='Open').count()
-        
-        # Get escalated anomalies
-        escalated_anomalies = Anomaly.query.filter_by(staff_id=reader.id, escalation_flag=True).count()
+        total, avg_percentage = monthly.get(reader.id, (0, 0))
+        reader_counters = counters[reader.id]
 
         reader_performance.append({
             'staff_number': reader.staff_number,
             'staff_id': reader.id,
-            'average_percentage': round(avg_percentage, 2),
-            'total_reports': len(reports),
-            'pending_reports': pending_reports,
-            'open_anomalies': open_anomalies,
-            'escalated_anomalies': escalated_anomalies
+            'average_percentage': round(avg_percentage or 0, 2),
+            'total_reports': total,
+            'pending_reports': reader_counters['pending_reports'],
+            'open_anomalies': reader_counters['open_anomalies'],
+            'escalated_anomalies': reader_counters['escalated_anomalies']
         })
 
     # Get overall statistics
-    total_reports = Report.query.filter(Report.report_date >= current_month).count()
-    total_anomalies = Anomaly.query.filter(Anomaly.timestamp >= current_month).count()
-    escalated_anomalies = Anomaly.query.filter(
+    total_reports = scope_to_team(session.query(Report), supervisor_id, Report.staff_id).filter(Report.report_date >= current_month).count()
+    total_anomalies = scope_to_team(session.query(Anomaly), supervisor_id, Anomaly.staff_id).filter(Anomaly.timestamp >= current_month).count()
+    escalated_anomalies = scope_to_team(session.query(Anomaly), supervisor_id, Anomaly.staff_id).filter(
         Anomaly.timestamp >= current_month,
         Anomaly.escalation_flag == True
     ).count()
 
     # Get anomaly distribution
-    anomaly_distribution = db.session.query(
+    anomaly_distribution = scope_to_team(session.query(
         Anomaly.type,
         func.count(Anomaly.id).label('count')
-    ).filter(
+    ), supervisor_id, Anomaly.staff_id).filter(
         Anomaly.timestamp >= current_month
     ).group_by(Anomaly.type).all()
 
-    return jsonify({
+    return {
         'reader_performance': reader_performance,
         'total_reports': total_reports,
         'total_anomalies': total_anomalies,
         'escalated_anomalies': escalated_anomalies,
-        'anomaly_distribution': [{'type': item[0], 'count': item[1]} for item in anomaly_distribution],
-        'user': user.to_dict()
-    })
+        'anomaly_distribution': [(item[0], item[1]) for item in anomaly_distribution]
+    }
 
 @dashboard_bp.route('/dashboard/stats', methods=['GET'])
 def get_dashboard_stats():
@@ -145,40 +187,68 @@ def get_dashboard_stats():
 
     # Get date range from query parameters
     days = int(request.args.get('days', 30))
+
+    return jsonify(cached_payload(
+        'dashboard/stats', user, f"days={days}:{datetime.now().strftime('%Y-%m-%d')}", DASHBOARD_CACHE_TTL,
+        lambda: dashboard_stats_payload(user, days)
+    ))
+
+def dashboard_stats_payload(user, days):
     start_date = datetime.now() - timedelta(days=days)
 
+    if user.role == 'Commercial Engineer' and sharding_enabled():
+        shards = fan_out(lambda session, region: dashboard_stats_shard(session, start_date))
+    else:
+        shards = [dashboard_stats_shard(analytics_session(), start_date, team_supervisor_id(user))]
+
+    # Merge per-region trends by date, weighting averages by report count
+    reports_by_date = {}
+    anomalies_by_date = {}
+    for shard in shards:
+        for day, count, avg_percentage in shard['reports_by_date']:
+            total_count, total_percentage = reports_by_date.get(day, (0, 0.0))
+            reports_by_date[day] = (total_count + count, total_percentage + float(avg_percentage or 0) * count)
+        for day, count in shard['anomalies_by_date']:
+            anomalies_by_date[day] = anomalies_by_date.get(day, 0) + count
+
+    return {
+        'reports_trend': [
+            {
+                'date': day,
+                'count': count,
+                'avg_percentage': round(total_percentage / count, 2) if count else 0
+            }
+            for day, (count, total_percentage) in sorted(reports_by_date.items(), key=lambda item: item[0] or '')
+        ],
+        'anomalies_trend': [
+            {
+                'date': day,
+                'count': count
+            }
+            for day, count in sorted(anomalies_by_date.items(), key=lambda item: item[0] or '')
+        ]
+    }
+
+def dashboard_stats_shard(session, start_date, supervisor_id=None):
+    """Daily report and anomaly trends for one region, optionally one supervisor's teams"""
     # Get reports trend
-    reports_by_date = db.session.query(
+    reports_by_date = scope_to_team(session.query(
         func.date(Report.report_date).label('date'),
         func.count(Report.id).label('count'),
         func.avg(Report.percentage_attained).label('avg_percentage')
-    ).filter(
+    ), supervisor_id, Report.staff_id).filter(
         Report.report_date >= start_date.date()
     ).group_by(func.date(Report.report_date)).all()
 
     # Get anomalies trend
-    anomalies_by_date = db.session.query(
+    anomalies_by_date = scope_to_team(session.query(
         func.date(Anomaly.timestamp).label('date'),
         func.count(Anomaly.id).label('count')
-    ).filter(
+    ), supervisor_id, Anomaly.staff_id).filter(
         Anomaly.timestamp >= start_date
     ).group_by(func.date(Anomaly.timestamp)).all()
 
-    return jsonify({
-        'reports_trend': [
-            {
-                'date': item[0].isoformat() if item[0] else None,
-                'count': item[1],
-                'avg_percentage': round(float(item[2]), 2) if item[2] else 0
-            }
-            for item in reports_by_date
-        ],
-        'anomalies_trend': [
-            {
-                'date': item[0].isoformat() if item[0] else None,
-                'count': item[1]
-            }
-            for item in anomalies_by_date
-        ]
-    })
-
+    return {
+        'reports_by_date': [(str(item[0]) if item[0] else None, item[1], item[2]) for item in reports_by_date],
+        'anomalies_by_date': [(str(item[0]) if item[0] else None, item[1]) for item in anomalies_by_date]
+    }
@@ -5,6 +5,10 @@ from email.mime.multipart import MIMEMultipart
 from datetime import datetime
 from flask import Blueprint, jsonify, request
 from src.models.user import User, Anomaly, Escalation, db
+from src.models.sharding import activate_region, region_names, region_session, sharding_enabled
+from src.routes.batch import batch_user
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
 import jwt
 
 email_bp = Blueprint('email', __name__)
@@ -25,7 +29,9 @@ def get_user_from_token(token):
         
         payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
         user_id = payload['user_id']
-        return User.query.get(user_id)
+        user = batch_user(user_id) or User.query.get(user_id)
+        activate_region(user)
+        return user
     except:
         return None
 
@@ -145,6 +151,100 @@ def send_escalation_notification(anomaly, escalated_to_user):
     
     return send_email(to_email, subject, body_html, body_text)
 
+def send_escalation_digest(escalated_to_user, anomalies):
+    """Send a single digest email listing every anomaly newly escalated to a user"""
+    subject = f"[Reading Reports.io] {len(anomalies)} Anomalies Escalated"
+
+    rows_html = "".join(
+        f"""
+                <tr>
+                    <td>{anomaly.type}</td>
+                    <td>{anomaly.description or ''}</td>
+                    <td>{anomaly.staff.staff_number if anomaly.staff else 'Unknown'}</td>
+                    <td>{anomaly.timestamp.strftime('%Y-%m-%d %H:%M:%S') if anomaly.timestamp else 'Unknown'}</td>
+                    <td>{anomaly.resolution_status}</td>
+                </tr>"""
+        for anomaly in anomalies
+    )
+
+    body_html = f"""
+    <html>
+    <head>
+        <style>
+            body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+            .header {{ background-color: #003399; color: white; padding: 20px; text-align: center; }}
+            .content {{ padding: 20px; }}
+            .anomaly-details {{ background-color: #f8f9fa; padding: 15px; border-left: 4px solid #FFD100; margin: 15px 0; }}
+            .anomaly-details td, .anomaly-details th {{ padding: 4px 8px; text-align: left; }}
+            .footer {{ background-color: #f8f9fa; padding: 15px; text-align: center; font-size: 12px; color: #666; }}
+            .urgent {{ color: #dc3545; font-weight: bold; }}
+        </style>
+    </head>
+    <body>
+        <div class="header">
+            <h1>Reading Reports.io</h1>
+            <p>Kenya Power Meter Reading System</p>
+        </div>
+        
+        <div class="content">
+            <h2 class="urgent">Anomaly Escalation Digest</h2>
+            
+            <p>Dear {escalated_to_user.staff_number},</p>
+            
+            <p>The following {len(anomalies)} anomalies have been escalated to you for immediate attention and require your intervention.</p>
+            
+            <div class="anomaly-details">
+                <table>
+                    <tr>
+                        <th>Type</th>
+                        <th>Description</th>
+                        <th>Reported by</th>
+                        <th>Reported on</th>
+                        <th>Current Status</th>
+                    </tr>{rows_html}
+                </table>
+            </div>
+            
+            <p>Please log into the Reading Reports.io system to review and take appropriate action on these anomalies.</p>
+            
+            <p>Best regards,<br>
+            Reading Reports.io System</p>
+        </div>
+        
+        <div class="footer">
+            <p>© 2025 Reading Reports.io - powered by 85891</p>
+            <p>This is an automated message. Please do not reply to this email.</p>
+        </div>
+    </body>
+    </html>
+    """
+
+    rows_text = "".join(
+        f"""
+    - {anomaly.type} reported by {anomaly.staff.staff_number if anomaly.staff else 'Unknown'} on {anomaly.timestamp.strftime('%Y-%m-%d %H:%M:%S') if anomaly.timestamp else 'Unknown'} ({anomaly.resolution_status}): {anomaly.description or ''}"""
+        for anomaly in anomalies
+    )
+
+    body_text = f"""
+    Reading Reports.io - Anomaly Escalation Digest
+    
+    Dear {escalated_to_user.staff_number},
+    
+    The following {len(anomalies)} anomalies have been escalated to you for immediate attention:
+    {rows_text}
+    
+    Please log into the Reading Reports.io system to review and take appropriate action on these anomalies.
+    
+    Best regards,
+    Reading Reports.io System
+    
+    © 2025 Reading Reports.io - powered by 85891
+    """
+
+    to_email = f"{escalated_to_user.staff_number}@kenyapower.co.ke"
+
+    return send_email(to_email, subject, body_html, body_text)
+
 def send_report_submission_confirmation(user, report):
     """Send report submission confirmation email"""
     subject = f"[Reading Reports.io] Report Submitted Successfully - {report.itin}"
@@ -238,6 +338,29 @@ def send_test_email():
     else:
         return jsonify({'error': 'Failed to send test email'}), 500
 
+def pending_escalation_notices(session):
+    """Latest escalation of every flagged anomaly not yet notified, in a single windowed query"""
+    latest = session.query(
+        Escalation.id.label('escalation_id'),
+        func.row_number().over(
+            partition_by=Escalation.anomaly_id,
+            order_by=(Escalation.escalation_timestamp.desc(), Escalation.id.desc())
+        ).label('rank')
+    ).subquery()
+
+    return session.query(Escalation).join(
+        latest, Escalation.id == latest.c.escalation_id
+    ).join(
+        Anomaly, Escalation.anomaly_id == Anomaly.id
+    ).filter(
+        latest.c.rank == 1,
+        Anomaly.escalation_flag == True,
+        Escalation.notified_at.is_(None)
+    ).options(
+        selectinload(Escalation.escalated_to),
+        selectinload(Escalation.anomaly).selectinload(Anomaly.staff)
+    ).all()
+
 @email_bp.route('/escalation_notifications', methods=['POST'])
 def send_escalation_notifications():
     """Manually trigger escalation notifications for flagged anomalies"""
@@ -250,21 +373,42 @@ def send_escalation_notifications():
     if user.role not in ['Supervisor', 'Commercial Engineer']:
         return jsonify({'error': 'Permission denied'}), 403
 
-    # Get all escalated anomalies that haven't been notified
-    escalated_anomalies = Anomaly.query.filter_by(escalation_flag=True).all()
-    
-    notifications_sent = 0
-    for anomaly in escalated_anomalies:
-        # Find the latest escalation for this anomaly
-        escalation = Escalation.query.filter_by(anomaly_id=anomaly.id).order_by(Escalation.escalation_timestamp.desc()).first()
-        
-        if escalation and escalation.escalated_to:
-            success = send_escalation_notification(anomaly, escalation.escalated_to)
+    # Escalations live with the anomaly's region; Commercial Engineers notify every region
+    if user.role == 'Commercial Engineer' and sharding_enabled():
+        sessions = [region_session(region) for region in region_names()]
+    else:
+        sessions = [db.session]
+
+    try:
+        pending = [escalation for session in sessions for escalation in pending_escalation_notices(session)]
+
+        # Group the newly escalated anomalies by recipient
+        by_recipient = {}
+        for escalation in pending:
+            if escalation.escalated_to:
+                by_recipient.setdefault(escalation.escalated_to_id, []).append(escalation)
+
+        notifications_sent = 0
+        anomalies_notified = 0
+        notified_at = datetime.utcnow()
+        for escalations in by_recipient.values():
+            recipient = escalations[0].escalated_to
+            success = send_escalation_digest(recipient, [e.anomaly for e in escalations])
             if success:
+                for escalation in escalations:
+                    escalation.notified_at = notified_at
                 notifications_sent += 1
+                anomalies_notified += len(escalations)
+
+        for session in sessions:
+            session.commit()
+    finally:
+        for session in sessions:
+            if session is not db.session:
+                session.close()
 
     return jsonify({
         'message': f'Sent {notifications_sent} escalation notifications',
-        'notifications_sent': notifications_sent
+        'notifications_sent': notifications_sent,
+        'anomalies_notified': anomalies_notified
     }), 200
-
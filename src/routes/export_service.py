@@ -0,0 +1,686 @@
+import glob
+import hashlib
+import json
+import os
+import socket
+import threading
+import uuid
+from calendar import monthrange
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
+from io import BytesIO
+
+import click
+import jwt
+import pandas as pd
+from flask import Blueprint, current_app, jsonify, request, send_file
+from openpyxl import Workbook
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, selectinload
+from src.models.user import User, Report, Anomaly, Escalation, ExportJob, db
+from src.models.sharding import activate_region, sharding_enabled
+from src.models.analytics import analytics_session, fan_out
+from src.models.teams import scope_to_team, team_supervisor_id
+from src.routes.batch import batch_user
+
+export_bp = Blueprint('exports', __name__)
+
+SECRET_KEY = os.environ.get('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
+
+SNAPSHOT_DIR = os.environ.get(
+    'SNAPSHOT_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'snapshots')
+)
+
+EXPORT_DIR = os.environ.get(
+    'EXPORT_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'exports')
+)
+
+# At most EXPORT_WORKERS exports run at once; beyond EXPORT_QUEUE_LIMIT new jobs are refused
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', '2'))
+EXPORT_QUEUE_LIMIT = int(os.environ.get('EXPORT_QUEUE_LIMIT', '20'))
+EXPORT_CHUNK_SIZE = 1000
+# Finished export files are deleted this long after the job completed
+EXPORT_RETENTION_HOURS = float(os.environ.get('EXPORT_RETENTION_HOURS', '24'))
+
+def get_user_from_token(token):
+    try:
+        if token.startswith('Bearer '):
+            token = token[7:]
+        
+        payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+        user_id = payload['user_id']
+        user = batch_user(user_id) or User.query.get(user_id)
+        activate_region(user)
+        return user
+    except:
+        return None
+
+EXPORT_FORMATS = {
+    'excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': ('csv', 'text/csv'),
+}
+
+REPORT_COLUMNS = [
+    'ID', 'ITIN', 'Report Date', 'Percentage Attained', 'Reasons Not Attained',
+    'Staff Number', 'Timestamp', 'Status', 'Notes/Comments'
+]
+
+def report_rows(reports):
+    """Flatten reports into export rows"""
+    rows = []
+    for report in reports:
+        rows.append({
+            'ID': report.id,
+            'ITIN': report.itin,
+            'Report Date': report.report_date.strftime('%Y-%m-%d') if report.report_date else '',
+            'Percentage Attained': report.percentage_attained,
+            'Reasons Not Attained': report.reasons_not_attained or '',
+            'Staff Number': report.staff.staff_number if report.staff else '',
+            'Timestamp': report.timestamp.strftime('%Y-%m-%d %H:%M:%S') if report.timestamp else '',
+            'Status': report.status,
+            'Notes/Comments': report.notes_comments or ''
+        })
+    return rows
+
+def render_export(rows, format_type):
+    """Render export rows as Excel or CSV bytes"""
+    df = pd.DataFrame(rows, columns=REPORT_COLUMNS)
+    output = BytesIO()
+    if format_type == 'excel':
+        with pd.ExcelWriter(output, engine='openpyxl') as writer:
+            df.to_excel(writer, index=False, sheet_name='Reports')
+    else:
+        df.to_csv(output, index=False)
+    return output.getvalue()
+
+# Snapshot exports
+#
+# Snapshots are written as reports_<start>_<end>_<group>_<hash>.<ext> where
+# group is 'all' or a staff id. The date range lives in the file name so any
+# worker can find or invalidate a snapshot without shared state.
+
+# Rewritten with a fresh token whenever reports change, so a build can tell
+# that data it already read went stale before its file was written
+SNAPSHOT_GENERATION_FILE = '.generation'
+
+# Times a period is rebuilt when reports change under it before giving up
+SNAPSHOT_ATTEMPTS = 3
+
+def _snapshot_prefix(start, end, group):
+    return f"reports_{start.isoformat()}_{end.isoformat()}_{group}_"
+
+def find_snapshot(start, end, group, format_type):
+    """Return (path, content_hash) of a matching snapshot, or None"""
+    if start is None or end is None or format_type not in EXPORT_FORMATS:
+        return None
+    extension = EXPORT_FORMATS[format_type][0]
+    pattern = os.path.join(SNAPSHOT_DIR, f"{_snapshot_prefix(start, end, group)}*.{extension}")
+    for path in glob.glob(pattern):
+        content_hash = os.path.basename(path)[:-len(extension) - 1].rsplit('_', 1)[-1]
+        return path, content_hash
+    return None
+
+def write_snapshot(start, end, group, format_type, content):
+    """Atomically write a snapshot file, replacing older versions of it"""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    extension = EXPORT_FORMATS[format_type][0]
+    prefix = _snapshot_prefix(start, end, group)
+    content_hash = hashlib.sha256(content).hexdigest()[:16]
+    path = os.path.join(SNAPSHOT_DIR, f"{prefix}{content_hash}.{extension}")
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+    for old_path in glob.glob(os.path.join(SNAPSHOT_DIR, f"{prefix}*.{extension}")):
+        if old_path != path:
+            _remove(old_path)
+    return path, content_hash
+
+def snapshot_generation():
+    try:
+        with open(os.path.join(SNAPSHOT_DIR, SNAPSHOT_GENERATION_FILE)) as f:
+            return f.read()
+    except FileNotFoundError:
+        return ''
+
+def _bump_snapshot_generation():
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = os.path.join(SNAPSHOT_DIR, SNAPSHOT_GENERATION_FILE)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(tmp_path, path)
+
+def invalidate_snapshots(report_dates):
+    """Delete snapshots whose date range covers any of the given report dates"""
+    if not report_dates:
+        return 0
+    # Bumped before deleting: a build that wrote its file before the deletes
+    # loses it to them, one that writes after sees the new generation
+    _bump_snapshot_generation()
+    removed = 0
+    for path in glob.glob(os.path.join(SNAPSHOT_DIR, 'reports_*')):
+        parts = os.path.basename(path).split('_')
+        try:
+            start = date.fromisoformat(parts[1])
+            end = date.fromisoformat(parts[2])
+        except (IndexError, ValueError):
+            continue
+        if any(start <= d <= end for d in report_dates):
+            _remove(path)
+            removed += 1
+    return removed
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def snapshot_periods(today=None):
+    """Standard periods that get a nightly snapshot: this month and last month"""
+    today = today or date.today()
+    this_month = today.replace(day=1)
+    last_month_end = this_month - timedelta(days=1)
+    last_month = last_month_end.replace(day=1)
+    return {
+        'this_month': (this_month, this_month.replace(day=monthrange(today.year, today.month)[1])),
+        'last_month': (last_month, last_month_end),
+    }
+
+def build_snapshots(today=None):
+    """Build snapshots for every standard period, for all readers and per reader.
+
+    Reports committed while a period is being built would leave files that
+    no invalidation ever removes, so the generation is read before the
+    query and checked again once the files are written; if it moved, the
+    period's files are discarded and it is built again.
+    """
+    written = []
+    for start, end in snapshot_periods(today).values():
+        for attempt in range(SNAPSHOT_ATTEMPTS):
+            # A fresh read transaction, so a retry sees the reports that moved the generation
+            analytics_session().rollback()
+            generation = snapshot_generation()
+            reports = analytics_session().query(Report).options(selectinload(Report.staff)).filter(
+                Report.report_date >= start,
+                Report.report_date <= end
+            ).order_by(Report.timestamp.desc()).all()
+
+            groups = {'all': reports}
+            for report in reports:
+                groups.setdefault(report.staff_id, []).append(report)
+
+            period_written = []
+            for group, group_reports in groups.items():
+                rows = report_rows(group_reports)
+                for format_type in EXPORT_FORMATS:
+                    period_written.append(write_snapshot(start, end, group, format_type, render_export(rows, format_type)))
+
+            if snapshot_generation() == generation:
+                written.extend(period_written)
+                break
+            for path, _ in period_written:
+                _remove(path)
+    return written
+
+# Invalidate snapshots once a transaction touching reports commits
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_report_dates(session, flush_context):
+    changed = session.info.setdefault('changed_report_dates', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Report):
+            continue
+        if obj.report_date:
+            changed.add(obj.report_date)
+        history = inspect(obj).attrs.report_date.history
+        changed.update(d for d in history.deleted if d)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_snapshots(session):
+    changed = session.info.pop('changed_report_dates', None)
+    if changed:
+        invalidate_snapshots(changed)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_report_dates(session):
+    session.info.pop('changed_report_dates', None)
+
+# Report pack: one workbook with summary, per-reader, anomaly and escalation sheets
+
+def load_pack_tables(start, end, supervisor_id=None, session=None):
+    """Read everything a report pack needs as plain tuples in one pass.
+
+    Sheet builders only ever see this snapshot and never touch the
+    database session. With a supervisor_id
+    only that supervisor's teams are included. Reads the current region
+    unless given another region's session.
+    """
+    session = session or analytics_session()
+    staff_numbers = dict(session.query(User.id, User.staff_number).all())
+
+    reports = scope_to_team(session.query(
+        Report.id, Report.itin, Report.report_date, Report.percentage_attained,
+        Report.reasons_not_attained, Report.staff_id, Report.timestamp,
+        Report.status, Report.notes_comments
+    ), supervisor_id, Report.staff_id).filter(
+        Report.report_date >= start,
+        Report.report_date <= end
+    ).order_by(Report.report_date, Report.id).all()
+
+    start_dt = datetime.combine(start, datetime.min.time())
+    end_dt = datetime.combine(end + timedelta(days=1), datetime.min.time())
+
+    anomalies = scope_to_team(session.query(
+        Anomaly.id, Anomaly.report_id, Anomaly.type, Anomaly.description,
+        Anomaly.timestamp, Anomaly.escalation_flag, Anomaly.assigned_to_id,
+        Anomaly.resolution_status, Anomaly.staff_id
+    ), supervisor_id, Anomaly.staff_id).filter(
+        Anomaly.timestamp >= start_dt,
+        Anomaly.timestamp < end_dt
+    ).order_by(Anomaly.timestamp, Anomaly.id).all()
+
+    escalations = session.query(
+        Escalation.id, Escalation.anomaly_id, Escalation.escalation_timestamp,
+        Escalation.escalated_to_id, Escalation.resolution_status
+    )
+    if supervisor_id is not None:
+        escalations = scope_to_team(escalations.join(Anomaly, Escalation.anomaly_id == Anomaly.id), supervisor_id, Anomaly.staff_id)
+    escalations = escalations.filter(
+        Escalation.escalation_timestamp >= start_dt,
+        Escalation.escalation_timestamp < end_dt
+    ).order_by(Escalation.escalation_timestamp, Escalation.id).all()
+
+    return {
+        'staff_numbers': staff_numbers,
+        'reports': reports,
+        'anomalies': anomalies,
+        'escalations': escalations,
+    }
+
+def merge_pack_tables(shards):
+    """One set of pack tables from every region's.
+
+    Users live in the primary database, so staff ids and staff numbers are
+    shared; report, anomaly and escalation ids are only unique per region.
+    """
+    return {
+        'staff_numbers': shards[0]['staff_numbers'],
+        'reports': sorted((row for shard in shards for row in shard['reports']), key=lambda row: (row.report_date, row.id)),
+        'anomalies': sorted((row for shard in shards for row in shard['anomalies']), key=lambda row: (row.timestamp, row.id)),
+        'escalations': sorted((row for shard in shards for row in shard['escalations']), key=lambda row: (row.escalation_timestamp, row.id)),
+    }
+
+def _format_datetime(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else ''
+
+def _summary_sheet(tables):
+    per_reader = {}
+    for report in tables['reports']:
+        stats = per_reader.setdefault(report.staff_id, [0, 0.0, 0])
+        stats[0] += 1
+        stats[1] += report.percentage_attained or 0
+        if report.status == 'Pending':
+            stats[2] += 1
+    anomaly_counts = {}
+    for anomaly in tables['anomalies']:
+        counts = anomaly_counts.setdefault(anomaly.staff_id, [0, 0])
+        counts[0] += 1
+        if anomaly.escalation_flag:
+            counts[1] += 1
+
+    rows = [['Staff Number', 'Reports', 'Average Percentage', 'Pending Reports', 'Anomalies', 'Escalated Anomalies']]
+    for staff_id in sorted(set(per_reader) | set(anomaly_counts), key=lambda i: tables['staff_numbers'].get(i, '')):
+        count, total, pending = per_reader.get(staff_id, [0, 0.0, 0])
+        anomalies, escalated = anomaly_counts.get(staff_id, [0, 0])
+        rows.append([
+            tables['staff_numbers'].get(staff_id, ''),
+            count,
+            round(total / count, 2) if count else 0,
+            pending,
+            anomalies,
+            escalated
+        ])
+    return rows
+
+def _reader_sheet(reports):
+    rows = [['ID', 'ITIN', 'Report Date', 'Percentage Attained', 'Reasons Not Attained', 'Timestamp', 'Status', 'Notes/Comments']]
+    for report in reports:
+        rows.append([
+            report.id,
+            report.itin,
+            report.report_date.strftime('%Y-%m-%d') if report.report_date else '',
+            report.percentage_attained,
+            report.reasons_not_attained or '',
+            _format_datetime(report.timestamp),
+            report.status,
+            report.notes_comments or ''
+        ])
+    return rows
+
+def _anomalies_sheet(tables):
+    staff_numbers = tables['staff_numbers']
+    rows = [['ID', 'Report ID', 'Type', 'Description', 'Timestamp', 'Escalated', 'Assigned To', 'Resolution Status', 'Staff Number']]
+    for anomaly in tables['anomalies']:
+        rows.append([
+            anomaly.id,
+            anomaly.report_id,
+            anomaly.type,
+            anomaly.description or '',
+            _format_datetime(anomaly.timestamp),
+            'Yes' if anomaly.escalation_flag else 'No',
+            staff_numbers.get(anomaly.assigned_to_id, ''),
+            anomaly.resolution_status,
+            staff_numbers.get(anomaly.staff_id, '')
+        ])
+    return rows
+
+def _escalations_sheet(tables):
+    staff_numbers = tables['staff_numbers']
+    rows = [['ID', 'Anomaly ID', 'Escalated On', 'Escalated To', 'Resolution Status']]
+    for escalation in tables['escalations']:
+        rows.append([
+            escalation.id,
+            escalation.anomaly_id,
+            _format_datetime(escalation.escalation_timestamp),
+            staff_numbers.get(escalation.escalated_to_id, ''),
+            escalation.resolution_status
+        ])
+    return rows
+
+def _unique_sheet_title(title, used_titles):
+    """Excel sheet title of at most 31 characters, numbered from the base title when taken"""
+    base = title[:31]
+    title = base
+    suffix = 1
+    while title in used_titles:
+        suffix += 1
+        title = f"{base[:31 - len(str(suffix)) - 1]}_{suffix}"
+    used_titles.add(title)
+    return title
+
+def build_report_pack(tables):
+    """Build every sheet in turn and stream it into a write-only workbook.
+
+    The sheet builders are pure Python, so a thread pool only interleaved
+    them under the GIL; building one sheet at a time also keeps just that
+    sheet's rows in memory.
+    """
+    by_reader = {}
+    for report in tables['reports']:
+        by_reader.setdefault(report.staff_id, []).append(report)
+    readers = sorted(by_reader, key=lambda i: tables['staff_numbers'].get(i, ''))
+
+    sheets = [('Summary', lambda: _summary_sheet(tables))]
+    sheets += [(f"Reader {tables['staff_numbers'].get(staff_id, staff_id)}", lambda staff_id=staff_id: _reader_sheet(by_reader[staff_id]))
+               for staff_id in readers]
+    sheets += [('Anomalies', lambda: _anomalies_sheet(tables)), ('Escalations', lambda: _escalations_sheet(tables))]
+
+    workbook = Workbook(write_only=True)
+    used_titles = set()
+    for title, build in sheets:
+        worksheet = workbook.create_sheet(title=_unique_sheet_title(title, used_titles))
+        for row in build():
+            worksheet.append(row)
+
+    output = BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+@export_bp.route('/reports/pack', methods=['GET'])
+def download_report_pack():
+    token = request.headers.get('Authorization')
+    user = get_user_from_token(token)
+    
+    if not user:
+        return jsonify({'error': 'Invalid or missing token'}), 401
+
+    if user.role not in ['Supervisor', 'Commercial Engineer']:
+        return jsonify({'error': 'Permission denied'}), 403
+
+    default_start, default_end = snapshot_periods()['last_month']
+    try:
+        start = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() if request.args.get('start_date') else default_start
+        end = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() if request.args.get('end_date') else default_end
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+
+    supervisor_id = team_supervisor_id(user)
+    # Commercial Engineers get every region's shard in one pack
+    if user.role == 'Commercial Engineer' and sharding_enabled():
+        tables = merge_pack_tables(fan_out(lambda session, region: load_pack_tables(start, end, supervisor_id, session)))
+    else:
+        tables = load_pack_tables(start, end, supervisor_id)
+    content = build_report_pack(tables)
+
+    return send_file(
+        BytesIO(content),
+        mimetype=EXPORT_FORMATS['excel'][1],
+        as_attachment=True,
+        download_name=f'report_pack_{start.strftime("%Y%m%d")}_{end.strftime("%Y%m%d")}.xlsx'
+    )
+
+# Asynchronous export jobs
+
+_export_pool = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix='export')
+_export_slots = threading.BoundedSemaphore(EXPORT_QUEUE_LIMIT)
+
+def _worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _worker_alive(worker):
+    """False only for a worker on this host whose process is gone"""
+    host, _, pid = (worker or '').rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    if int(pid) == os.getpid():
+        # Checked at startup, before this process has queued anything; the pid was reused
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def recover_export_jobs():
+    """Fail Queued/Running jobs whose process died, so clients stop polling them forever.
+
+    Jobs only live in their process's thread pool, so after a restart
+    nothing will ever pick them up again. Jobs of processes still running,
+    and of other hosts, are left alone. Returns the number of jobs failed.
+    """
+    orphaned = [job for job in ExportJob.query.filter(ExportJob.status.in_(['Queued', 'Running'])).all()
+                if not _worker_alive(job.worker)]
+    for job in orphaned:
+        job.status = 'Failed'
+        job.error = 'Interrupted by a server restart. Please request the export again'
+        job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return len(orphaned)
+
+def expire_export_files(now=None):
+    """Delete files of exports finished more than EXPORT_RETENTION_HOURS ago; returns how many"""
+    cutoff = (now or datetime.utcnow()) - timedelta(hours=EXPORT_RETENTION_HOURS)
+    expired = ExportJob.query.filter(
+        ExportJob.file_path.isnot(None),
+        ExportJob.finished_at < cutoff
+    ).all()
+    for job in expired:
+        _remove(job.file_path)
+        job.file_path = None
+    db.session.commit()
+    return len(expired)
+
+def init_export_jobs(app):
+    """Startup housekeeping for export jobs; runs once the tables exist"""
+    with app.app_context():
+        failed = recover_export_jobs()
+        expired = expire_export_files()
+        if failed or expired:
+            app.logger.info('Export jobs: %d orphaned jobs failed, %d expired files removed', failed, expired)
+
+def report_export_query(session, user, filters):
+    """Reports visible to a user, narrowed by already-validated export filters"""
+    query = session.query(Report).options(selectinload(Report.staff))
+
+    # If user is not a supervisor, only export their own reports
+    if user.role not in ['Supervisor', 'Commercial Engineer']:
+        query = query.filter_by(staff_id=user.id)
+    else:
+        # Supervisors who own a team only export their team's readers
+        query = scope_to_team(query, team_supervisor_id(user), Report.staff_id)
+        if filters.get('staff_id'):
+            query = query.filter(Report.staff_id == filters['staff_id'])
+
+    if filters.get('start_date'):
+        query = query.filter(Report.report_date >= date.fromisoformat(filters['start_date']))
+    if filters.get('end_date'):
+        query = query.filter(Report.report_date <= date.fromisoformat(filters['end_date']))
+    if filters.get('status'):
+        query = query.filter(Report.status == filters['status'])
+
+    return query.order_by(Report.timestamp.desc())
+
+def run_export_job(app, job_id):
+    with app.app_context():
+        job = db.session.get(ExportJob, job_id)
+        try:
+            job.status = 'Running'
+            job.worker = _worker_name()
+            db.session.commit()
+
+            user = db.session.get(User, job.user_id)
+            activate_region(user)
+            query = report_export_query(analytics_session(), user, json.loads(job.filters))
+
+            # Commercial Engineers export across every region's shard
+            if user.role == 'Commercial Engineer' and sharding_enabled():
+                job.total_rows = sum(fan_out(lambda session, region: query.with_session(session).count()))
+                db.session.commit()
+                shards = fan_out(lambda session, region: report_rows(query.with_session(session).all()))
+                rows = sorted((row for shard in shards for row in shard), key=lambda row: row['Timestamp'], reverse=True)
+            else:
+                job.total_rows = query.count()
+                db.session.commit()
+
+                rows = []
+                chunk = []
+                for report in query.yield_per(EXPORT_CHUNK_SIZE):
+                    chunk.append(report)
+                    if len(chunk) == EXPORT_CHUNK_SIZE:
+                        rows.extend(report_rows(chunk))
+                        chunk = []
+                        job.processed_rows = len(rows)
+                        db.session.commit()
+                rows.extend(report_rows(chunk))
+
+            extension = EXPORT_FORMATS[job.format][0]
+            os.makedirs(EXPORT_DIR, exist_ok=True)
+            path = os.path.join(EXPORT_DIR, f"export_{job.id}.{extension}")
+            with open(path, 'wb') as f:
+                f.write(render_export(rows, job.format))
+
+            job.processed_rows = len(rows)
+            job.file_path = path
+            job.status = 'Completed'
+        except Exception as e:
+            db.session.rollback()
+            job.status = 'Failed'
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            _export_slots.release()
+
+@export_bp.route('/exports', methods=['POST'])
+def create_export():
+    token = request.headers.get('Authorization')
+    user = get_user_from_token(token)
+    
+    if not user:
+        return jsonify({'error': 'Invalid or missing token'}), 401
+
+    data = request.json or {}
+    format_type = data.get('format', 'excel')
+    if format_type not in EXPORT_FORMATS:
+        return jsonify({'error': 'Invalid format. Use excel or csv'}), 400
+
+    filters = {}
+    for key in ['start_date', 'end_date']:
+        if data.get(key):
+            try:
+                filters[key] = datetime.strptime(data[key], '%Y-%m-%d').date().isoformat()
+            except ValueError:
+                return jsonify({'error': f'Invalid {key} format. Use YYYY-MM-DD'}), 400
+    for key in ['staff_id', 'status']:
+        if data.get(key):
+            filters[key] = data[key]
+
+    # Cheap sweep; the job table only holds recent exports
+    expire_export_files()
+
+    if not _export_slots.acquire(blocking=False):
+        return jsonify({'error': 'Too many exports in progress. Please try again later'}), 503
+
+    try:
+        job = ExportJob(user_id=user.id, filters=json.dumps(filters), format=format_type, worker=_worker_name())
+        db.session.add(job)
+        db.session.commit()
+        _export_pool.submit(run_export_job, current_app._get_current_object(), job.id)
+    except Exception:
+        _export_slots.release()
+        raise
+
+    return jsonify({
+        'message': 'Export queued',
+        'job': job.to_dict()
+    }), 202
+
+@export_bp.route('/exports/<int:job_id>', methods=['GET'])
+def get_export(job_id):
+    """Job status while it runs; the exported file once it has completed"""
+    token = request.headers.get('Authorization')
+    user = get_user_from_token(token)
+    
+    if not user:
+        return jsonify({'error': 'Invalid or missing token'}), 401
+
+    job = ExportJob.query.get_or_404(job_id)
+
+    if job.user_id != user.id:
+        return jsonify({'error': 'Permission denied'}), 403
+
+    if job.status != 'Completed':
+        return jsonify(job.to_dict()), 202 if job.status in ['Queued', 'Running'] else 200
+
+    if not job.file_path or not os.path.exists(job.file_path):
+        return jsonify({'error': 'Export file is no longer available'}), 410
+
+    extension, mimetype = EXPORT_FORMATS[job.format]
+    return send_file(
+        job.file_path,
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=f'reading_reports_export_{job.id}.{extension}'
+    )
+
+@export_bp.cli.command('snapshot')
+def snapshot_command():
+    """Build nightly export snapshots (run from cron)."""
+    started = datetime.now()
+    written = build_snapshots()
+    click.echo(f"Wrote {len(written)} snapshots to {SNAPSHOT_DIR} in {(datetime.now() - started).total_seconds():.2f}s")
+
+@export_bp.cli.command('cleanup')
+def cleanup_command():
+    """Fail export jobs orphaned by a restart and delete expired export files."""
+    failed = recover_export_jobs()
+    expired = expire_export_files()
+    click.echo(f"Failed {failed} orphaned export jobs; removed {expired} export files older than {EXPORT_RETENTION_HOURS:g}h")
@@ -0,0 +1,114 @@
+import math
+
+import numpy as np
+
+# Intercept, trend per week, and Monday..Saturday offsets against Sunday
+N_FEATURES = 8
+
+_erf = np.vectorize(math.erf, otypes=[np.float64])
+
+def design_matrix(start_date, days, origin):
+    """Model features for `days` consecutive days from start_date.
+
+    The trend is measured in weeks from day `origin`, so the intercept is the
+    level on that day and the two coefficients are barely correlated.
+    """
+    dates = np.datetime64(start_date, 'D') + np.arange(days)
+    # 1970-01-01 was a Thursday; this makes Monday 0 and Sunday 6
+    day_of_week = (dates.astype(np.int64) + 3) % 7
+    X = np.zeros((days, N_FEATURES))
+    X[:, 0] = 1.0
+    X[:, 1] = (np.arange(days) - origin) / 7.0
+    X[:, 2:] = day_of_week[:, None] == np.arange(6)
+    return X, day_of_week
+
+def fit(matrix, X, ridge):
+    """Least-squares coefficients for every row of a series x day matrix with NaN gaps.
+
+    Series report on different days, so rather than one lstsq call per
+    series the normal equations of all of them are built with einsum and
+    solved in one batched call. Returns (coefficients, inverse normal
+    matrices, residual variances, observations per series). A small ridge
+    penalty keeps sparse series solvable and pulls their trend and
+    day-of-week effects towards zero.
+    """
+    observed = ~np.isnan(matrix)
+    weights = observed.astype(np.float64)
+    values = np.where(observed, matrix, 0.0)
+
+    penalty = np.full(N_FEATURES, ridge)
+    # The level is not shrunk, only kept solvable for series without data
+    penalty[0] = 1e-9
+    normal = np.einsum('sd,dp,dq->spq', weights, X, X) + np.diag(penalty)
+    normal_inv = np.linalg.inv(normal)
+    coefficients = np.einsum('spq,sq->sp', normal_inv, values @ X)
+
+    counts = observed.sum(axis=1)
+    residuals = np.where(observed, matrix - coefficients @ X.T, 0.0)
+    variances = (residuals ** 2).sum(axis=1) / np.maximum(counts - N_FEATURES, 1)
+    return coefficients, normal_inv, variances, counts
+
+def project_month_end(matrix, start_date, month_offset, future_days, ridge=1.0, z=1.2816, target=None):
+    """Projected month average for every series, with a confidence band.
+
+    matrix holds the history up to and including today; columns from
+    month_offset on are the current month. Future days are weighted by how
+    often each series reported on that weekday in the history, so readers
+    who never work Sundays are not projected on Sundays. The band combines
+    the coefficient uncertainty and the day-to-day noise of the expected
+    future reports, scaled by their share of the month's reports.
+    """
+    series, history_days = matrix.shape
+    X, day_of_week = design_matrix(start_date, history_days + future_days, history_days - 1)
+    X_history, X_future = X[:history_days], X[history_days:]
+
+    coefficients, normal_inv, variances, counts = fit(matrix, X_history, ridge)
+
+    observed = ~np.isnan(matrix)
+    weekdays = day_of_week[:history_days, None] == np.arange(7)
+    weekday_days = weekdays.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        report_rate = np.where(weekday_days > 0, (observed.astype(np.float64) @ weekdays) / weekday_days, 0.0)
+    expected = report_rate[:, day_of_week[history_days:]]
+
+    predicted = np.clip(coefficients @ X_future.T, 0.0, 100.0)
+    expected_reports = expected.sum(axis=1)
+    expected_total = (expected * predicted).sum(axis=1)
+
+    month = matrix[:, month_offset:]
+    month_reports = (~np.isnan(month)).sum(axis=1)
+    month_total = np.nansum(month, axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        reports = month_reports + expected_reports
+        projected = (month_total + expected_total) / reports
+        month_to_date = np.where(month_reports > 0, month_total / month_reports, np.nan)
+
+        mean_features = (expected @ X_future) / expected_reports[:, None]
+        parameter_variance = variances * np.einsum('sp,spq,sq->s', mean_features, normal_inv, mean_features)
+        noise_variance = variances / expected_reports
+        error = np.where(
+            expected_reports > 0,
+            expected_reports / reports * np.sqrt(parameter_variance + noise_variance),
+            0.0
+        )
+
+    result = {
+        'projected': projected,
+        'lower': np.clip(projected - z * error, 0.0, 100.0),
+        'upper': np.clip(projected + z * error, 0.0, 100.0),
+        'error': error,
+        'month_to_date': month_to_date,
+        'month_reports': month_reports,
+        'expected_reports_remaining': expected_reports,
+        'history_reports': counts,
+        'trend_per_week': coefficients[:, 1]
+    }
+    if target is not None:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            standardized = (target - projected) / (error * math.sqrt(2))
+            probability = 0.5 * (1 + _erf(np.nan_to_num(standardized, nan=0.0, posinf=0.0, neginf=0.0)))
+        # With nothing left to report the outcome is already known
+        settled = (error == 0) | ~np.isfinite(standardized)
+        result['miss_probability'] = np.where(settled, (projected < target).astype(np.float64), probability)
+    return result
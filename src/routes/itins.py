@@ -0,0 +1,287 @@
+from flask import Blueprint, jsonify, request
+from src.models.user import User, Report
+from src.models.sharding import activate_region, sharding_enabled
+from src.models.analytics import analytics_session, fan_out
+from src.models.teams import scope_to_team, team_supervisor_id
+from src.routes.response_encoding import compress_response, list_response
+from src.routes.batch import batch_user
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from sqlalchemy.orm import selectinload
+import numpy as np
+import jwt
+import os
+
+itins_bp = Blueprint('itins', __name__)
+
+SECRET_KEY = os.environ.get('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
+
+COVERAGE_MAX_DAYS = int(os.environ.get('COVERAGE_MAX_DAYS', '366'))
+FILL_STRATEGIES = ('none', 'zero', 'ffill', 'interpolate')
+
+def get_user_from_token(token):
+    try:
+        if token.startswith('Bearer '):
+            token = token[7:]
+        
+        payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+        user_id = payload['user_id']
+        user = batch_user(user_id) or User.query.get(user_id)
+        activate_region(user)
+        return user
+    except:
+        return None
+
+def scoped_reports(query, user):
+    """Own reports only, except for Supervisors (their teams) and Commercial Engineers (the region)"""
+    if user.role not in ['Supervisor', 'Commercial Engineer']:
+        return query.filter(Report.staff_id == user.id)
+    return scope_to_team(query, team_supervisor_id(user), Report.staff_id)
+
+def run_for_user(user, fn):
+    """Run fn(session) for the user's region, or every region for Commercial Engineers"""
+    if user.role == 'Commercial Engineer' and sharding_enabled():
+        return fan_out(lambda session, region: fn(session))
+    return [fn(analytics_session())]
+
+def coverage_rows(session, user, start_date, end_date):
+    """Raw (itin, day, percentage) rows for the range.
+
+    Runs as a Core select on the session's connection: for a quarter of
+    reports the ORM's per-row overhead is most of the request, and func.date()
+    keeps the day as text that NumPy parses in one pass.
+    """
+    statement = select(
+        Report.itin,
+        func.date(Report.report_date),
+        Report.percentage_attained
+    ).where(
+        Report.report_date >= start_date,
+        Report.report_date <= end_date
+    )
+    statement = scoped_reports(statement, user)
+    return session.connection(bind_arguments={'mapper': Report}).execute(statement).all()
+
+def build_coverage_matrix(rows, start_date, days):
+    """Pivot (itin, date, percentage) rows into an ITIN x day matrix.
+
+    Several reports for the same ITIN and day are averaged; days without a
+    report are NaN.
+    """
+    if not rows:
+        return np.array([], dtype=object), np.empty((0, days))
+
+    itin_values, report_dates, percentages = zip(*rows)
+    return pivot_matrix(itin_values, day_offsets(report_dates, start_date), np.array(percentages, dtype=np.float64), days)
+
+def day_offsets(report_dates, start_date):
+    """Days from start_date for a sequence of 'YYYY-MM-DD' strings"""
+    return (np.array(report_dates, dtype='datetime64[D]') - np.datetime64(start_date, 'D')).astype(np.int64)
+
+def pivot_matrix(keys, offsets, values, days):
+    """Average values into a key x day matrix; cells without values are NaN"""
+    # Dict factorisation beats np.unique on object arrays by a wide margin
+    positions = {}
+    row_index = np.fromiter((positions.setdefault(key, len(positions)) for key in keys), dtype=np.int64, count=len(offsets))
+    unique_keys = np.array(list(positions), dtype=object)
+
+    # bincount over flat cell indexes is much faster than np.add.at
+    cells = row_index * days + offsets
+    size = len(unique_keys) * days
+    totals = np.bincount(cells, weights=values, minlength=size).reshape(len(unique_keys), days)
+    counts = np.bincount(cells, minlength=size).reshape(len(unique_keys), days)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        matrix = totals / counts
+    return unique_keys, matrix
+
+def fill_matrix(matrix, strategy):
+    if strategy == 'zero':
+        return np.nan_to_num(matrix, nan=0.0)
+    if strategy == 'ffill':
+        # Index of the last observed day at or before each cell, carried along the row
+        observed = ~np.isnan(matrix)
+        last_seen = np.where(observed, np.arange(matrix.shape[1]), 0)
+        np.maximum.accumulate(last_seen, axis=1, out=last_seen)
+        return matrix[np.arange(matrix.shape[0])[:, None], last_seen]
+    if strategy == 'interpolate':
+        filled = matrix.copy()
+        days = np.arange(matrix.shape[1])
+        for row in filled:
+            observed = ~np.isnan(row)
+            if observed.any() and not observed.all():
+                # Linear between reports; the edges hold the nearest value
+                row[~observed] = np.interp(days[~observed], days[observed], row[observed])
+        return filled
+    return matrix
+
+def coverage_stats(matrix):
+    """Per-ITIN summary over the raw (unfilled) matrix"""
+    observed = ~np.isnan(matrix)
+    days = matrix.shape[1]
+    reported = observed.sum(axis=1)
+
+    # Rows come from the reports themselves, so every ITIN has at least one
+    # observed day and none of these reduce over an all-NaN row
+    mean = np.nanmean(matrix, axis=1)
+    minimum = np.nanmin(matrix, axis=1)
+    maximum = np.nanmax(matrix, axis=1)
+
+    # Longest gap: largest distance between consecutive observed days, counting the range edges
+    longest_gap = np.zeros(len(matrix), dtype=np.int64)
+    last_reported = np.full(len(matrix), -1, dtype=np.int64)
+    for i, row in enumerate(observed):
+        positions = np.flatnonzero(row)
+        bounded = np.concatenate(([-1], positions, [days]))
+        longest_gap[i] = np.diff(bounded).max() - 1
+        if positions.size:
+            last_reported[i] = positions[-1]
+
+    return {
+        'days_reported': reported,
+        'days_missing': days - reported,
+        'coverage': reported / days if days else np.zeros(len(matrix)),
+        'mean': mean,
+        'min': minimum,
+        'max': maximum,
+        'longest_gap': longest_gap,
+        'last_reported': last_reported
+    }
+
+def to_json_values(values, decimals=2):
+    """Round and swap NaN for None so the array serialises as JSON"""
+    rounded = np.round(values.astype(np.float64), decimals).astype(object)
+    rounded[np.isnan(values.astype(np.float64))] = None
+    return rounded.tolist()
+
+@itins_bp.route('/itins/coverage', methods=['GET'])
+def get_itin_coverage():
+    """ITIN x date matrix of percentage_attained with per-ITIN coverage stats.
+
+    Query params: start_date/end_date (default the last 90 days), fill
+    (none, zero, ffill, interpolate), sort (coverage or itin), limit.
+    """
+    token = request.headers.get('Authorization')
+    user = get_user_from_token(token)
+    
+    if not user:
+        return jsonify({'error': 'Invalid or missing token'}), 401
+
+    try:
+        end_date = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() if request.args.get('end_date') else datetime.now().date()
+        start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() if request.args.get('start_date') else end_date - timedelta(days=89)
+    except ValueError:
+        return jsonify({'error': 'Dates must be in YYYY-MM-DD format'}), 400
+
+    days = (end_date - start_date).days + 1
+    if days < 1 or days > COVERAGE_MAX_DAYS:
+        return jsonify({'error': f'Date range must cover 1 to {COVERAGE_MAX_DAYS} days'}), 400
+
+    fill = request.args.get('fill', 'none')
+    if fill not in FILL_STRATEGIES:
+        return jsonify({'error': f"fill must be one of {', '.join(FILL_STRATEGIES)}"}), 400
+
+    shards = run_for_user(user, lambda session: coverage_rows(session, user, start_date, end_date))
+    itins, matrix = build_coverage_matrix([row for shard in shards for row in shard], start_date, days)
+    stats = coverage_stats(matrix)
+    means, minimums, maximums = (to_json_values(stats[key]) for key in ('mean', 'min', 'max'))
+
+    # Worst coverage first, so the ITINs that keep missing days lead the heatmap
+    if request.args.get('sort') == 'itin':
+        order = np.argsort(itins.astype(str), kind='stable')
+    else:
+        order = np.lexsort((itins.astype(str), stats['coverage']))
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        if limit < 1:
+            return jsonify({'error': 'limit must be at least 1'}), 400
+        order = order[:limit]
+
+    dates = [(start_date + timedelta(days=offset)).isoformat() for offset in range(days)]
+    filled = fill_matrix(matrix[order], fill)
+
+    return compress_response(jsonify({
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'fill': fill,
+        'dates': dates,
+        'itins': itins[order].tolist(),
+        'matrix': to_json_values(filled, 1),
+        'stats': [
+            {
+                'itin': itins[i],
+                'days_reported': int(stats['days_reported'][i]),
+                'days_missing': int(stats['days_missing'][i]),
+                'coverage': round(float(stats['coverage'][i]), 4),
+                'mean': means[i],
+                'min': minimums[i],
+                'max': maximums[i],
+                'longest_gap': int(stats['longest_gap'][i]),
+                'last_reported': dates[stats['last_reported'][i]] if stats['last_reported'][i] >= 0 else None
+            }
+            for i in order
+        ]
+    }))
+
+def latest_reports(session, user, itins=None):
+    """Latest report per ITIN via a grouped max over the (itin, report_date) index"""
+    latest = scoped_reports(session.query(
+        Report.itin.label('itin'),
+        func.max(Report.report_date).label('report_date')
+    ), user)
+    if itins:
+        latest = latest.filter(Report.itin.in_(itins))
+    latest = latest.group_by(Report.itin).subquery()
+
+    reports = scoped_reports(session.query(Report).options(selectinload(Report.staff)), user).join(
+        latest,
+        (Report.itin == latest.c.itin) & (Report.report_date == latest.c.report_date)
+    ).all()
+
+    # Same-day duplicates: keep the most recently created one
+    by_itin = {}
+    for report in reports:
+        if report.itin not in by_itin or report.id > by_itin[report.itin].id:
+            by_itin[report.itin] = report
+    return [report.to_dict() for report in by_itin.values()]
+
+@itins_bp.route('/itins/latest', methods=['GET'])
+def get_latest_reports():
+    """Latest report for every ITIN, or only those given as ?itin=A&itin=B"""
+    token = request.headers.get('Authorization')
+    user = get_user_from_token(token)
+    
+    if not user:
+        return jsonify({'error': 'Invalid or missing token'}), 401
+
+    itins = request.args.getlist('itin')
+    shards = run_for_user(user, lambda session: latest_reports(session, user, itins))
+
+    # An ITIN can appear in more than one region; the newest report wins
+    by_itin = {}
+    for report in (report for shard in shards for report in shard):
+        current = by_itin.get(report['itin'])
+        if current is None or report['report_date'] > current['report_date']:
+            by_itin[report['itin']] = report
+
+    return list_response(sorted(by_itin.values(), key=lambda report: report['itin']))
+
+@itins_bp.route('/itins/<path:itin>/reports', methods=['GET'])
+def get_itin_history(itin):
+    """Report history for one ITIN, newest first"""
+    token = request.headers.get('Authorization')
+    user = get_user_from_token(token)
+    
+    if not user:
+        return jsonify({'error': 'Invalid or missing token'}), 401
+
+    limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+
+    def history(session):
+        return [report.to_dict() for report in scoped_reports(
+            session.query(Report).options(selectinload(Report.staff)), user
+        ).filter(Report.itin == itin).order_by(Report.report_date.desc(), Report.id.desc()).limit(limit).all()]
+
+    reports = [report for shard in run_for_user(user, history) for report in shard]
+    reports.sort(key=lambda report: (report['report_date'], report['id']), reverse=True)
+    return list_response(reports[:limit])
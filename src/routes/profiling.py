@@ -0,0 +1,217 @@
+from flask import Blueprint, g, jsonify, request, send_file
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from src.models.user import User
+from src.models.sharding import activate_region
+from src.routes.batch import batch_user
+from datetime import datetime
+import cProfile
+import contextvars
+import io
+import json
+import jwt
+import os
+import pstats
+import threading
+import time
+import uuid
+
+profiling_bp = Blueprint('profiling', __name__)
+
+SECRET_KEY = os.environ.get('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
+
+PROFILE_DIR = os.environ.get(
+    'PROFILE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'profiles')
+)
+PROFILE_MAX_ENTRIES = int(os.environ.get('PROFILE_MAX_ENTRIES', '50'))
+PROFILE_HEADER = 'X-Profile'
+PROFILE_ROLES = ['Supervisor', 'Commercial Engineer']
+
+# Statements run on the request's thread and in fan_out workers, which copy the
+# request's context; background threads (group commit writer, export jobs,
+# thumbnails) have their own context and are not captured
+SQL_CAPTURE_NOTE = 'Includes fan_out region queries; excludes background threads such as the group commit writer and export jobs'
+
+_ring_lock = threading.Lock()
+_sql_capture = contextvars.ContextVar('profile_sql_capture', default=None)
+
+def get_user_from_token(token):
+    try:
+        if token.startswith('Bearer '):
+            token = token[7:]
+        
+        payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+        user_id = payload['user_id']
+        user = batch_user(user_id) or User.query.get(user_id)
+        activate_region(user)
+        return user
+    except:
+        return None
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _sql_capture.get() is not None:
+        conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    statements = _sql_capture.get()
+    starts = conn.info.get('profile_query_start')
+    if statements is None or not starts:
+        return
+    # Only the shape of the bound parameters is kept; their values include PIN and answer hashes
+    rows = list(parameters) if executemany else [parameters]
+    statements.append({
+        'statement': statement,
+        'parameter_count': len(rows[0]) if rows and rows[0] else 0,
+        'rows': len(rows),
+        'duration_ms': round((time.perf_counter() - starts.pop()) * 1000, 3)
+    })
+
+def profile_paths(profile_id):
+    base = os.path.join(PROFILE_DIR, profile_id)
+    return f"{base}.json", f"{base}.prof"
+
+def list_profiles():
+    """Metadata for stored profiles, newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        meta.pop('sql', None)
+        meta.pop('top_functions', None)
+        profiles.append(meta)
+    return profiles
+
+def store_profile(meta, profiler):
+    """Write one profile and drop the oldest entries beyond PROFILE_MAX_ENTRIES"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    meta_path, stats_path = profile_paths(meta['id'])
+    profiler.dump_stats(stats_path)
+
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(30)
+    meta['top_functions'] = summary.getvalue()
+
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(meta_path + '.tmp', meta_path)
+
+    with _ring_lock:
+        ids = sorted(name[:-5] for name in os.listdir(PROFILE_DIR) if name.endswith('.json'))
+        for stale_id in ids[:-PROFILE_MAX_ENTRIES] if PROFILE_MAX_ENTRIES > 0 else ids:
+            for path in profile_paths(stale_id):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+def start_profiling():
+    if request.headers.get(PROFILE_HEADER) != '1' or request.blueprint == 'profiling':
+        return
+    user = get_user_from_token(request.headers.get('Authorization') or '')
+    if not user or user.role not in PROFILE_ROLES:
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already running on this thread
+        return
+    g.profile = {
+        'profiler': profiler,
+        'user': user.staff_number,
+        'started': time.perf_counter(),
+        'capture': _sql_capture.set([])
+    }
+
+def finish_profiling(response):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return response
+
+    profiler = profile['profiler']
+    profiler.disable()
+    statements = _sql_capture.get()
+    _sql_capture.reset(profile['capture'])
+
+    profile_id = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+    store_profile({
+        'id': profile_id,
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'staff_number': profile['user'],
+        'duration_ms': round((time.perf_counter() - profile['started']) * 1000, 3),
+        'sql_count': len(statements),
+        'sql_ms': round(sum(s['duration_ms'] for s in statements), 3),
+        'sql': statements,
+        'sql_capture': SQL_CAPTURE_NOTE,
+        'created_at': datetime.utcnow().isoformat()
+    }, profiler)
+
+    response.headers['X-Profile-Id'] = profile_id
+    return response
+
+def abandon_profiling(exc):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile['profiler'].disable()
+        _sql_capture.reset(profile['capture'])
+
+def init_profiling(app):
+    app.before_request(start_profiling)
+    app.after_request(finish_profiling)
+    app.teardown_request(abandon_profiling)
+
+@profiling_bp.route('/admin/profiles', methods=['GET'])
+def get_profiles():
+    token = request.headers.get('Authorization')
+    user = get_user_from_token(token)
+    
+    if not user or user.role not in PROFILE_ROLES:
+        return jsonify({'error': 'Permission denied'}), 403
+
+    return jsonify(list_profiles())
+
+@profiling_bp.route('/admin/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """Full metadata for one profile, including SQL and the top functions by cumulative time"""
+    token = request.headers.get('Authorization')
+    user = get_user_from_token(token)
+    
+    if not user or user.role not in PROFILE_ROLES:
+        return jsonify({'error': 'Permission denied'}), 403
+
+    meta_path, _ = profile_paths(os.path.basename(profile_id))
+    if not os.path.exists(meta_path):
+        return jsonify({'error': 'Profile not found'}), 404
+
+    with open(meta_path) as f:
+        return jsonify(json.load(f))
+
+@profiling_bp.route('/admin/profiles/<profile_id>/download', methods=['GET'])
+def download_profile(profile_id):
+    """Raw pstats dump, loadable with pstats, snakeviz or flameprof"""
+    token = request.headers.get('Authorization')
+    user = get_user_from_token(token)
+    
+    if not user or user.role not in PROFILE_ROLES:
+        return jsonify({'error': 'Permission denied'}), 403
+
+    profile_id = os.path.basename(profile_id)
+    _, stats_path = profile_paths(profile_id)
+    if not os.path.exists(stats_path):
+        return jsonify({'error': 'Profile not found'}), 404
+
+    return send_file(stats_path, mimetype='application/octet-stream', as_attachment=True, download_name=f"{profile_id}.prof")
@@ -1,10 +1,16 @@
-from flask import Blueprint, jsonify, request, send_file
+from flask import Blueprint, current_app, jsonify, request, send_file
 from src.models.user import User, Report, db
+from src.models.sharding import DEFAULT_REGION, activate_region, current_region, sharding_enabled
+from src.models.analytics import analytics_session, fan_out
+from src.models.teams import in_team_scope, scope_to_team, team_supervisor_id
 import jwt
 import os
 from datetime import datetime, date
 from src.routes.email_service import send_report_submission_confirmation
-import pandas as pd
+from src.routes.export_service import EXPORT_FORMATS, find_snapshot, report_rows, render_export
+from src.routes.response_encoding import list_response
+from src.routes.batch import batch_user
+from sqlalchemy.orm import selectinload
 from io import BytesIO
 
 reports_bp = Blueprint('reports', __name__)
@@ -18,7 +24,9 @@ def get_user_from_token(token):
         
         payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
         user_id = payload['user_id']
-        return User.query.get(user_id)
+        user = batch_user(user_id) or User.query.get(user_id)
+        activate_region(user)
+        return user
     except:
         return None
 
@@ -45,7 +53,7 @@ def create_report():
     except ValueError:
         return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
 
-    report = Report(
+    fields = dict(
         itin=itin,
         report_date=report_date,
         percentage_attained=percentage_attained,
@@ -54,8 +62,25 @@ def create_report():
         notes_comments=notes_comments
     )
 
-    db.session.add(report)
-    db.session.commit()
+    writers = current_app.extensions.get('group_commit')
+    writer = writers[current_region()] if writers else None
+    report = None
+    if writer:
+        # Hand our connection back to the pool, then wait until the writer thread has committed our batch
+        db.session.close()
+        try:
+            committed = writer.write(Report, **fields)
+        except TimeoutError:
+            return jsonify({'error': 'Report submission timed out. Please check your reports before submitting again'}), 503
+        if committed is not None:
+            report = db.session.merge(committed, load=False)
+        else:
+            current_app.logger.warning('Group commit writer for %s is not keeping up; committing directly', current_region())
+
+    if report is None:
+        report = Report(**fields)
+        db.session.add(report)
+        db.session.commit()
 
     # Send confirmation email
     try:
@@ -87,8 +112,11 @@ def get_reports():
     # If user is not a supervisor, only show their own reports
     if user.role not in ['Supervisor', 'Commercial Engineer']:
         query = query.filter_by(staff_id=user.id)
-    elif staff_id:
-        query = query.filter_by(staff_id=staff_id)
+    else:
+        # Supervisors who own a team only see their team's readers
+        query = scope_to_team(query, team_supervisor_id(user), Report.staff_id)
+        if staff_id:
+            query = query.filter(Report.staff_id == staff_id)
 
     if start_date:
         try:
@@ -108,7 +136,7 @@ def get_reports():
         query = query.filter_by(status=status)
 
     reports = query.order_by(Report.timestamp.desc()).all()
-    return jsonify([report.to_dict() for report in reports])
+    return list_response([report.to_dict() for report in reports])
 
 @reports_bp.route('/reports/<int:report_id>', methods=['GET'])
 def get_report(report_id):
@@ -123,6 +151,8 @@ def get_report(report_id):
     # Check if user has permission to view this report
     if user.role not in ['Supervisor', 'Commercial Engineer'] and report.staff_id != user.id:
         return jsonify({'error': 'Permission denied'}), 403
+    if not in_team_scope(user, report.staff_id):
+        return jsonify({'error': 'Permission denied'}), 403
 
     return jsonify(report.to_dict())
 
@@ -139,6 +169,8 @@ def update_report(report_id):
     # Check if user has permission to update this report
     if user.role not in ['Supervisor', 'Commercial Engineer'] and report.staff_id != user.id:
         return jsonify({'error': 'Permission denied'}), 403
+    if not in_team_scope(user, report.staff_id):
+        return jsonify({'error': 'Permission denied'}), 403
 
     data = request.json
     
@@ -169,13 +201,30 @@ def download_reports():
     end_date = request.args.get('end_date')
     status = request.args.get('status')
 
-    query = Report.query
+    query = analytics_session().query(Report).options(selectinload(Report.staff))
+    start_date_obj = None
+    end_date_obj = None
 
     # If user is not a supervisor, only show their own reports
+    supervisor_id = team_supervisor_id(user)
     if user.role not in ['Supervisor', 'Commercial Engineer']:
         query = query.filter_by(staff_id=user.id)
+        snapshot_group = user.id
+    elif supervisor_id is not None:
+        # Snapshots are per reader or for everyone, never per team
+        query = scope_to_team(query, supervisor_id, Report.staff_id)
+        if staff_id:
+            query = query.filter(Report.staff_id == staff_id)
+        snapshot_group = None
     elif staff_id:
+        try:
+            staff_id = int(staff_id)
+        except ValueError:
+            return jsonify({'error': 'staff_id must be an integer'}), 400
         query = query.filter_by(staff_id=staff_id)
+        snapshot_group = staff_id
+    else:
+        snapshot_group = 'all'
 
     if start_date:
         try:
@@ -191,49 +240,44 @@ def download_reports():
         except ValueError:
             return jsonify({'error': 'Invalid end_date format. Use YYYY-MM-DD'}), 400
 
+    if format_type != 'excel':
+        format_type = 'csv'
+    extension, mimetype = EXPORT_FORMATS[format_type]
+
+    # Commercial Engineers export across every region's shard
+    cross_region = user.role == 'Commercial Engineer' and sharding_enabled()
+
+    # Serve a precomputed snapshot straight from disk when one matches; snapshots
+    # are only built from the primary database, so other regions always query
+    if not status and not cross_region and snapshot_group is not None and current_region() == DEFAULT_REGION:
+        snapshot = find_snapshot(start_date_obj, end_date_obj, snapshot_group, format_type)
+        if snapshot:
+            path, content_hash = snapshot
+            return send_file(
+                path,
+                mimetype=mimetype,
+                as_attachment=True,
+                download_name=f'reading_reports_{start_date_obj.strftime("%Y%m%d")}_{end_date_obj.strftime("%Y%m%d")}.{extension}',
+                conditional=True,
+                etag=content_hash
+            )
+
     if status:
         query = query.filter_by(status=status)
 
-    reports = query.order_by(Report.timestamp.desc()).all()
-    
-    # Convert to DataFrame
-    data = []
-    for report in reports:
-        data.append({
-            'ID': report.id,
-            'ITIN': report.itin,
-            'Report Date': report.report_date.strftime('%Y-%m-%d') if report.report_date else '',
-            'Percentage Attained': report.percentage_attained,
-            'Reasons Not Attained': report.reasons_not_attained or '',
-            'Staff Number': report.staff.staff_number if report.staff else '',
-            'Timestamp': report.timestamp.strftime('%Y-%m-%d %H:%M:%S') if report.timestamp else '',
-            'Status': report.status,
-            'Notes/Comments': report.notes_comments or ''
-        })
-
-    df = pd.DataFrame(data)
-    
-    if format_type == 'excel':
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Reports')
-        output.seek(0)
-        
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=f'reading_reports_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-        )
+    query = query.order_by(Report.timestamp.desc())
+    if cross_region:
+        shards = fan_out(lambda session, region: report_rows(query.with_session(session).all()))
+        rows = sorted((row for shard in shards for row in shard), key=lambda row: row['Timestamp'], reverse=True)
     else:
-        output = BytesIO()
-        df.to_csv(output, index=False)
-        output.seek(0)
-        
-        return send_file(
-            output,
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=f'reading_reports_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-        )
+        rows = report_rows(query.all())
+
+    output = BytesIO(render_export(rows, format_type))
+
+    return send_file(
+        output,
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=f'reading_reports_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+    )
 
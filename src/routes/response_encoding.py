@@ -0,0 +1,43 @@
+import gzip
+import os
+import zlib
+from flask import jsonify, request
+
+# Responses smaller than this are sent as-is; compressing them costs more than it saves
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', '6'))
+
+def to_columnar(rows):
+    """Turn a list of dicts into one array per column"""
+    columns = {}
+    for key in (rows[0].keys() if rows else []):
+        columns[key] = [row.get(key) for row in rows]
+    return {'count': len(rows), 'columns': columns}
+
+def list_response(rows):
+    """JSON response for a list endpoint.
+
+    Pass ?shape=columnar for the column-oriented shape. The body is gzip or
+    deflate compressed when the client accepts it and it is large enough.
+    """
+    if request.args.get('shape') == 'columnar':
+        response = jsonify(to_columnar(rows))
+    else:
+        response = jsonify(rows)
+    return compress_response(response)
+
+def compress_response(response):
+    response.vary.add('Accept-Encoding')
+
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES or response.headers.get('Content-Encoding'):
+        return response
+
+    accepted = request.accept_encodings
+    if accepted['gzip'] and accepted['gzip'] >= accepted['deflate']:
+        response.set_data(gzip.compress(body, compresslevel=COMPRESS_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+    elif accepted['deflate']:
+        response.set_data(zlib.compress(body, COMPRESS_LEVEL))
+        response.headers['Content-Encoding'] = 'deflate'
+    return response
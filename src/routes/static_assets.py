@@ -0,0 +1,86 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from flask import Response, request
+
+# Only text-like assets are worth precompressing
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml', 'image/x-icon', 'image/vnd.microsoft.icon')
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+def _asset(content, mimetype, immutable):
+    compressed = None
+    if mimetype.startswith(COMPRESSIBLE_TYPES):
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        if len(compressed) >= len(content):
+            compressed = None
+    return {
+        'body': content,
+        'gzip': compressed,
+        'mimetype': mimetype,
+        'etag': hashlib.sha256(content).hexdigest()[:16],
+        'immutable': immutable
+    }
+
+def build_asset_manifest(static_folder):
+    """Read the static folder once and index it by URL path.
+
+    Every non-HTML file is reachable under its own name and under a
+    content-hashed name (favicon.3f2a9c1e04.ico). HTML files are rewritten
+    to point at the hashed names, so only they need revalidating.
+    """
+    manifest = {}
+    if not static_folder or not os.path.isdir(static_folder):
+        return manifest
+
+    paths = []
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            if name.endswith('.gz'):
+                continue
+            paths.append(os.path.relpath(os.path.join(root, name), static_folder).replace(os.sep, '/'))
+
+    hashed_names = {}
+    html_paths = []
+    for rel_path in sorted(paths):
+        if rel_path.endswith('.html'):
+            html_paths.append(rel_path)
+            continue
+
+        with open(os.path.join(static_folder, rel_path), 'rb') as f:
+            content = f.read()
+        mimetype = mimetypes.guess_type(rel_path)[0] or 'application/octet-stream'
+        base, extension = os.path.splitext(rel_path)
+        hashed = f"{base}.{hashlib.sha256(content).hexdigest()[:10]}{extension}"
+        hashed_names[rel_path] = hashed
+
+        manifest[hashed] = _asset(content, mimetype, immutable=True)
+        manifest[rel_path] = dict(manifest[hashed], immutable=False)
+
+    for rel_path in html_paths:
+        with open(os.path.join(static_folder, rel_path), 'r', encoding='utf-8') as f:
+            html = f.read()
+        for original, hashed in hashed_names.items():
+            html = html.replace(f'"/{original}"', f'"/{hashed}"')
+        manifest[rel_path] = _asset(html.encode('utf-8'), 'text/html', immutable=False)
+
+    return manifest
+
+def asset_response(asset):
+    """Serve a manifest entry, gzipped when the client accepts it"""
+    body = asset['body']
+    etag = asset['etag']
+    compressed = asset['gzip'] is not None and request.accept_encodings['gzip']
+    if compressed:
+        body = asset['gzip']
+        etag = f"{etag}-gz"
+
+    response = Response(body, mimetype=asset['mimetype'])
+    if compressed:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if asset['immutable'] else REVALIDATE_CACHE_CONTROL
+    response.set_etag(etag)
+    return response.make_conditional(request)
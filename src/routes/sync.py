@@ -0,0 +1,122 @@
+from flask import Blueprint, jsonify, request
+from src.models.user import User, Report, Anomaly, Escalation, Tombstone
+from src.models.sharding import activate_region
+from src.models.teams import scope_to_team, team_supervisor_id
+from src.routes.batch import batch_user
+import jwt
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from sqlalchemy.orm import Session, selectinload
+
+sync_bp = Blueprint('sync', __name__)
+
+SECRET_KEY = os.environ.get('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
+
+# updated_at is stamped at flush, not commit, so a transaction that flushed
+# before another one but committed after it carries an older stamp than
+# rows the device already has. Every sync re-reads this far behind the cursor.
+SYNC_SAFETY_WINDOW = timedelta(seconds=int(os.environ.get('SYNC_SAFETY_WINDOW_SECONDS', '120')))
+
+def get_user_from_token(token):
+    try:
+        if token.startswith('Bearer '):
+            token = token[7:]
+        
+        payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+        user_id = payload['user_id']
+        user = batch_user(user_id) or User.query.get(user_id)
+        activate_region(user)
+        return user
+    except:
+        return None
+
+@event.listens_for(Session, 'before_flush')
+def _record_tombstones(session, flush_context, instances):
+    """Leave a tombstone behind for every synced row that gets deleted"""
+    for obj in list(session.deleted):
+        if isinstance(obj, Report):
+            session.add(Tombstone(table_name='reports', row_id=obj.id, staff_id=obj.staff_id))
+        elif isinstance(obj, Anomaly):
+            session.add(Tombstone(table_name='anomalies', row_id=obj.id, staff_id=obj.staff_id))
+        elif isinstance(obj, Escalation):
+            staff_id = obj.anomaly.staff_id if obj.anomaly else None
+            session.add(Tombstone(table_name='escalations', row_id=obj.id, staff_id=staff_id))
+
+@sync_bp.route('/sync', methods=['GET'])
+def sync():
+    """Return rows created, changed or deleted since the cursor.
+
+    The cursor is the latest updated_at the device has seen. Rows stamped
+    up to SYNC_SAFETY_WINDOW before the cursor are returned again, so rows
+    from transactions that committed late are not skipped; devices must
+    upsert by id.
+    """
+    token = request.headers.get('Authorization')
+    user = get_user_from_token(token)
+    
+    if not user:
+        return jsonify({'error': 'Invalid or missing token'}), 401
+
+    since = None
+    since_str = request.args.get('since')
+    if since_str:
+        try:
+            since = datetime.fromisoformat(since_str)
+        except ValueError:
+            return jsonify({'error': 'Invalid since cursor. Use the cursor returned by the previous sync'}), 400
+
+    is_supervisor = user.role in ['Supervisor', 'Commercial Engineer']
+
+    reports_query = Report.query.options(selectinload(Report.staff))
+    anomalies_query = Anomaly.query.options(selectinload(Anomaly.staff), selectinload(Anomaly.assigned_to), selectinload(Anomaly.attachments))
+    tombstones_query = Tombstone.query
+
+    # If user is not a supervisor, only sync their own rows
+    if not is_supervisor:
+        reports_query = reports_query.filter(Report.staff_id == user.id)
+        anomalies_query = anomalies_query.filter(Anomaly.staff_id == user.id)
+        tombstones_query = tombstones_query.filter(
+            Tombstone.staff_id == user.id,
+            Tombstone.table_name != 'escalations'
+        )
+    supervisor_id = team_supervisor_id(user)
+    reports_query = scope_to_team(reports_query, supervisor_id, Report.staff_id)
+    anomalies_query = scope_to_team(anomalies_query, supervisor_id, Anomaly.staff_id)
+    tombstones_query = scope_to_team(tombstones_query, supervisor_id, Tombstone.staff_id)
+
+    if since:
+        window_start = since - SYNC_SAFETY_WINDOW
+        reports_query = reports_query.filter(Report.updated_at >= window_start)
+        anomalies_query = anomalies_query.filter(Anomaly.updated_at >= window_start)
+        tombstones_query = tombstones_query.filter(Tombstone.deleted_at >= window_start)
+
+    reports = reports_query.order_by(Report.updated_at).all()
+    anomalies = anomalies_query.order_by(Anomaly.updated_at).all()
+    tombstones = tombstones_query.order_by(Tombstone.deleted_at).all()
+
+    # Only supervisors can view escalations
+    escalations = []
+    if is_supervisor:
+        escalations_query = Escalation.query.options(selectinload(Escalation.escalated_to))
+        if supervisor_id is not None:
+            escalations_query = scope_to_team(escalations_query.join(Anomaly, Escalation.anomaly_id == Anomaly.id), supervisor_id, Anomaly.staff_id)
+        if since:
+            escalations_query = escalations_query.filter(Escalation.updated_at >= window_start)
+        escalations = escalations_query.order_by(Escalation.updated_at).all()
+
+    stamps = [r.updated_at for r in reports] + [a.updated_at for a in anomalies] + \
+        [e.updated_at for e in escalations] + [t.deleted_at for t in tombstones]
+    stamps = [s for s in stamps if s]
+    # Re-read rows are older than the cursor; never move it backwards
+    if since:
+        stamps.append(since)
+    cursor = max(stamps) if stamps else None
+
+    return jsonify({
+        'cursor': cursor.isoformat() if cursor else None,
+        'reports': [report.to_dict() for report in reports],
+        'anomalies': [anomaly.to_dict() for anomaly in anomalies],
+        'escalations': [escalation.to_dict() for escalation in escalations],
+        'deleted': [tombstone.to_dict() for tombstone in tombstones]
+    })
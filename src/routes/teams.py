@@ -0,0 +1,161 @@
+from flask import Blueprint, jsonify, request
+from src.models.user import User, Team, TeamMember, db
+from src.models.sharding import activate_region
+from src.routes.batch import batch_user
+from sqlalchemy.orm import selectinload
+import jwt
+import os
+
+teams_bp = Blueprint('teams', __name__)
+
+SECRET_KEY = os.environ.get('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
+
+def get_user_from_token(token):
+    try:
+        if token.startswith('Bearer '):
+            token = token[7:]
+        
+        payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+        user_id = payload['user_id']
+        user = batch_user(user_id) or User.query.get(user_id)
+        activate_region(user)
+        return user
+    except:
+        return None
+
+def _creates_cycle(team_id, parent_id):
+    """True if making parent_id the parent of team_id would loop the hierarchy"""
+    parents = dict(db.session.query(Team.id, Team.parent_id).all())
+    current = parent_id
+    while current is not None:
+        if current == team_id:
+            return True
+        current = parents.get(current)
+    return False
+
+def _apply_team_fields(team, data):
+    """Copy name, parent, supervisor and members from the request; returns an error message or None"""
+    if 'name' in data:
+        if not data['name']:
+            return 'Team name is required'
+        duplicate = Team.query.filter(Team.name == data['name'], Team.id != team.id).first()
+        if duplicate:
+            return 'A team with this name already exists'
+        team.name = data['name']
+
+    if 'parent_id' in data:
+        parent_id = data['parent_id']
+        if parent_id is not None:
+            if not db.session.get(Team, parent_id):
+                return 'Parent team not found'
+            if team.id is not None and _creates_cycle(team.id, parent_id):
+                return 'A team cannot be nested inside itself'
+        team.parent_id = parent_id
+
+    if 'supervisor_id' in data:
+        supervisor_id = data['supervisor_id']
+        if supervisor_id is not None:
+            supervisor = db.session.get(User, supervisor_id)
+            if not supervisor or supervisor.role != 'Supervisor':
+                return 'supervisor_id must be a Supervisor'
+        team.supervisor_id = supervisor_id
+
+    if 'member_ids' in data:
+        member_ids = set(data['member_ids'] or [])
+        if len(member_ids) != User.query.filter(User.id.in_(member_ids)).count():
+            return 'member_ids contains unknown users'
+        # Moving a user into this team takes them out of their previous one
+        memberships = {member.user_id: member for member in TeamMember.query.filter(TeamMember.user_id.in_(member_ids)).all()}
+        for member in list(team.members):
+            if member.user_id not in member_ids:
+                team.members.remove(member)
+        for user_id in member_ids:
+            member = memberships.get(user_id)
+            if member is None:
+                team.members.append(TeamMember(user_id=user_id))
+            elif member.team is not team:
+                member.team = team
+    return None
+
+@teams_bp.route('/teams', methods=['GET'])
+def get_teams():
+    token = request.headers.get('Authorization')
+    user = get_user_from_token(token)
+    
+    if not user:
+        return jsonify({'error': 'Invalid or missing token'}), 401
+
+    if user.role not in ['Supervisor', 'Commercial Engineer']:
+        return jsonify({'error': 'Permission denied'}), 403
+
+    teams = Team.query.options(selectinload(Team.supervisor), selectinload(Team.members)).order_by(Team.name).all()
+    return jsonify([team.to_dict() for team in teams])
+
+@teams_bp.route('/teams', methods=['POST'])
+def create_team():
+    token = request.headers.get('Authorization')
+    user = get_user_from_token(token)
+    
+    if not user:
+        return jsonify({'error': 'Invalid or missing token'}), 401
+
+    # Only commercial engineers can change the hierarchy supervisors are scoped by
+    if user.role != 'Commercial Engineer':
+        return jsonify({'error': 'Permission denied'}), 403
+
+    data = request.json or {}
+    if not data.get('name'):
+        return jsonify({'error': 'Team name is required'}), 400
+
+    team = Team()
+    error = _apply_team_fields(team, data)
+    if error:
+        db.session.rollback()
+        return jsonify({'error': error}), 400
+
+    db.session.add(team)
+    db.session.commit()
+
+    return jsonify({
+        'message': 'Team created successfully',
+        'team': team.to_dict()
+    }), 201
+
+@teams_bp.route('/teams/<int:team_id>', methods=['PUT'])
+def update_team(team_id):
+    token = request.headers.get('Authorization')
+    user = get_user_from_token(token)
+    
+    if not user:
+        return jsonify({'error': 'Invalid or missing token'}), 401
+
+    if user.role != 'Commercial Engineer':
+        return jsonify({'error': 'Permission denied'}), 403
+
+    team = Team.query.get_or_404(team_id)
+    error = _apply_team_fields(team, request.json or {})
+    if error:
+        db.session.rollback()
+        return jsonify({'error': error}), 400
+
+    db.session.commit()
+    return jsonify(team.to_dict())
+
+@teams_bp.route('/teams/<int:team_id>', methods=['DELETE'])
+def delete_team(team_id):
+    token = request.headers.get('Authorization')
+    user = get_user_from_token(token)
+    
+    if not user:
+        return jsonify({'error': 'Invalid or missing token'}), 401
+
+    if user.role != 'Commercial Engineer':
+        return jsonify({'error': 'Permission denied'}), 403
+
+    team = Team.query.get_or_404(team_id)
+
+    # Sub-teams move up a level instead of losing their place in the hierarchy
+    Team.query.filter_by(parent_id=team.id).update({'parent_id': team.parent_id})
+    db.session.delete(team)
+    db.session.commit()
+    return '', 204
@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+class TokenBucketLimiter:
+    """In-memory token buckets shared by every thread in the process.
+
+    Each key gets `capacity` tokens that refill at `refill_per_second`.
+    An attempt must take one token from every key it is checked against.
+    Buckets are kept in least-recently-used order; beyond max_keys the
+    oldest are dropped, which costs O(1) per attempt however many clients
+    there are. The oldest bucket is the one that has had longest to refill,
+    so dropping it rarely forgives anything.
+    """
+
+    def __init__(self, capacity, refill_per_second, max_keys=10000):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _level(self, key, now):
+        tokens, updated = self._buckets.get(key, (self.capacity, now))
+        return min(self.capacity, tokens + (now - updated) * self.refill_per_second)
+
+    def _wait(self, key, now):
+        """Seconds until key has a token, 0 if it has one now"""
+        level = self._level(key, now)
+        if level >= 1:
+            return 0
+        return (1 - level) / self.refill_per_second if self.refill_per_second else float('inf')
+
+    def _take(self, key, now):
+        self._buckets[key] = (self._level(key, now) - 1, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+    def try_acquire(self, *keys):
+        """Take a token from every key, or return seconds to wait if any bucket is empty"""
+        return try_acquire_all(*((self, key) for key in keys))
+
+    def reset(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._buckets.pop(key, None)
+
+def try_acquire_all(*checks):
+    """Take a token for every (limiter, key) pair, or from none of them.
+
+    Every bucket is checked before any is charged, so an attempt refused by
+    one limiter does not spend the budget of another. Returns 0 on success,
+    else the seconds until every bucket has a token again.
+    """
+    limiters = sorted({id(limiter): limiter for limiter, _ in checks}.values(), key=id)
+    now = time.monotonic()
+    for limiter in limiters:
+        limiter._lock.acquire()
+    try:
+        wait = max((limiter._wait(key, now) for limiter, key in checks), default=0)
+        if wait:
+            return wait
+        for limiter, key in checks:
+            limiter._take(key, now)
+        return 0
+    finally:
+        for limiter in reversed(limiters):
+            limiter._lock.release()
+
+# Budgets for login and forgot-PIN attempts, per staff number and per client IP
+login_limiter_by_staff = TokenBucketLimiter(
+    capacity=int(os.environ.get('LOGIN_STAFF_BURST', '5')),
+    refill_per_second=float(os.environ.get('LOGIN_STAFF_PER_MINUTE', '5')) / 60
+)
+login_limiter_by_ip = TokenBucketLimiter(
+    capacity=int(os.environ.get('LOGIN_IP_BURST', '20')),
+    refill_per_second=float(os.environ.get('LOGIN_IP_PER_MINUTE', '30')) / 60
+)
@@ -0,0 +1,101 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# src.main configures the app at import time, so every database and data
+# directory has to point at a scratch location before it is imported
+DATA_DIR = tempfile.mkdtemp(prefix='meter-reading-tests-')
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(DATA_DIR, 'main.db')}",
+    'REGION_DATABASES': json.dumps({'coast': f"sqlite:///{os.path.join(DATA_DIR, 'coast.db')}"}),
+    'SHARED_CACHE_PATH': os.path.join(DATA_DIR, 'shared_cache.db'),
+    'SNAPSHOT_DIR': os.path.join(DATA_DIR, 'snapshots'),
+    'EXPORT_DIR': os.path.join(DATA_DIR, 'exports'),
+    'ATTACHMENT_DIR': os.path.join(DATA_DIR, 'attachments'),
+    'PROFILE_DIR': os.path.join(DATA_DIR, 'profiles'),
+    'BACKUP_DIR': os.path.join(DATA_DIR, 'backups'),
+    # Every test logs in from the same address
+    'LOGIN_IP_BURST': '100000',
+    'LOGIN_STAFF_BURST': '100000'
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.main import app as flask_app
+from src.models.user import User, db
+from src.models.sharding import DEFAULT_REGION, region_names, region_session
+from src.models.shared_cache import bump_data_version
+
+# Users created by src.main; the PIN is the first four digits of the staff number
+DEFAULT_STAFF_NUMBERS = ['85891', '80909', '86002', '53050', '85915', '84184', '12345', '67890']
+
+@pytest.fixture
+def app():
+    yield flask_app
+    _reset_database()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def login(client):
+    """Authorization headers for a staff number"""
+    tokens = {}
+
+    def headers(staff_number, pin=None):
+        if staff_number not in tokens:
+            response = client.post('/api/login', json={'staff_number': staff_number, 'pin': pin or staff_number[:4]})
+            assert response.status_code == 200, response.json
+            tokens[staff_number] = response.json['token']
+        return {'Authorization': f"Bearer {tokens[staff_number]}"}
+    return headers
+
+@pytest.fixture
+def user_ids(app):
+    with app.app_context():
+        return dict(db.session.query(User.staff_number, User.id).all())
+
+@pytest.fixture
+def create_user(app):
+    """Add a user through the ORM, so the same hooks run as in production"""
+    def create(staff_number, role, region=DEFAULT_REGION):
+        with app.app_context():
+            user = User(staff_number=staff_number, role=role, region=region)
+            user.set_pin(staff_number[:4])
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return create
+
+@pytest.fixture
+def move_to_region(app):
+    def move(staff_numbers, region):
+        with app.app_context():
+            for user in User.query.filter(User.staff_number.in_(staff_numbers)).all():
+                user.region = region
+            db.session.commit()
+    return move
+
+def _reset_database():
+    """Empty every table in every region and restore the default users.
+
+    Core statements bypass the flush hooks, so the cache versions are
+    bumped and the export snapshots removed by hand afterwards.
+    """
+    with flask_app.app_context():
+        for region in region_names():
+            with region_session(region) as session:
+                for table in reversed(db.metadata.sorted_tables):
+                    if table.name != 'user':
+                        session.execute(table.delete())
+                session.commit()
+        users = User.__table__
+        db.session.execute(users.delete().where(users.c.staff_number.notin_(DEFAULT_STAFF_NUMBERS)))
+        db.session.execute(users.update().values(region=DEFAULT_REGION))
+        db.session.commit()
+        bump_data_version(reports=True)
+    shutil.rmtree(os.environ['SNAPSHOT_DIR'], ignore_errors=True)
@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from src.models.user import Anomaly, db
+from src.routes import analytics
+from src.routes.analytics import sla_frame, summarize
+
+NOW = pd.Timestamp('2026-10-19 12:00:00')
+STAFF_NUMBERS = {1: '85891', 2: '80909', 9: '12345'}
+
+def row(id, hours_ago, status='Open', resolved_after=None, updated_after=None, type='Leak', staff_id=1, assigned_to_id=None):
+    """An anomaly_rows tuple for an anomaly raised hours_ago before NOW"""
+    raised = NOW - pd.Timedelta(hours=hours_ago)
+    stamp = lambda hours: (raised + pd.Timedelta(hours=hours)).isoformat(sep=' ') if hours is not None else None
+    return (id, type, staff_id, assigned_to_id, stamp(0), stamp(resolved_after), stamp(updated_after), status)
+
+def test_breaches_compare_resolution_time_or_age_with_the_sla():
+    df = sla_frame([
+        row(1, 100, 'Resolved', resolved_after=10),
+        row(2, 100, 'Closed', resolved_after=80),
+        row(3, 80),
+        row(4, 10),
+    ], STAFF_NUMBERS, 72, NOW)
+
+    assert df['ttr_hours'].tolist()[:2] == [10.0, 80.0]
+    assert df['age_hours'].tolist()[2:] == [80.0, 10.0]
+    assert df['breached'].tolist() == [False, True, True, False]
+    assert df['age_bucket'].astype(str).tolist() == ['nan', 'nan', '3-7d', '<1d']
+
+def test_types_can_have_their_own_sla(monkeypatch):
+    monkeypatch.setitem(analytics.ANOMALY_SLA_HOURS_BY_TYPE, 'Tamper', 24)
+
+    df = sla_frame([row(1, 30, type='Tamper'), row(2, 30)], STAFF_NUMBERS, 72, NOW)
+
+    assert df['sla_hours'].tolist() == [24.0, 72.0]
+    assert df['breached'].tolist() == [True, False]
+
+def test_resolution_time_falls_back_to_the_last_update():
+    df = sla_frame([row(1, 100, 'Resolved', updated_after=20), row(2, 100, 'Resolved', resolved_after=5, updated_after=20)], STAFF_NUMBERS, 72, NOW)
+
+    assert df['ttr_hours'].tolist() == [20.0, 5.0]
+    assert df['estimated'].tolist() == [True, False]
+
+def test_reopened_anomalies_age_instead_of_keeping_their_old_resolution():
+    df = sla_frame([row(1, 100, 'Open', resolved_after=5, updated_after=50)], STAFF_NUMBERS, 72, NOW)
+
+    assert pd.isna(df.at[0, 'ttr_hours'])
+    assert df.at[0, 'age_hours'] == 100.0
+    assert bool(df.at[0, 'breached'])
+    assert not df.at[0, 'estimated']
+
+def test_empty_frame_summarizes_to_nothing():
+    df = sla_frame([], STAFF_NUMBERS, 72, NOW)
+
+    assert len(df) == 0
+    assert summarize(df, 'type') == []
+
+def test_summary_per_reader_leads_with_the_worst_breach_rate():
+    df = sla_frame([
+        row(1, 100, 'Resolved', resolved_after=10, staff_id=1, assigned_to_id=9),
+        row(2, 200, staff_id=1),
+        row(3, 100, 'Resolved', resolved_after=10, staff_id=2),
+        row(4, 5, staff_id=7),
+    ], STAFF_NUMBERS, 72, NOW)
+
+    summary = summarize(df, 'reader')
+
+    assert [(entry['reader'], entry['total'], entry['open'], entry['breach_rate']) for entry in summary] == [
+        ('85891', 2, 1, 0.5), ('80909', 1, 0, 0.0), ('Unknown', 1, 1, 0.0)
+    ]
+    assert summary[0]['aging'] == {'<1d': 0, '1-3d': 0, '3-7d': 0, '7-30d': 1, '>30d': 0}
+    assert summary[0]['median_ttr_hours'] == 10.0
+    assert [entry['assignee'] for entry in summarize(df, 'assignee')][-1] == '12345'
+
+def add_anomaly(client, headers, hours_ago, status=None):
+    anomaly_id = client.post('/api/anomalies', json={'type': 'Leak'}, headers=headers).json['anomaly']['id']
+    raised = datetime.utcnow() - timedelta(hours=hours_ago)
+    values = {'timestamp': raised, 'updated_at': raised}
+    if status:
+        values.update(resolution_status=status, resolved_at=raised + timedelta(hours=1))
+    db.session.execute(Anomaly.__table__.update().where(Anomaly.id == anomaly_id).values(**values))
+    db.session.commit()
+
+def get_sla(client, headers, **params):
+    response = client.get('/api/analytics/anomaly-sla', query_string=params, headers=headers)
+    assert response.status_code == 200, response.json
+    return response.json
+
+def test_sla_endpoint(app, client, login):
+    reader = login('85891')
+    with app.app_context():
+        add_anomaly(client, reader, 200)
+        add_anomaly(client, reader, 10)
+        add_anomaly(client, reader, 50, 'Resolved')
+
+    body = get_sla(client, login('12345'))
+
+    assert (body['total'], body['open'], body['resolved'], body['breached']) == (3, 2, 1, 1)
+    assert body['breach_rate'] == pytest.approx(0.3333)
+    assert body['time_to_resolution']['percentiles_hours']['p50'] == 1.0
+    assert body['open_aging'] == {'<1d': 1, '1-3d': 0, '3-7d': 0, '7-30d': 1, '>30d': 0}
+    assert get_sla(client, login('12345'), sla_hours=300)['breached'] == 0
+
+def test_sla_endpoint_with_no_anomalies(client, login):
+    body = get_sla(client, login('12345'))
+
+    assert (body['total'], body['breached'], body['breach_rate']) == (0, 0, None)
+    assert body['time_to_resolution']['percentiles_hours'] == dict.fromkeys(['p50', 'p75', 'p90', 'p95'])
+    assert body['by_type'] == []
+
+def test_team_supervisors_only_see_their_team(app, client, login, user_ids):
+    client.post('/api/teams', json={'name': 'North', 'supervisor_id': user_ids['12345'], 'member_ids': [user_ids['85891']]}, headers=login('67890'))
+    with app.app_context():
+        add_anomaly(client, login('85891'), 10)
+        add_anomaly(client, login('80909'), 10)
+
+    assert [entry['reader'] for entry in get_sla(client, login('12345'))['by_reader']] == ['85891']
+    assert sorted(entry['reader'] for entry in get_sla(client, login('67890'))['by_reader']) == ['80909', '85891']
+
+def test_sla_endpoint_validates_its_caller_and_parameters(client, login):
+    assert client.get('/api/analytics/anomaly-sla', headers=login('85891')).status_code == 403
+    assert client.get('/api/analytics/anomaly-sla', query_string={'sla_hours': 0}, headers=login('12345')).status_code == 400
+    assert client.get('/api/analytics/anomaly-sla', query_string={'start_date': '01/10/2026'}, headers=login('12345')).status_code == 400
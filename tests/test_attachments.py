@@ -0,0 +1,164 @@
+import hashlib
+import io
+import logging
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from PIL import Image
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.models.user import Anomaly, db
+
+CONTENT = b'0123456789' * 10
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+@pytest.fixture
+def reader(login):
+    return login('85891')
+
+@pytest.fixture
+def anomaly_id(client, reader):
+    return client.post('/api/anomalies', json={'type': 'Leak'}, headers=reader).json['anomaly']['id']
+
+def start(client, headers, anomaly_id, content=CONTENT, checksum=None, content_type='application/octet-stream', filename='leak.bin'):
+    response = client.post(f'/api/anomalies/{anomaly_id}/attachments', json={
+        'filename': filename, 'content_type': content_type, 'size': len(content), 'sha256': checksum or sha256(content)
+    }, headers=headers)
+    assert response.status_code == 201, response.json
+    return response.json['attachment']['id']
+
+def put_chunk(client, headers, attachment_id, offset, chunk, chunk_sha256=None):
+    headers = dict(headers, **({'X-Chunk-SHA256': chunk_sha256} if chunk_sha256 else {}))
+    return client.put(f'/api/attachments/{attachment_id}/chunks', query_string={'offset': offset}, data=chunk, headers=headers)
+
+def upload(client, headers, attachment_id, content=CONTENT, size=40):
+    response = None
+    for offset in range(0, len(content), size):
+        response = put_chunk(client, headers, attachment_id, offset, content[offset:offset + size])
+        assert response.status_code == 200, response.json
+    return response
+
+def test_chunked_upload_completes_and_downloads(client, reader, anomaly_id):
+    attachment_id = start(client, reader, anomaly_id)
+
+    body = upload(client, reader, attachment_id).json
+
+    assert (body['status'], body['received_bytes']) == ('Complete', len(CONTENT))
+    download = client.get(f'/api/attachments/{attachment_id}/download', headers=reader)
+    assert download.data == CONTENT
+    assert download.headers['ETag'].strip('"') == sha256(CONTENT)
+
+def test_offset_must_match_the_bytes_received(client, reader, anomaly_id):
+    attachment_id = start(client, reader, anomaly_id)
+    put_chunk(client, reader, attachment_id, 0, CONTENT[:40])
+
+    for offset in (0, 60):
+        response = put_chunk(client, reader, attachment_id, offset, CONTENT[offset:offset + 40])
+        assert response.status_code == 409
+        assert response.json['received_bytes'] == 40
+
+def test_chunk_checksum_mismatch_is_rejected_without_advancing(client, reader, anomaly_id):
+    attachment_id = start(client, reader, anomaly_id)
+
+    response = put_chunk(client, reader, attachment_id, 0, CONTENT[:40], chunk_sha256=sha256(b'something else'))
+
+    assert response.status_code == 422
+    assert response.json['received_bytes'] == 0
+    assert put_chunk(client, reader, attachment_id, 0, CONTENT[:40], chunk_sha256=sha256(CONTENT[:40])).status_code == 200
+
+def test_file_checksum_mismatch_restarts_the_upload(client, reader, anomaly_id):
+    attachment_id = start(client, reader, anomaly_id, checksum=sha256(b'x' * len(CONTENT)))
+    put_chunk(client, reader, attachment_id, 0, CONTENT[:60])
+
+    response = put_chunk(client, reader, attachment_id, 60, CONTENT[60:])
+
+    assert response.status_code == 422
+    assert (response.json['attachment']['status'], response.json['attachment']['received_bytes']) == ('Uploading', 0)
+    assert put_chunk(client, reader, attachment_id, 0, b'x' * len(CONTENT)).json['status'] == 'Complete'
+
+def test_upload_resumes_from_received_bytes(client, reader, anomaly_id):
+    attachment_id = start(client, reader, anomaly_id)
+    put_chunk(client, reader, attachment_id, 0, CONTENT[:30])
+    put_chunk(client, reader, attachment_id, 30, CONTENT[30:70])
+
+    # A device that lost track after a dropped connection asks where to continue
+    resume_at = client.get(f'/api/attachments/{attachment_id}', headers=reader).json['received_bytes']
+    assert resume_at == 70
+
+    assert put_chunk(client, reader, attachment_id, resume_at, CONTENT[resume_at:]).json['status'] == 'Complete'
+    assert client.get(f'/api/attachments/{attachment_id}/download', headers=reader).data == CONTENT
+
+def test_only_the_uploader_sends_chunks(client, reader, login, anomaly_id):
+    attachment_id = start(client, reader, anomaly_id)
+
+    assert put_chunk(client, login('12345'), attachment_id, 0, CONTENT[:40]).status_code == 403
+    assert client.post(f'/api/anomalies/{anomaly_id}/attachments', json={}, headers=login('80909')).status_code == 403
+
+def test_completed_attachment_reaches_the_next_sync(app, client, reader, anomaly_id):
+    attachment_id = start(client, reader, anomaly_id)
+    with app.app_context():
+        db.session.execute(Anomaly.__table__.update().values(updated_at=datetime.utcnow() - timedelta(days=1)))
+        db.session.commit()
+    # A cursor well past the anomaly's stamp and its safety window
+    since = (datetime.utcnow() - timedelta(hours=1)).isoformat()
+    assert client.get('/api/sync', query_string={'since': since}, headers=reader).json['anomalies'] == []
+
+    upload(client, reader, attachment_id)
+
+    anomalies = client.get('/api/sync', query_string={'since': since}, headers=reader).json['anomalies']
+    assert [attachment['status'] for anomaly in anomalies for attachment in anomaly['attachments']] == ['Complete']
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+def test_images_get_a_thumbnail(client, reader, anomaly_id):
+    buffer = io.BytesIO()
+    Image.new('RGB', (600, 400), 'red').save(buffer, 'PNG')
+    image = buffer.getvalue()
+    attachment_id = start(client, reader, anomaly_id, content=image, content_type='image/png', filename='leak.png')
+    put_chunk(client, reader, attachment_id, 0, image)
+
+    assert wait_for(lambda: client.get(f'/api/attachments/{attachment_id}', headers=reader).json['has_thumbnail'])
+    thumbnail = Image.open(io.BytesIO(client.get(f'/api/attachments/{attachment_id}/thumbnail', headers=reader).data))
+    assert thumbnail.size == (256, 171)
+
+def test_thumbnail_failures_are_logged(client, reader, anomaly_id, caplog):
+    attachment_id = start(client, reader, anomaly_id, content_type='image/png', filename='leak.png')
+
+    with caplog.at_level(logging.ERROR):
+        upload(client, reader, attachment_id)
+        assert wait_for(lambda: any('Failed to generate thumbnail' in record.getMessage() for record in caplog.records))
+    assert client.get(f'/api/attachments/{attachment_id}/thumbnail', headers=reader).status_code == 404
+
+def test_anomaly_lists_load_attachments_in_one_query(client, reader, login):
+    def statements_for(path, headers):
+        statements = []
+        listener = lambda connection, cursor, statement, *args: statements.append(statement)
+        event.listen(Engine, 'before_cursor_execute', listener)
+        try:
+            assert client.get(path, headers=headers).status_code == 200
+        finally:
+            event.remove(Engine, 'before_cursor_execute', listener)
+        return len(statements)
+
+    def add_anomaly():
+        anomaly_id = client.post('/api/anomalies', json={'type': 'Leak'}, headers=reader).json['anomaly']['id']
+        start(client, reader, anomaly_id)
+
+    supervisor = login('12345')
+    add_anomaly()
+    few = {path: statements_for(path, headers) for path, headers in (('/api/anomalies', supervisor), ('/api/sync', reader), ('/api/dashboard/reader', reader))}
+    for _ in range(4):
+        add_anomaly()
+    many = {path: statements_for(path, headers) for path, headers in (('/api/anomalies', supervisor), ('/api/sync', reader), ('/api/dashboard/reader', reader))}
+
+    assert many == few
@@ -0,0 +1,127 @@
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from src.models import backup
+from src.models.backup import copy_database, create_snapshot, list_snapshots, prune_snapshots, run_backups, verify_snapshot
+
+@pytest.fixture
+def source(tmp_path):
+    path = str(tmp_path / 'source.db')
+    connection = sqlite3.connect(path)
+    connection.execute('PRAGMA journal_mode = WAL')
+    connection.execute('CREATE TABLE report (id INTEGER PRIMARY KEY, itin TEXT, reasons TEXT)')
+    connection.executemany('INSERT INTO report (itin, reasons) VALUES (?, ?)', [(f'I{i}', 'x' * 200) for i in range(500)])
+    connection.commit()
+    connection.close()
+    return path
+
+def touch(directory, *names):
+    for name in names:
+        (directory / name).write_bytes(b'')
+
+def test_copy_is_a_single_file_with_every_row(source, tmp_path):
+    target = str(tmp_path / 'copy.db')
+
+    stats = copy_database(source, target, pages=4, sleep=0)
+
+    connection = sqlite3.connect(target)
+    assert connection.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+    assert connection.execute('SELECT COUNT(*) FROM report').fetchone()[0] == 500
+    connection.close()
+    assert stats['steps'] > 1 and stats['restarts'] == 0 and not stats['single_step']
+
+def test_snapshot_writes_a_manifest_and_no_partial_file(source, tmp_path):
+    directory = tmp_path / 'backups'
+
+    snapshot, manifest = create_snapshot('east', source, str(directory))
+
+    name = os.path.basename(snapshot)
+    assert sorted(os.listdir(directory)) == [name, name[:-len('.db')] + '.json']
+    assert manifest['row_counts'] == {'report': 500}
+    with open(snapshot[:-len('.db')] + '.json') as handle:
+        assert json.load(handle)['sha256'] == manifest['sha256']
+    assert verify_snapshot(snapshot) == []
+
+def test_snapshot_never_overwrites_an_existing_one(source, tmp_path, monkeypatch):
+    class FrozenDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return datetime(2026, 10, 1, 2, 0, 0, 123456)
+    monkeypatch.setattr(backup, 'datetime', FrozenDatetime)
+    directory = str(tmp_path / 'backups')
+    create_snapshot('east', source, directory)
+
+    with pytest.raises(FileExistsError):
+        create_snapshot('east', source, directory)
+    assert sorted(os.listdir(directory)) == ['east-20261001-020000-123456.db', 'east-20261001-020000-123456.json']
+
+def test_verify_reports_a_changed_snapshot(source, tmp_path):
+    snapshot, _ = create_snapshot('east', source, str(tmp_path))
+    with open(snapshot, 'ab') as handle:
+        handle.write(b'junk')
+
+    assert verify_snapshot(snapshot) == ['checksum does not match the manifest']
+
+def test_listing_only_matches_the_regions_own_names(tmp_path):
+    touch(tmp_path, 'east-20261001-020000-000001.db', 'east-2-20261001-020000-000001.db', 'east-20261001-020000-000001.json',
+          'east-20261001-020000-000001.db.partial', 'eastern-20261001-020000.db')
+
+    assert [os.path.basename(path) for path in list_snapshots('east', str(tmp_path))] == ['east-20261001-020000-000001.db']
+    assert [os.path.basename(path) for path in list_snapshots('east-2', str(tmp_path))] == ['east-2-20261001-020000-000001.db']
+
+def test_listing_orders_legacy_names_by_time(tmp_path):
+    touch(tmp_path, 'east-20261002-010000-000005.db', 'east-20261002-010000.db', 'east-20261001-230000-999999.db')
+
+    assert [os.path.basename(path) for path in list_snapshots('east', str(tmp_path))] == [
+        'east-20261001-230000-999999.db', 'east-20261002-010000.db', 'east-20261002-010000-000005.db'
+    ]
+
+def test_prune_keeps_the_newest_and_leaves_other_regions_alone(tmp_path):
+    touch(tmp_path, *(f'east-2026100{day}-010000-000000.db' for day in range(1, 5)), 'east-20261001-010000-000000.json',
+          'east-2-20261001-010000-000000.db')
+
+    expired = prune_snapshots('east', 2, str(tmp_path))
+
+    assert [os.path.basename(path) for path in expired] == ['east-20261001-010000-000000.db', 'east-20261002-010000-000000.db']
+    assert sorted(os.listdir(tmp_path)) == ['east-2-20261001-010000-000000.db', 'east-20261003-010000-000000.db', 'east-20261004-010000-000000.db']
+
+def test_run_reports_an_unwritable_directory_instead_of_raising(app, tmp_path, capsys):
+    not_a_directory = tmp_path / 'backups'
+    not_a_directory.write_text('')
+
+    with app.app_context():
+        assert run_backups(('default',), str(not_a_directory), keep=2, pages=64, sleep=0, verify=True) is False
+
+    assert '[default] backup failed:' in capsys.readouterr().out
+
+def test_run_snapshots_verifies_and_prunes(app, tmp_path, capsys):
+    directory = str(tmp_path)
+    with app.app_context():
+        for _ in range(3):
+            assert run_backups(('default',), directory, keep=2, pages=64, sleep=0, verify=True)
+
+    assert len(list_snapshots('default', directory)) == 2
+    output = capsys.readouterr().out
+    assert output.count('[default] verified') == 3
+    assert output.count('[default] removed') == 1
+
+def test_run_quarantines_a_snapshot_that_fails_verification(app, tmp_path, capsys, monkeypatch):
+    directory = str(tmp_path)
+    with app.app_context():
+        assert run_backups(('default',), directory, keep=1, pages=64, sleep=0, verify=True)
+        good = list_snapshots('default', directory)
+        monkeypatch.setattr(backup, 'verify_snapshot', lambda snapshot: ['quick_check: page 3 is never used'])
+
+        assert run_backups(('default',), directory, keep=1, pages=64, sleep=0, verify=True) is False
+
+    # The good snapshot is still the only one listed, and the bad one is kept aside
+    assert list_snapshots('default', directory) == good
+    quarantined = sorted(name for name in os.listdir(directory) if name.endswith('.failed'))
+    assert [name.rsplit('.', 2)[1:] for name in quarantined] == [['db', 'failed'], ['json', 'failed']]
+    assert f'[default] quarantined as {quarantined[0]}' in capsys.readouterr().out
+    assert prune_snapshots('default', 0, directory) == good
+    assert sorted(name for name in os.listdir(directory)) == quarantined
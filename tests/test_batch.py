@@ -0,0 +1,82 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.routes.batch import dependency_waves, validate_batch
+
+def items(*specs):
+    """Batch items from (id, depends_on) pairs"""
+    return [{'id': item_id, 'path': f'/api/{item_id}', 'depends_on': list(depends_on)} for item_id, depends_on in specs]
+
+def wave_ids(waves):
+    return [[item['id'] for item in wave] for wave in waves]
+
+def test_independent_requests_share_one_wave():
+    assert wave_ids(dependency_waves(items(('a', []), ('b', []), ('c', [])))) == [['a', 'b', 'c']]
+
+def test_dependencies_run_in_later_waves():
+    batch = items(('user', []), ('reports', ['user']), ('anomalies', ['user']), ('summary', ['reports', 'anomalies']))
+
+    assert wave_ids(dependency_waves(batch)) == [['user'], ['reports', 'anomalies'], ['summary']]
+
+def test_dependency_listed_after_its_dependent():
+    assert wave_ids(dependency_waves(items(('b', ['a']), ('a', [])))) == [['a'], ['b']]
+
+def test_cycles_are_detected():
+    assert dependency_waves(items(('a', ['b']), ('b', ['a']))) is None
+    assert dependency_waves(items(('a', []), ('b', ['c']), ('c', ['b']))) is None
+
+def test_validate_fills_in_ids_and_dependencies():
+    batch = [{'path': '/api/reports'}, {'path': '/api/anomalies'}]
+
+    assert validate_batch(batch) is None
+    assert [(item['id'], item['depends_on']) for item in batch] == [('0', []), ('1', [])]
+
+def test_validate_rejects_malformed_batches():
+    assert validate_batch([]) is not None
+    assert validate_batch({'path': '/api/reports'}) is not None
+    assert validate_batch([{'id': 'x'}]) is not None
+    assert validate_batch([{'id': 'x', 'path': '/api/reports'}, {'id': 'x', 'path': '/api/anomalies'}]) is not None
+    assert validate_batch([{'path': '/api/reports', 'method': 'POST'}]) is not None
+    assert validate_batch([{'path': '/static/app.js'}]) is not None
+    assert validate_batch([{'path': '/api/reports', 'depends_on': ['missing']}]) is not None
+    assert validate_batch([{'path': '/api/reports'}] * 11) is not None
+
+def test_batch_cannot_reach_itself_or_the_throttled_auth_endpoints():
+    for path in ('/api/batch', '/api/batch/', '/api/login', '/api/forgot_pin', '/api/verify_token'):
+        assert validate_batch([{'path': path}]) is not None, path
+
+def test_batch_runs_sub_requests_and_returns_the_user(client, login):
+    client.post('/api/reports', json={'itin': 'A1', 'report_date': '2026-10-01', 'percentage_attained': 80}, headers=login('85891'))
+
+    response = client.post('/api/batch', json={'requests': [
+        {'id': 'reports', 'path': '/api/reports'},
+        {'id': 'dashboard', 'path': '/api/dashboard/reader', 'depends_on': ['reports']},
+        {'id': 'missing', 'path': '/api/reports/999'}
+    ]}, headers=login('85891'))
+
+    body = response.json
+    assert response.status_code == 200
+    assert body['user']['staff_number'] == '85891'
+    assert [(result['id'], result['status']) for result in body['responses']] == [('reports', 200), ('dashboard', 200), ('missing', 404)]
+    assert [report['itin'] for report in body['responses'][0]['body']] == ['A1']
+
+def test_batch_loads_the_caller_once(app, client, login):
+    headers = login('12345')
+    lookups = []
+
+    def count_user_lookups(connection, cursor, statement, parameters, context, executemany):
+        if statement.startswith('SELECT') and 'FROM user' in statement and 'WHERE user.id = ?' in statement:
+            lookups.append(statement)
+
+    event.listen(Engine, 'before_cursor_execute', count_user_lookups)
+    try:
+        response = client.post('/api/batch', json={'requests': [{'path': '/api/reports'}, {'path': '/api/anomalies'}, {'path': '/api/itins/latest'}]}, headers=headers)
+    finally:
+        event.remove(Engine, 'before_cursor_execute', count_user_lookups)
+
+    assert [result['status'] for result in response.json['responses']] == [200, 200, 200]
+    assert len(lookups) == 1
+
+def test_batch_requires_a_valid_token(client):
+    assert client.post('/api/batch', json={'requests': [{'path': '/api/reports'}]}).status_code == 401
+    assert client.post('/api/batch', json={'requests': [{'path': '/api/reports'}]}, headers={'Authorization': 'Bearer nope'}).status_code == 401
@@ -0,0 +1,105 @@
+from datetime import date
+
+import pytest
+
+from src.models.counters import COUNTER_FIELDS, compute_counters
+from src.models.user import Report, UserCounter, db
+
+TODAY = date.today().isoformat()
+
+@pytest.fixture
+def counters(app, user_ids):
+    """(stored, recounted) counters for a staff number, read outside any request"""
+    def read(staff_number):
+        user_id = user_ids[staff_number]
+        with app.app_context():
+            row = db.session.get(UserCounter, user_id)
+            stored = row.to_dict() if row else None
+            recounted = compute_counters(db.session.connection(bind_arguments={'mapper': UserCounter}), [user_id])[user_id]
+        return stored, recounted
+    return read
+
+def assert_in_step(counters, staff_number, **expected):
+    stored, recounted = counters(staff_number)
+    assert stored == recounted
+    for field, value in expected.items():
+        assert stored[field] == value, field
+
+def submit(client, headers, report_date=TODAY):
+    response = client.post('/api/reports', json={'itin': 'A1', 'report_date': report_date, 'percentage_attained': 80}, headers=headers)
+    assert response.status_code == 201, response.json
+    return response.json['report']['id']
+
+def test_creating_reports(client, login, counters):
+    reader = login('85891')
+    submit(client, reader)
+    submit(client, reader)
+    # Older reports are pending but not part of this month
+    submit(client, reader, '2020-01-15')
+
+    assert_in_step(counters, '85891', pending_reports=3, reports_this_month=2)
+
+def test_changing_a_reports_status(client, login, counters):
+    report_id = submit(client, login('85891'))
+
+    response = client.put(f'/api/reports/{report_id}', json={'status': 'Reviewed'}, headers=login('12345'))
+    assert response.status_code == 200, response.json
+
+    assert_in_step(counters, '85891', pending_reports=0, reports_this_month=1)
+
+def test_anomaly_lifecycle(client, login, counters, user_ids):
+    reader = login('85891')
+    supervisor = login('12345')
+    anomaly_id = client.post('/api/anomalies', json={'type': 'Leak'}, headers=reader).json['anomaly']['id']
+    client.post('/api/anomalies', json={'type': 'Leak'}, headers=reader)
+    assert_in_step(counters, '85891', open_anomalies=2, escalated_anomalies=0)
+
+    response = client.post('/api/escalate', json={'anomaly_id': anomaly_id, 'escalated_to_id': user_ids['67890']}, headers=supervisor)
+    assert response.status_code == 201, response.json
+    assert_in_step(counters, '85891', open_anomalies=2, escalated_anomalies=1)
+
+    client.put(f'/api/anomalies/{anomaly_id}', json={'resolution_status': 'Resolved'}, headers=supervisor)
+    assert_in_step(counters, '85891', open_anomalies=1, escalated_anomalies=1)
+
+def test_rolled_back_changes_do_not_count(app, client, login, counters, user_ids):
+    submit(client, login('85891'))
+    before, _ = counters('85891')
+
+    with app.app_context():
+        db.session.add(Report(itin='A2', report_date=date.today(), percentage_attained=50, staff_id=user_ids['85891']))
+        db.session.flush()
+        assert db.session.get(UserCounter, user_ids['85891']).pending_reports == before['pending_reports'] + 1
+        db.session.rollback()
+
+    assert_in_step(counters, '85891', pending_reports=before['pending_reports'])
+
+def test_check_repairs_drifted_counters(app, client, login, counters, user_ids):
+    submit(client, login('85891'))
+    runner = app.test_cli_runner()
+    # Users who never wrote anything have no row yet; give everyone one
+    runner.invoke(args=['counters', 'check', '--repair'])
+    with app.app_context():
+        table = UserCounter.__table__
+        db.session.execute(table.update().where(table.c.user_id == user_ids['85891']).values(pending_reports=99, open_anomalies=7))
+        db.session.commit()
+
+    check = runner.invoke(args=['counters', 'check'])
+    assert f"user {user_ids['85891']}: stored" in check.output
+    assert '1 of 8 counters drifted' in check.output
+    assert counters('85891')[0]['pending_reports'] == 99
+
+    repair = runner.invoke(args=['counters', 'check', '--repair'])
+    assert 'Repaired 1 counters' in repair.output
+    assert_in_step(counters, '85891', pending_reports=1, open_anomalies=0)
+    assert '0 of 8 counters drifted' in runner.invoke(args=['counters', 'check']).output
+
+def test_check_creates_missing_rows(app, counters, user_ids):
+    with app.app_context():
+        db.session.execute(UserCounter.__table__.delete())
+        db.session.commit()
+
+    output = app.test_cli_runner().invoke(args=['counters', 'check', '--repair']).output
+
+    assert f"user {user_ids['85891']}: no counter row for this month" in output
+    stored, recounted = counters('85891')
+    assert stored == recounted == dict.fromkeys(COUNTER_FIELDS, 0)
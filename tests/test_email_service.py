@@ -0,0 +1,51 @@
+import pytest
+
+from src.routes import anomalies, email_service
+
+@pytest.fixture
+def digests(monkeypatch):
+    """(recipient staff number, anomaly ids) per digest sent; staff numbers in `failing` fail to send"""
+    # Mail is down when the anomalies are escalated, so each escalation is left to the digest
+    monkeypatch.setattr(anomalies, 'send_escalation_notification', lambda anomaly, user: False)
+    sent = []
+    failing = set()
+
+    def send(recipient, anomalies):
+        if recipient.staff_number in failing:
+            return False
+        sent.append((recipient.staff_number, sorted(anomaly.id for anomaly in anomalies)))
+        return True
+    monkeypatch.setattr(email_service, 'send_escalation_digest', send)
+    return sent, failing
+
+def escalate(client, headers, anomaly_id, to_id):
+    response = client.post('/api/escalate', json={'anomaly_id': anomaly_id, 'escalated_to_id': to_id}, headers=headers)
+    assert response.status_code == 201, response.json
+
+def notify(client, headers):
+    response = client.post('/api/escalation_notifications', headers=headers)
+    assert response.status_code == 200, response.json
+    return response.json['notifications_sent'], response.json['anomalies_notified']
+
+def test_one_digest_per_recipient_and_only_successful_sends_are_marked(client, login, user_ids, digests):
+    sent, failing = digests
+    reader, supervisor = login('85891'), login('12345')
+    first, second, third = (client.post('/api/anomalies', json={'type': 'Leak'}, headers=reader).json['anomaly']['id'] for _ in range(3))
+    # Only the latest escalation of an anomaly is notified
+    escalate(client, supervisor, first, user_ids['85915'])
+    escalate(client, supervisor, first, user_ids['67890'])
+    escalate(client, supervisor, second, user_ids['67890'])
+    escalate(client, supervisor, third, user_ids['85915'])
+    failing.add('85915')
+
+    assert notify(client, supervisor) == (1, 2)
+    assert sent == [('67890', [first, second])]
+
+    # The failed digest is tried again; the delivered one is not resent
+    failing.clear()
+    assert notify(client, supervisor) == (1, 1)
+    assert sent[1:] == [('85915', [third])]
+    assert notify(client, supervisor) == (0, 0)
+
+def test_notifications_are_for_supervisors_and_engineers(client, login):
+    assert client.post('/api/escalation_notifications', headers=login('85891')).status_code == 403
@@ -0,0 +1,212 @@
+import csv
+import io
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from openpyxl import load_workbook
+
+from src.models.sharding import DEFAULT_REGION, region_session
+from src.models.user import ExportJob, Report, db
+from src.routes import export_service
+from src.routes.export_service import (
+    EXPORT_RETENTION_HOURS, _unique_sheet_title, build_snapshots, expire_export_files, find_snapshot, recover_export_jobs, snapshot_periods
+)
+
+TODAY = date.today()
+
+def submit(client, headers, itin, percentage=80, report_date=TODAY):
+    response = client.post('/api/reports', json={'itin': itin, 'report_date': report_date.isoformat(), 'percentage_attained': percentage}, headers=headers)
+    assert response.status_code == 201, response.json
+    return response.json['report']['id']
+
+def sheet_rows(workbook, title):
+    return [list(row) for row in workbook[title].iter_rows(values_only=True)]
+
+def download_pack(client, headers, start=TODAY, end=TODAY):
+    response = client.get('/api/reports/pack', query_string={'start_date': start.isoformat(), 'end_date': end.isoformat()}, headers=headers)
+    assert response.status_code == 200, response.json
+    return load_workbook(io.BytesIO(response.data))
+
+def download_this_month(client, headers):
+    start, end = snapshot_periods()['this_month']
+    return client.get('/api/reports/download', query_string={'format': 'csv', 'start_date': start.isoformat(), 'end_date': end.isoformat()},
+                      headers=headers)
+
+def csv_itins(content):
+    return sorted(row['ITIN'] for row in csv.DictReader(io.StringIO(content.decode())))
+
+def test_committed_reports_retire_the_snapshot_they_change(app, client, login):
+    submit(client, login('85891'), 'A1')
+    with app.app_context():
+        build_snapshots()
+    supervisor = login('12345')
+    served = download_this_month(client, supervisor)
+    assert served.headers.get('ETag')
+
+    submit(client, login('80909'), 'B1')
+
+    fresh = download_this_month(client, supervisor)
+    assert not fresh.headers.get('ETag')
+    assert csv_itins(fresh.data) == ['A1', 'B1']
+
+def test_build_racing_a_commit_never_publishes_the_stale_snapshot(app, client, login, user_ids, monkeypatch):
+    submit(client, login('85891'), 'A1')
+    render_export = export_service.render_export
+    commits = []
+
+    def render_while_a_report_commits(rows, format_type):
+        # A reader submits while the first attempt is rendering its files
+        if not commits:
+            with region_session(DEFAULT_REGION) as session:
+                session.add(Report(itin='B1', report_date=TODAY, percentage_attained=60, staff_id=user_ids['80909']))
+                session.commit()
+            commits.append(1)
+        return render_export(rows, format_type)
+    monkeypatch.setattr(export_service, 'render_export', render_while_a_report_commits)
+
+    with app.app_context():
+        build_snapshots()
+        start, end = snapshot_periods()['this_month']
+        path, _ = find_snapshot(start, end, 'all', 'csv')
+
+    with open(path, 'rb') as f:
+        assert csv_itins(f.read()) == ['A1', 'B1']
+
+def test_build_that_keeps_losing_the_race_publishes_nothing(app, client, login, monkeypatch):
+    submit(client, login('85891'), 'A1')
+    render_export = export_service.render_export
+
+    def render_and_invalidate(rows, format_type):
+        export_service.invalidate_snapshots({TODAY})
+        return render_export(rows, format_type)
+    monkeypatch.setattr(export_service, 'render_export', render_and_invalidate)
+
+    with app.app_context():
+        assert build_snapshots() == []
+        start, end = snapshot_periods()['this_month']
+        assert find_snapshot(start, end, 'all', 'csv') is None
+
+def test_duplicate_sheet_titles_are_numbered_from_the_base():
+    used = set()
+    titles = [_unique_sheet_title('Reader ' + 'x' * 40, used) for _ in range(3)]
+
+    assert titles == ['Reader ' + 'x' * 24, 'Reader ' + 'x' * 22 + '_2', 'Reader ' + 'x' * 22 + '_3']
+    assert all(len(title) <= 31 for title in titles)
+
+def test_pack_has_a_summary_a_sheet_per_reader_and_the_anomalies(client, login, user_ids):
+    reader, other = login('85891'), login('80909')
+    submit(client, reader, 'A1', 60)
+    submit(client, reader, 'A2', 90)
+    submit(client, other, 'B1', 50)
+    anomaly_id = client.post('/api/anomalies', json={'type': 'Leak'}, headers=reader).json['anomaly']['id']
+    client.post('/api/escalate', json={'anomaly_id': anomaly_id, 'escalated_to_id': user_ids['67890']}, headers=login('12345'))
+
+    workbook = download_pack(client, login('12345'))
+
+    assert workbook.sheetnames == ['Summary', 'Reader 80909', 'Reader 85891', 'Anomalies', 'Escalations']
+    assert sheet_rows(workbook, 'Summary')[1:] == [['80909', 1, 50, 1, 0, 0], ['85891', 2, 75, 2, 1, 1]]
+    assert [row[1] for row in sheet_rows(workbook, 'Reader 85891')[1:]] == ['A1', 'A2']
+    assert [(row[2], row[5], row[8]) for row in sheet_rows(workbook, 'Anomalies')[1:]] == [('Leak', 'Yes', '85891')]
+    assert [(row[1], row[3]) for row in sheet_rows(workbook, 'Escalations')[1:]] == [(anomaly_id, '67890')]
+
+def test_pack_only_covers_the_requested_dates(client, login):
+    submit(client, login('85891'), 'OLD', report_date=date(2020, 1, 15))
+    submit(client, login('85891'), 'NEW')
+
+    workbook = download_pack(client, login('12345'))
+
+    assert [row[1] for row in sheet_rows(workbook, 'Reader 85891')[1:]] == ['NEW']
+
+def test_pack_is_for_supervisors_and_engineers(client, login):
+    assert client.get('/api/reports/pack', headers=login('85891')).status_code == 403
+    assert client.get('/api/reports/pack', query_string={'start_date': '01/10/2026'}, headers=login('12345')).status_code == 400
+
+def start_export(client, headers, **filters):
+    response = client.post('/api/exports', json=dict({'format': 'csv'}, **filters), headers=headers)
+    assert response.status_code == 202, response.json
+    return response.json['job']['id']
+
+def finished_export(client, headers, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = client.get(f'/api/exports/{job_id}', headers=headers)
+        if response.status_code != 202:
+            return response
+        time.sleep(0.05)
+    raise AssertionError(f'export {job_id} did not finish')
+
+def export_itins(response):
+    assert response.status_code == 200, response.json
+    return [row['ITIN'] for row in csv.DictReader(io.StringIO(response.data.decode()))]
+
+def test_export_job_only_holds_the_readers_own_reports(client, login):
+    reader = login('85891')
+    submit(client, reader, 'MINE')
+    submit(client, login('80909'), 'THEIRS')
+
+    assert export_itins(finished_export(client, reader, start_export(client, reader))) == ['MINE']
+
+def test_export_jobs_of_commercial_engineers_span_every_region(client, login, move_to_region):
+    move_to_region(['85891'], 'coast')
+    submit(client, login('80909'), 'MAIN')
+    submit(client, login('85891'), 'COAST')
+    engineer = login('67890')
+
+    job_id = start_export(client, engineer)
+
+    assert sorted(export_itins(finished_export(client, engineer, job_id))) == ['COAST', 'MAIN']
+
+def test_full_export_queue_refuses_new_jobs(client, login, monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    slots.acquire()
+    monkeypatch.setattr(export_service, '_export_slots', slots)
+
+    response = client.post('/api/exports', json={'format': 'csv'}, headers=login('85891'))
+
+    assert response.status_code == 503
+    slots.release()
+    assert client.post('/api/exports', json={'format': 'csv'}, headers=login('85891')).status_code == 202
+
+def test_only_the_requester_downloads_an_export(client, login):
+    reader = login('85891')
+    job_id = start_export(client, reader)
+    finished_export(client, reader, job_id)
+
+    assert client.get(f'/api/exports/{job_id}', headers=login('80909')).status_code == 403
+    assert client.get(f'/api/exports/{job_id}', headers=login('12345')).status_code == 403
+
+def test_expired_export_files_are_gone(app, client, login):
+    reader = login('85891')
+    job_id = start_export(client, reader)
+    assert finished_export(client, reader, job_id).status_code == 200
+    with app.app_context():
+        path = db.session.get(ExportJob, job_id).file_path
+        assert expire_export_files() == 0
+
+        assert expire_export_files(datetime.utcnow() + timedelta(hours=EXPORT_RETENTION_HOURS + 1)) == 1
+
+    assert not os.path.exists(path)
+    assert client.get(f'/api/exports/{job_id}', headers=reader).status_code == 410
+
+def test_jobs_of_dead_workers_are_failed(app, user_ids):
+    finished = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+    host = socket.gethostname()
+    workers = {
+        'dead': f'{host}:{finished.stdout.strip()}',
+        'alive': f'{host}:{os.getppid()}',
+        'elsewhere': 'another-host:1',
+    }
+    with app.app_context():
+        jobs = {name: ExportJob(user_id=user_ids['85891'], status='Running', worker=worker) for name, worker in workers.items()}
+        db.session.add_all(jobs.values())
+        db.session.commit()
+
+        assert recover_export_jobs() == 1
+
+        assert {name: job.status for name, job in jobs.items()} == {'dead': 'Failed', 'alive': 'Running', 'elsewhere': 'Running'}
+        assert 'restart' in jobs['dead'].error
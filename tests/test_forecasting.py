@@ -0,0 +1,108 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from src.routes.forecasting import design_matrix, project_month_end
+
+# Six weeks of history, Monday 7 September to Sunday 18 October 2026
+START = date(2026, 9, 7)
+HISTORY_DAYS = 42
+MONTH_OFFSET = (date(2026, 10, 1) - START).days
+FUTURE_DAYS = 13
+
+def history(*rows):
+    return np.array(rows, dtype=np.float64)
+
+def test_design_matrix_day_of_week_and_trend():
+    X, day_of_week = design_matrix(START, 8, 7)
+
+    assert day_of_week.tolist() == [0, 1, 2, 3, 4, 5, 6, 0]
+    assert X[:, 0].tolist() == [1.0] * 8
+    assert X[7, 1] == 0.0 and X[0, 1] == -1.0
+    # Sundays are the baseline and have no day-of-week column
+    assert X[6, 2:].tolist() == [0.0] * 6
+    assert X[0, 2:].tolist() == [1.0, 0, 0, 0, 0, 0]
+
+def test_steady_series_projects_its_level_with_no_band():
+    result = project_month_end(history([80.0] * HISTORY_DAYS), START, MONTH_OFFSET, FUTURE_DAYS, target=95)
+
+    assert result['projected'][0] == pytest.approx(80.0)
+    assert result['error'][0] == pytest.approx(0.0, abs=1e-6)
+    assert result['trend_per_week'][0] == pytest.approx(0.0, abs=1e-6)
+    assert result['month_reports'][0] == 18
+    assert result['expected_reports_remaining'][0] == pytest.approx(13.0)
+    assert result['miss_probability'][0] == 1.0
+
+def test_days_a_reader_never_works_are_not_projected():
+    _, day_of_week = design_matrix(START, HISTORY_DAYS, 0)
+    row = np.where(day_of_week == 6, np.nan, 80.0)
+
+    result = project_month_end(row[None, :], START, MONTH_OFFSET, FUTURE_DAYS)
+
+    # 19 to 31 October holds one Sunday
+    assert result['expected_reports_remaining'][0] == pytest.approx(12.0)
+    assert result['history_reports'][0] == 36
+
+def test_a_rising_series_projects_above_its_month_to_date():
+    result = project_month_end(history(50 + 0.5 * np.arange(HISTORY_DAYS)), START, MONTH_OFFSET, FUTURE_DAYS)
+
+    assert result['month_to_date'][0] == pytest.approx(66.25)
+    # The ridge penalty pulls the trend slightly below the true 3.5 a week
+    assert 3.3 < result['trend_per_week'][0] <= 3.5
+    # Days 1-18 average 66.25 and the remaining 13 continue the line to 77
+    assert result['projected'][0] == pytest.approx((18 * 66.25 + 13 * 74.0) / 31, abs=0.1)
+    assert result['projected'][0] > result['month_to_date'][0]
+
+def test_noisy_series_gets_a_band_and_a_miss_probability():
+    noise = np.random.default_rng(7).normal(0, 5, HISTORY_DAYS)
+    row = history(80 + noise)
+
+    result = project_month_end(row, START, MONTH_OFFSET, FUTURE_DAYS, target=80)
+
+    assert result['lower'][0] < result['projected'][0] < result['upper'][0]
+    assert 0.0 < result['miss_probability'][0] < 1.0
+    wider = project_month_end(row, START, MONTH_OFFSET, FUTURE_DAYS, z=2.0, target=80)
+    assert wider['upper'][0] - wider['lower'][0] > result['upper'][0] - result['lower'][0]
+
+def test_last_day_of_the_month_is_settled():
+    result = project_month_end(history(50 + 0.5 * np.arange(HISTORY_DAYS)), START, MONTH_OFFSET, 0, target=70)
+
+    assert result['projected'][0] == pytest.approx(result['month_to_date'][0])
+    assert result['error'][0] == 0.0
+    assert result['miss_probability'][0] == 1.0
+
+def test_series_without_reports_has_no_projection():
+    result = project_month_end(history([np.nan] * HISTORY_DAYS, [80.0] * HISTORY_DAYS), START, MONTH_OFFSET, FUTURE_DAYS, target=95)
+
+    assert np.isnan(result['projected'][0])
+    assert np.isnan(result['month_to_date'][0])
+    assert result['history_reports'].tolist() == [0, HISTORY_DAYS]
+    assert result['projected'][1] == pytest.approx(80.0)
+
+def test_forecast_endpoint(client, login):
+    as_of = date(2026, 10, 18)
+    reader = login('85891')
+    for day in range(20):
+        report_date = (as_of - timedelta(days=day)).isoformat()
+        client.post('/api/reports', json={'itin': 'A1', 'report_date': report_date, 'percentage_attained': 70}, headers=reader)
+    client.post('/api/reports', json={'itin': 'B1', 'report_date': as_of.isoformat(), 'percentage_attained': 99}, headers=login('80909'))
+
+    body = client.get('/api/analytics/forecast', query_string={'as_of': as_of.isoformat(), 'target': 90}, headers=login('12345')).json
+
+    assert (body['month_end'], body['days_remaining']) == ('2026-10-31', 13)
+    readers = {entry['staff_number']: entry for entry in body['readers']}
+    assert readers['85891']['projected'] == pytest.approx(70.0)
+    assert readers['85891']['at_risk'] is True
+    # One report is too little history for a model; the month so far stands in
+    assert readers['80909']['insufficient_history'] is True
+    assert (readers['80909']['projected'], readers['80909']['lower'], readers['80909']['at_risk']) == (99.0, None, False)
+    assert body['readers_at_risk'] == 1
+    assert [entry['itin'] for entry in body['itins']] == ['A1', 'B1']
+
+def test_forecast_endpoint_validates_parameters(client, login):
+    supervisor = login('12345')
+
+    assert client.get('/api/analytics/forecast', query_string={'as_of': '18/10/2026'}, headers=supervisor).status_code == 400
+    assert client.get('/api/analytics/forecast', query_string={'confidence': 1.5}, headers=supervisor).status_code == 400
+    assert client.get('/api/analytics/forecast', headers=login('85891')).status_code == 403
@@ -0,0 +1,81 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from src.models.group_commit import GroupCommitWriter
+from src.models.sharding import region_session
+from src.models.user import Report
+
+def report_values(user_ids, itin='A1'):
+    return dict(itin=itin, report_date=date(2026, 10, 1), percentage_attained=80, staff_id=user_ids['85891'])
+
+def test_concurrent_writes_share_commits(app, user_ids):
+    writer = GroupCommitWriter(app, max_batch=16, max_wait=0.05)
+    batches = []
+    commit = writer._commit
+    writer._commit = lambda connection, batch: (batches.append(len(batch)), commit(connection, batch))
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        reports = list(pool.map(lambda i: writer.write(Report, **report_values(user_ids, f'I{i}')), range(32)))
+
+    assert len({report.id for report in reports}) == 32
+    assert sum(batches) == 32
+    assert len(batches) < 32
+
+def test_bad_row_only_fails_its_own_caller(app, user_ids):
+    writer = GroupCommitWriter(app, max_wait=0.05)
+    good = writer.submit(Report, **report_values(user_ids))
+    bad = writer.submit(Report, **dict(report_values(user_ids), itin=None))
+
+    assert good.result(timeout=5).id is not None
+    with pytest.raises(IntegrityError):
+        bad.result(timeout=5)
+    # The writer carries on after the failure
+    assert writer.write(Report, **report_values(user_ids)).id is not None
+
+def test_rows_the_writer_never_picked_up_are_handed_back(app, user_ids):
+    writer = GroupCommitWriter(app, max_batch=1, max_wait=0, timeout=0.2)
+    release = threading.Event()
+    commit = writer._commit
+
+    def stuck_commit(connection, batch):
+        release.wait(5)
+        commit(connection, batch)
+
+    writer._commit = stuck_commit
+    first = writer.submit(Report, **report_values(user_ids, 'first'))
+
+    # The writer is stuck on the first row, so this one is withdrawn for the caller to commit
+    assert writer.write(Report, **report_values(user_ids, 'second')) is None
+
+    release.set()
+    assert first.result(timeout=5).itin == 'first'
+    with app.app_context(), region_session('default') as session:
+        assert [itin for (itin,) in session.query(Report.itin).all()] == ['first']
+
+def test_writer_commits_into_its_region(app, user_ids):
+    writer = GroupCommitWriter(app, region='coast', max_wait=0)
+
+    writer.write(Report, **report_values(user_ids, 'coastal'))
+
+    with app.app_context():
+        with region_session('coast') as session:
+            assert [itin for (itin,) in session.query(Report.itin).all()] == ['coastal']
+        with region_session('default') as session:
+            assert session.query(Report).count() == 0
+
+def test_submissions_use_the_writer_when_enabled(app, client, login, user_ids, monkeypatch):
+    writer = GroupCommitWriter(app, max_wait=0)
+    written = []
+    write = writer.write
+    monkeypatch.setattr(writer, 'write', lambda model, **values: written.append(values['itin']) or write(model, **values))
+    monkeypatch.setitem(app.extensions, 'group_commit', {'default': writer})
+
+    response = client.post('/api/reports', json={'itin': 'G1', 'report_date': '2026-10-01', 'percentage_attained': 70}, headers=login('85891'))
+
+    assert response.status_code == 201
+    assert written == ['G1']
+    assert client.get(f"/api/reports/{response.json['report']['id']}", headers=login('85891')).json['itin'] == 'G1'
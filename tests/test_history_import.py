@@ -0,0 +1,86 @@
+import os
+from datetime import date
+
+import pytest
+from openpyxl import Workbook
+
+from src.models.history_import import insert_reports
+from src.models.sharding import DEFAULT_REGION, region_session
+from src.models.user import ImportedWorkbook, Report, db
+
+DAY = date(2025, 3, 3)
+
+@pytest.fixture
+def staff(user_ids):
+    return {'85891': (user_ids['85891'], DEFAULT_REGION), '80909': (user_ids['80909'], 'coast')}
+
+def row(staff_number, itin, report_date=DAY, percentage=80.0):
+    return (staff_number, itin, report_date, percentage, None, None, None)
+
+def stored(app, region):
+    with app.app_context(), region_session(region) as session:
+        return sorted((report.itin, report.report_date.isoformat()) for report in session.query(Report).all())
+
+def test_duplicates_are_skipped_within_and_across_chunks(app, staff):
+    rows = [row('85891', 'A1'), row('85891', 'A2'), row('85891', 'A1'), row('85891', 'A3'), row('85891', 'A2'), row('85891', 'A2', date(2025, 3, 4))]
+
+    with app.app_context():
+        imported, duplicate, rejected, touched, dates = insert_reports(rows, staff, 'Approved', chunk_size=2)
+        assert (imported, duplicate, rejected) == (4, 2, 0)
+        assert dates == {DAY, date(2025, 3, 4)}
+
+        # A rerun of the same rows only finds duplicates
+        assert insert_reports(rows, staff, 'Approved', chunk_size=2)[:3] == (0, 6, 0)
+
+    assert stored(app, DEFAULT_REGION) == [('A1', '2025-03-03'), ('A2', '2025-03-03'), ('A2', '2025-03-04'), ('A3', '2025-03-03')]
+
+def test_rows_go_to_their_readers_region_and_unknown_staff_are_rejected(app, staff):
+    with app.app_context():
+        imported, duplicate, rejected, touched, _ = insert_reports(
+            [row('85891', 'A1'), row('80909', 'A1'), row('11111', 'A1')], staff, 'Approved', chunk_size=1000
+        )
+
+    assert (imported, duplicate, rejected) == (2, 0, 1)
+    assert set(touched) == {DEFAULT_REGION, 'coast'}
+    assert stored(app, 'coast') == [('A1', '2025-03-03')]
+
+def write_workbook(path, *itins):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['Staff Number', 'ITIN', 'Report Date', 'Percentage Attained'])
+    for itin in itins:
+        sheet.append([85891, itin, '03/03/2025', 80])
+    workbook.save(path)
+
+def run_import(app, path, *args):
+    return app.test_cli_runner().invoke(args=['history', 'import', str(path), '--workers', '1', *args])
+
+def test_finished_workbooks_are_skipped_on_the_next_run(app, tmp_path):
+    path = tmp_path / 'readings_85891.xlsx'
+    write_workbook(path, 'A1', 'A2')
+
+    first = run_import(app, path)
+    assert '1 workbooks to import, 0 already imported' in first.output
+    assert 'Imported 2 reports (0 duplicates skipped' in first.output
+    with app.app_context():
+        record = db.session.query(ImportedWorkbook).one()
+        assert (record.path, record.rows_imported) == (os.path.abspath(path), 2)
+
+    assert '0 workbooks to import, 1 already imported' in run_import(app, path).output
+
+    # A workbook that changed since is read again; rows already stored count as duplicates
+    write_workbook(path, 'A1', 'A2', 'A3')
+    changed = run_import(app, path)
+    assert 'Imported 1 reports (2 duplicates skipped' in changed.output
+    with app.app_context():
+        assert db.session.query(ImportedWorkbook).one().rows_duplicate == 2
+
+def test_half_imported_workbook_resumes_without_duplicates(app, tmp_path, staff):
+    path = tmp_path / 'readings_85891.xlsx'
+    write_workbook(path, 'A1', 'A2', 'A3')
+    # An interrupted run stored some rows but never recorded the workbook
+    with app.app_context():
+        insert_reports([row('85891', 'A1')], staff, 'Approved', chunk_size=1000)
+
+    assert 'Imported 2 reports (1 duplicates skipped' in run_import(app, path).output
+    assert stored(app, DEFAULT_REGION) == [('A1', '2025-03-03'), ('A2', '2025-03-03'), ('A3', '2025-03-03')]
@@ -0,0 +1,132 @@
+from datetime import date
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from src.routes.itins import build_coverage_matrix, coverage_stats, day_offsets, fill_matrix, pivot_matrix
+
+NAN = np.nan
+
+def test_day_offsets_count_from_the_start_date():
+    assert day_offsets(['2026-10-01', '2026-10-03', '2026-09-30'], date(2026, 10, 1)).tolist() == [0, 2, -1]
+
+def test_pivot_averages_same_day_values_and_leaves_gaps_nan():
+    keys, matrix = pivot_matrix(['A', 'B', 'A', 'A'], np.array([0, 1, 0, 2]), np.array([60.0, 50.0, 80.0, 90.0]), 3)
+
+    assert keys.tolist() == ['A', 'B']
+    assert_array_equal(matrix, [[70.0, NAN, 90.0], [NAN, 50.0, NAN]])
+
+def test_pivot_keeps_keys_in_first_seen_order():
+    keys, _ = pivot_matrix(['C', 'A', 'B', 'A'], np.array([0, 0, 0, 1]), np.ones(4), 2)
+
+    assert keys.tolist() == ['C', 'A', 'B']
+
+def test_empty_coverage_matrix():
+    itins, matrix = build_coverage_matrix([], date(2026, 10, 1), 5)
+
+    assert itins.tolist() == []
+    assert matrix.shape == (0, 5)
+
+def test_fill_none_and_zero():
+    matrix = np.array([[NAN, 10.0, NAN]])
+
+    assert_array_equal(fill_matrix(matrix, 'none'), matrix)
+    assert_array_equal(fill_matrix(matrix, 'zero'), [[0.0, 10.0, 0.0]])
+
+def test_ffill_carries_the_last_report_forward_only():
+    matrix = np.array([[NAN, 10.0, NAN, 30.0, NAN], [5.0, NAN, NAN, NAN, NAN]])
+
+    assert_array_equal(fill_matrix(matrix, 'ffill'), [[NAN, 10.0, 10.0, 30.0, 30.0], [5.0, 5.0, 5.0, 5.0, 5.0]])
+
+def test_interpolate_is_linear_between_reports_and_flat_at_the_edges():
+    matrix = np.array([[NAN, 10.0, NAN, NAN, 40.0, NAN], [NAN, NAN, 7.0, NAN, NAN, NAN]])
+
+    assert_array_equal(fill_matrix(matrix, 'interpolate'), [[10.0, 10.0, 20.0, 30.0, 40.0, 40.0], [7.0] * 6])
+
+def test_fill_does_not_modify_the_input():
+    matrix = np.array([[NAN, 10.0, NAN]])
+    fill_matrix(matrix, 'interpolate')
+    fill_matrix(matrix, 'ffill')
+
+    assert_array_equal(matrix, [[NAN, 10.0, NAN]])
+
+def test_coverage_stats():
+    matrix = np.array([[NAN, 10.0, NAN, 30.0, NAN], [50.0, NAN, NAN, NAN, NAN]])
+
+    stats = coverage_stats(matrix)
+
+    assert stats['days_reported'].tolist() == [2, 1]
+    assert stats['days_missing'].tolist() == [3, 4]
+    assert stats['coverage'].tolist() == [0.4, 0.2]
+    assert stats['mean'].tolist() == [20.0, 50.0]
+    assert stats['min'].tolist() == [10.0, 50.0]
+    assert stats['max'].tolist() == [30.0, 50.0]
+    # Days 0, 2 and 4 are single gaps; the second row misses days 1-4
+    assert stats['longest_gap'].tolist() == [1, 4]
+    assert stats['last_reported'].tolist() == [3, 0]
+
+def submit(client, headers, itin, report_date, percentage):
+    response = client.post('/api/reports', json={'itin': itin, 'report_date': report_date, 'percentage_attained': percentage}, headers=headers)
+    assert response.status_code == 201, response.json
+
+def test_coverage_endpoint(client, login):
+    reader = login('85891')
+    submit(client, reader, 'A1', '2026-10-01', 70)
+    submit(client, reader, 'A1', '2026-10-01', 90)
+    submit(client, reader, 'A1', '2026-10-03', 60)
+    submit(client, login('80909'), 'B1', '2026-10-02', 50)
+
+    body = client.get('/api/itins/coverage', query_string={'start_date': '2026-10-01', 'end_date': '2026-10-03', 'fill': 'ffill', 'sort': 'itin'},
+                      headers=login('12345')).json
+
+    assert body['dates'] == ['2026-10-01', '2026-10-02', '2026-10-03']
+    assert body['itins'] == ['A1', 'B1']
+    assert body['matrix'] == [[80.0, 80.0, 60.0], [None, 50.0, 50.0]]
+    assert [(row['itin'], row['days_reported'], row['last_reported']) for row in body['stats']] == [('A1', 2, '2026-10-03'), ('B1', 1, '2026-10-02')]
+
+def test_coverage_endpoint_validates_parameters(client, login):
+    supervisor = login('12345')
+
+    assert client.get('/api/itins/coverage', query_string={'fill': 'mean'}, headers=supervisor).status_code == 400
+    assert client.get('/api/itins/coverage', query_string={'start_date': '2026-10-05', 'end_date': '2026-10-01'}, headers=supervisor).status_code == 400
+    assert client.get('/api/itins/coverage', query_string={'start_date': '01/10/2026'}, headers=supervisor).status_code == 400
+    for limit in (0, -1):
+        assert client.get('/api/itins/coverage', query_string={'limit': limit}, headers=supervisor).status_code == 400
+
+def test_limits_keep_the_first_rows(client, login):
+    reader = login('85891')
+    for itin, day in (('A1', '01'), ('A1', '02'), ('A1', '03'), ('B1', '01')):
+        submit(client, reader, itin, f'2026-10-{day}', 50)
+    supervisor = login('12345')
+
+    coverage = client.get('/api/itins/coverage', query_string={'start_date': '2026-10-01', 'end_date': '2026-10-03', 'sort': 'itin', 'limit': 1},
+                          headers=supervisor).json
+    assert coverage['itins'] == ['A1']
+    # History clamps instead: a negative limit must not become SQL's "no limit"
+    assert len(client.get('/api/itins/A1/reports', query_string={'limit': 2}, headers=supervisor).json) == 2
+    assert len(client.get('/api/itins/A1/reports', query_string={'limit': -1}, headers=supervisor).json) == 1
+
+def test_latest_and_history(client, login):
+    reader = login('85891')
+    submit(client, reader, 'A1', '2026-10-01', 70)
+    submit(client, reader, 'A1', '2026-10-03', 60)
+    submit(client, reader, 'B1', '2026-10-02', 50)
+    supervisor = login('12345')
+
+    latest = client.get('/api/itins/latest', headers=supervisor).json
+    assert [(report['itin'], report['report_date']) for report in latest] == [('A1', '2026-10-03'), ('B1', '2026-10-02')]
+    only_b = client.get('/api/itins/latest', query_string={'itin': 'B1'}, headers=supervisor).json
+    assert [report['itin'] for report in only_b] == ['B1']
+
+    history = client.get('/api/itins/A1/reports', headers=supervisor).json
+    assert [report['report_date'] for report in history] == ['2026-10-03', '2026-10-01']
+
+def test_roles_other_than_supervisor_and_engineer_only_see_their_own_reports(client, login):
+    submit(client, login('85891'), 'A1', '2026-10-01', 70)
+    back_office = login('85915')
+    submit(client, back_office, 'C1', '2026-10-01', 40)
+
+    coverage = client.get('/api/itins/coverage', query_string={'start_date': '2026-10-01', 'end_date': '2026-10-01'}, headers=back_office).json
+    assert coverage['itins'] == ['C1']
+    assert [report['itin'] for report in client.get('/api/itins/latest', headers=back_office).json] == ['C1']
+    assert client.get('/api/itins/A1/reports', headers=back_office).json == []
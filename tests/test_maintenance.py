@@ -0,0 +1,48 @@
+from datetime import date
+
+import pytest
+
+from src.models.sharding import region_session
+from src.models.user import Anomaly, Report
+
+@pytest.fixture
+def integrity(app):
+    def run(*args):
+        return app.test_cli_runner().invoke(args=['maintenance', 'integrity', *args])
+    return run
+
+def add_to_coast(app, *rows):
+    with app.app_context(), region_session('coast') as session:
+        session.add_all(rows)
+        session.commit()
+        return [row.id for row in rows]
+
+def test_shard_rows_pointing_at_primary_users_are_fine(app, client, login, move_to_region, integrity):
+    move_to_region(['85891'], 'coast')
+    response = client.post('/api/reports', json={'itin': 'A1', 'report_date': date.today().isoformat(), 'percentage_attained': 80}, headers=login('85891'))
+    assert response.status_code == 201
+
+    result = integrity()
+
+    assert result.exit_code == 0, result.output
+    assert '[coast] quick_check ok' in result.output
+    assert '[default] quick_check ok' in result.output
+
+def test_shard_rows_pointing_at_missing_primary_users_fail(app, user_ids, integrity):
+    add_to_coast(app, Report(itin='A1', report_date=date.today(), percentage_attained=80, staff_id=user_ids['85891']),
+                 Report(itin='A2', report_date=date.today(), percentage_attained=80, staff_id=99999))
+
+    result = integrity('--region', 'coast')
+
+    assert result.exit_code == 1
+    assert '[coast] report.staff_id references user.id values missing on the primary: 99999' in result.output
+    assert '[default]' not in result.output
+
+def test_orphans_within_a_shard_are_reported_by_row(app, user_ids, integrity):
+    [anomaly_id] = add_to_coast(app, Anomaly(type='Leak', staff_id=user_ids['85891'], report_id=12345))
+
+    result = integrity('--region', 'coast', '--full')
+
+    assert result.exit_code == 1
+    assert f'[coast] anomaly row {anomaly_id} references a missing report' in result.output
+    assert 'missing on the primary' not in result.output
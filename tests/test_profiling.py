@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+from src.routes import profiling
+
+@pytest.fixture(autouse=True)
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_DIR', str(tmp_path))
+    return tmp_path
+
+def profiled(headers):
+    return dict(headers, **{profiling.PROFILE_HEADER: '1'})
+
+def test_only_supervisors_and_engineers_can_profile(client, login, profile_dir):
+    for staff_number in ('85891', '85915'):
+        response = client.get('/api/reports', headers=profiled(login(staff_number)))
+        assert response.status_code == 200
+        assert 'X-Profile-Id' not in response.headers
+        assert client.get('/api/admin/profiles', headers=login(staff_number)).status_code == 403
+
+    assert os.listdir(profile_dir) == []
+
+def test_profiled_request_is_stored_with_its_sql(client, login):
+    supervisor = login('12345')
+    assert 'X-Profile-Id' not in client.get('/api/reports', headers=supervisor).headers
+
+    profile_id = client.get('/api/reports', headers=profiled(supervisor)).headers['X-Profile-Id']
+
+    assert [profile['id'] for profile in client.get('/api/admin/profiles', headers=supervisor).json] == [profile_id]
+    profile = client.get(f'/api/admin/profiles/{profile_id}', headers=login('67890')).json
+    assert (profile['path'], profile['status'], profile['staff_number']) == ('/api/reports', 200, '12345')
+    assert profile['sql_count'] == len(profile['sql']) > 0
+    assert all(set(statement) == {'statement', 'parameter_count', 'rows', 'duration_ms'} for statement in profile['sql'])
+    assert 'cumulative' in profile['top_functions']
+    assert client.get(f'/api/admin/profiles/{profile_id}/download', headers=supervisor).data
+
+def test_only_the_newest_profiles_are_kept(client, login, profile_dir, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_MAX_ENTRIES', 3)
+    supervisor = profiled(login('12345'))
+
+    ids = [client.get('/api/reports', headers=supervisor).headers['X-Profile-Id'] for _ in range(5)]
+
+    assert [profile['id'] for profile in profiling.list_profiles()] == ids[:1:-1]
+    assert sorted(os.listdir(profile_dir)) == sorted(f'{profile_id}.{extension}' for profile_id in ids[2:] for extension in ('json', 'prof'))
+    assert client.get(f'/api/admin/profiles/{ids[0]}', headers=supervisor).status_code == 404
@@ -0,0 +1,52 @@
+import gzip
+import json
+import zlib
+from datetime import date
+
+from src.routes.response_encoding import COMPRESS_MIN_BYTES
+
+TODAY = date.today().isoformat()
+
+def submit(client, headers, itin):
+    response = client.post('/api/reports', json={'itin': itin, 'report_date': TODAY, 'percentage_attained': 80}, headers=headers)
+    assert response.status_code == 201, response.json
+
+def test_columnar_shape_holds_the_same_reports(client, login):
+    reader = login('85891')
+    submit(client, reader, 'A1')
+    submit(client, reader, 'B1')
+
+    rows = client.get('/api/reports', headers=reader).json
+    columnar = client.get('/api/reports', query_string={'shape': 'columnar'}, headers=reader).json
+
+    assert columnar['count'] == 2
+    assert set(columnar['columns']) == set(rows[0])
+    assert [dict(zip(columnar['columns'], values)) for values in zip(*columnar['columns'].values())] == rows
+
+def test_empty_columnar_list(client, login):
+    assert client.get('/api/reports', query_string={'shape': 'columnar'}, headers=login('85891')).json == {'count': 0, 'columns': {}}
+
+def test_small_responses_are_not_compressed(client, login):
+    reader = login('85891')
+    submit(client, reader, 'A1')
+
+    response = client.get('/api/reports', headers=dict(reader, **{'Accept-Encoding': 'gzip'}))
+
+    assert len(response.data) < COMPRESS_MIN_BYTES
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+def test_large_responses_use_the_encoding_the_client_accepts(client, login):
+    reader = login('85891')
+    for i in range(10):
+        submit(client, reader, f'ITIN{i}')
+    plain = client.get('/api/reports', headers=reader)
+    assert len(plain.data) >= COMPRESS_MIN_BYTES and 'Content-Encoding' not in plain.headers
+
+    gzipped = client.get('/api/reports', headers=dict(reader, **{'Accept-Encoding': 'deflate;q=0.5, gzip'}))
+    deflated = client.get('/api/reports', headers=dict(reader, **{'Accept-Encoding': 'deflate'}))
+
+    assert gzipped.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(gzipped.data)) == plain.json
+    assert deflated.headers['Content-Encoding'] == 'deflate'
+    assert json.loads(zlib.decompress(deflated.data)) == plain.json
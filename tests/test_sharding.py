@@ -0,0 +1,109 @@
+import csv
+import io
+from datetime import date
+
+import pytest
+from openpyxl import load_workbook
+from sqlalchemy.exc import OperationalError
+
+from src.models.analytics import fan_out, region_read_session
+from src.models.sharding import region_session
+from src.models.user import Report
+from src.routes.export_service import build_snapshots, snapshot_periods
+
+TODAY = date.today().isoformat()
+
+@pytest.fixture
+def coast_team(move_to_region, create_user):
+    """85891 and a coast supervisor live in the coast region; everyone else in the primary"""
+    move_to_region(['85891'], 'coast')
+    create_user('44444', 'Supervisor', region='coast')
+
+def submit(client, headers, itin):
+    response = client.post('/api/reports', json={'itin': itin, 'report_date': TODAY, 'percentage_attained': 80}, headers=headers)
+    assert response.status_code == 201, response.json
+    return response.json['report']['id']
+
+def region_itins(app, region):
+    with app.app_context(), region_session(region) as session:
+        return sorted(itin for (itin,) in session.query(Report.itin).all())
+
+def test_reports_are_stored_in_the_readers_region(app, client, login, coast_team):
+    submit(client, login('85891'), 'COAST')
+    submit(client, login('80909'), 'MAIN')
+
+    assert region_itins(app, 'coast') == ['COAST']
+    assert region_itins(app, 'default') == ['MAIN']
+
+def test_supervisors_only_see_their_region(client, login, coast_team):
+    submit(client, login('85891'), 'COAST')
+    submit(client, login('80909'), 'MAIN')
+
+    assert [report['itin'] for report in client.get('/api/reports', headers=login('44444')).json] == ['COAST']
+    assert [report['itin'] for report in client.get('/api/reports', headers=login('12345')).json] == ['MAIN']
+
+def test_commercial_engineers_see_every_region(client, login, coast_team):
+    submit(client, login('85891'), 'COAST')
+    submit(client, login('80909'), 'MAIN')
+    client.post('/api/anomalies', json={'type': 'Leak'}, headers=login('85891'))
+    engineer = login('67890')
+    download = client.get('/api/reports/download', query_string={'format': 'csv'}, headers=engineer)
+
+    assert sorted(row['ITIN'] for row in csv.DictReader(io.StringIO(download.data.decode()))) == ['COAST', 'MAIN']
+    assert client.get('/api/dashboard/supervisor', headers=engineer).json['total_reports'] == 2
+    assert client.get('/api/dashboard/supervisor', headers=login('12345')).json['total_reports'] == 1
+    assert client.get('/api/dashboard/supervisor', headers=login('12345')).json['total_anomalies'] == 0
+
+def test_ids_are_per_region(client, login, coast_team):
+    coast_id = submit(client, login('85891'), 'COAST')
+    main_id = submit(client, login('80909'), 'MAIN')
+
+    assert coast_id == main_id
+    assert client.get(f'/api/reports/{coast_id}', headers=login('85891')).json['itin'] == 'COAST'
+    assert client.get(f'/api/reports/{main_id}', headers=login('80909')).json['itin'] == 'MAIN'
+
+def test_other_regions_never_get_the_primary_snapshot(app, client, login, coast_team):
+    submit(client, login('85891'), 'COAST')
+    submit(client, login('80909'), 'MAIN')
+    with app.app_context():
+        assert build_snapshots()
+
+    start, end = snapshot_periods()['this_month']
+    query = {'format': 'csv', 'start_date': start.isoformat(), 'end_date': end.isoformat()}
+    coast = client.get('/api/reports/download', query_string=query, headers=login('44444'))
+    main = client.get('/api/reports/download', query_string=query, headers=login('12345'))
+
+    assert [row['ITIN'] for row in csv.DictReader(io.StringIO(coast.data.decode()))] == ['COAST']
+    assert [row['ITIN'] for row in csv.DictReader(io.StringIO(main.data.decode()))] == ['MAIN']
+    # The primary's own supervisor is served the snapshot
+    assert main.headers.get('ETag')
+    assert not coast.headers.get('ETag')
+
+def test_fan_out_returns_results_in_region_order(app, client, login, coast_team):
+    submit(client, login('85891'), 'COAST')
+    with app.app_context():
+        counts = fan_out(lambda session, region: (region, session.query(Report).count()))
+
+    assert counts == [('default', 0), ('coast', 1)]
+
+@pytest.mark.parametrize('region', ['default', 'coast'])
+def test_read_sessions_refuse_writes(app, user_ids, region):
+    with app.app_context():
+        session = region_read_session(region)
+        session.add(Report(itin='X', report_date=date.today(), percentage_attained=1, staff_id=user_ids['85891']))
+        with pytest.raises(OperationalError):
+            session.commit()
+        session.close()
+
+def test_commercial_engineers_report_pack_covers_every_region(client, login, coast_team):
+    submit(client, login('85891'), 'COAST')
+    submit(client, login('80909'), 'MAIN')
+    client.post('/api/anomalies', json={'type': 'Leak'}, headers=login('85891'))
+    query = {'start_date': TODAY, 'end_date': TODAY}
+
+    engineer = load_workbook(io.BytesIO(client.get('/api/reports/pack', query_string=query, headers=login('67890')).data))
+    coast = load_workbook(io.BytesIO(client.get('/api/reports/pack', query_string=query, headers=login('44444')).data))
+
+    assert engineer.sheetnames == ['Summary', 'Reader 80909', 'Reader 85891', 'Anomalies', 'Escalations']
+    assert [row[4] for row in engineer['Summary'].iter_rows(min_row=2, values_only=True)] == [0, 1]
+    assert coast.sheetnames == ['Summary', 'Reader 85891', 'Anomalies', 'Escalations']
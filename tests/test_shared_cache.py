@@ -0,0 +1,138 @@
+import threading
+import time
+from datetime import date
+
+import pytest
+
+from src.models.shared_cache import DATA_VERSION, REPORTS_VERSION, SharedCache, shared_cache
+from src.models.user import Report, db
+
+TODAY = date.today().isoformat()
+
+@pytest.fixture
+def cache(tmp_path):
+    return SharedCache(str(tmp_path / 'cache.db'), namespace='test:', lock_timeout=0.3)
+
+def test_entries_expire_after_their_ttl(cache):
+    cache.set('short', {'a': 1}, ttl=0.1)
+    cache.set('long', {'a': 2}, ttl=60)
+    assert cache.get('short') == {'a': 1}
+
+    time.sleep(0.15)
+
+    assert cache.get('short') is None
+    assert cache.get('long') == {'a': 2}
+
+def test_least_recently_used_entries_are_evicted_first(cache):
+    value = 'x' * 100
+    cache.max_bytes = 350
+    for key in ('a', 'b', 'c'):
+        cache.set(key, value, ttl=60)
+    # Age every entry, then read one so it becomes the most recently used
+    cache._connect().execute('UPDATE cache_entry SET accessed_at = accessed_at - 10')
+    assert cache.get('a') == value
+
+    cache.set('d', value, ttl=60)
+
+    assert [key for key in 'abcd' if cache.get(key) is not None] == ['a', 'c', 'd']
+
+def test_versions_are_per_name_and_namespace(cache, tmp_path):
+    other = SharedCache(str(tmp_path / 'cache.db'), namespace='other:')
+    cache.bump()
+    cache.bump()
+    cache.bump(REPORTS_VERSION)
+
+    assert (cache.version(DATA_VERSION), cache.version(REPORTS_VERSION), other.version()) == (2, 1, 0)
+    other.set('key', 'theirs', ttl=60)
+    assert cache.get('key') is None
+
+def test_value_is_computed_once(cache):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {'n': len(calls)}
+
+    assert cache.get_or_compute('k', 60, compute) == {'n': 1}
+    assert cache.get_or_compute('k', 60, compute) == {'n': 1}
+    assert len(calls) == 1
+
+def test_waiting_worker_takes_the_winners_result(cache):
+    cache._connect().execute('INSERT INTO cache_lock (key, expires_at) VALUES (?, ?)', ('test:k', time.time() + 60))
+    # Another worker holds the lock and stores its result shortly
+    threading.Timer(0.1, lambda: SharedCache(cache.path, namespace='test:').set('k', 'from the winner', ttl=60)).start()
+
+    assert cache.get_or_compute('k', 60, lambda: 'computed here') == 'from the winner'
+
+def test_stuck_lock_falls_back_to_computing(cache):
+    cache._connect().execute('INSERT INTO cache_lock (key, expires_at) VALUES (?, ?)', ('test:k', time.time() + 60))
+
+    started = time.monotonic()
+    assert cache.get_or_compute('k', 60, lambda: 'computed here') == 'computed here'
+    assert time.monotonic() - started >= cache.lock_timeout
+
+def test_broken_cache_file_computes_directly(cache):
+    cache._connect().execute('DROP TABLE cache_entry')
+
+    assert cache.get_or_compute('k', 60, lambda: 'computed here') == 'computed here'
+
+def submit(client, headers, itin='A1'):
+    response = client.post('/api/reports', json={'itin': itin, 'report_date': TODAY, 'percentage_attained': 80}, headers=headers)
+    assert response.status_code == 201, response.json
+
+def total_reports(client, headers):
+    return client.get('/api/dashboard/supervisor', headers=headers).json['total_reports']
+
+def test_commits_invalidate_cached_payloads(app, client, login):
+    supervisor = login('12345')
+    submit(client, login('85891'))
+    assert total_reports(client, supervisor) == 1
+    with app.app_context():
+        version = shared_cache().version()
+
+    submit(client, login('80909'))
+
+    with app.app_context():
+        assert shared_cache().version() > version
+    assert total_reports(client, supervisor) == 2
+
+def test_rolled_back_writes_keep_the_version(app, user_ids):
+    with app.app_context():
+        versions = (shared_cache().version(), shared_cache().version(REPORTS_VERSION))
+        db.session.add(Report(itin='A1', report_date=date.today(), percentage_attained=1, staff_id=user_ids['85891']))
+        db.session.flush()
+        db.session.rollback()
+
+        assert (shared_cache().version(), shared_cache().version(REPORTS_VERSION)) == versions
+
+def test_regions_never_share_a_payload(client, login, move_to_region, create_user):
+    move_to_region(['85891'], 'coast')
+    create_user('44444', 'Supervisor', region='coast')
+    coast, main = login('44444'), login('12345')
+    submit(client, login('85891'))
+    assert (total_reports(client, coast), total_reports(client, main)) == (1, 0)
+
+    # A write in one region is seen there and leaves the other's payload correct
+    submit(client, login('85891'))
+    submit(client, login('80909'))
+    submit(client, login('80909'))
+    submit(client, login('80909'))
+
+    assert (total_reports(client, coast), total_reports(client, main)) == (2, 3)
+
+def test_team_supervisors_never_share_a_payload(client, login, user_ids, create_user):
+    south_id = create_user('22222', 'Supervisor')
+    engineer = login('67890')
+    north = client.post('/api/teams', json={'name': 'North', 'supervisor_id': user_ids['12345'], 'member_ids': [user_ids['85891']]}, headers=engineer).json['team']['id']
+    south = client.post('/api/teams', json={'name': 'South', 'supervisor_id': south_id, 'member_ids': [user_ids['80909']]}, headers=engineer).json['team']['id']
+    north_supervisor, south_supervisor = login('12345'), login('22222')
+    submit(client, login('85891'))
+    submit(client, login('80909'))
+    submit(client, login('80909'))
+    assert (total_reports(client, north_supervisor), total_reports(client, south_supervisor)) == (1, 2)
+
+    # Moving a reader between teams invalidates both cached team payloads
+    client.put(f'/api/teams/{south}', json={'member_ids': []}, headers=engineer)
+    client.put(f'/api/teams/{north}', json={'member_ids': [user_ids['85891'], user_ids['80909']]}, headers=engineer)
+
+    assert (total_reports(client, north_supervisor), total_reports(client, south_supervisor)) == (3, 0)
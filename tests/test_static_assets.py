@@ -0,0 +1,71 @@
+import gzip
+import hashlib
+
+import pytest
+
+from src.routes.static_assets import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, asset_response, build_asset_manifest
+
+SCRIPT = b'console.log("meter readings");\n' * 20
+IMAGE = bytes(range(256))
+
+@pytest.fixture
+def manifest(tmp_path):
+    (tmp_path / 'js').mkdir()
+    (tmp_path / 'js' / 'app.js').write_bytes(SCRIPT)
+    (tmp_path / 'js' / 'app.js.gz').write_bytes(gzip.compress(SCRIPT))
+    (tmp_path / 'logo.png').write_bytes(IMAGE)
+    (tmp_path / 'index.html').write_text('<script src="/js/app.js"></script><img src="/logo.png">')
+    return build_asset_manifest(str(tmp_path))
+
+def hashed(name, content):
+    base, extension = name.rsplit('.', 1)
+    return f"{base}.{hashlib.sha256(content).hexdigest()[:10]}.{extension}"
+
+def test_assets_are_served_under_content_hashed_names(manifest):
+    script, image = hashed('js/app.js', SCRIPT), hashed('logo.png', IMAGE)
+
+    assert sorted(manifest) == sorted(['index.html', 'js/app.js', script, 'logo.png', image])
+    assert manifest[script]['immutable'] and not manifest['js/app.js']['immutable']
+    assert manifest[script]['body'] == manifest['js/app.js']['body'] == SCRIPT
+    assert manifest['index.html']['body'].decode() == f'<script src="/{script}"></script><img src="/{image}">'
+
+def test_only_compressible_types_that_shrink_are_precompressed(manifest):
+    assert gzip.decompress(manifest['js/app.js']['gzip']) == SCRIPT
+    assert manifest['logo.png']['gzip'] is None
+
+def test_missing_static_folder_gives_an_empty_manifest(tmp_path):
+    assert build_asset_manifest(str(tmp_path / 'missing')) == {}
+    assert build_asset_manifest(None) == {}
+
+def serve(app, asset, **headers):
+    with app.test_request_context(headers=headers):
+        return asset_response(asset)
+
+def test_gzip_is_negotiated_and_has_its_own_etag(app, manifest):
+    asset = manifest[hashed('js/app.js', SCRIPT)]
+
+    plain = serve(app, asset)
+    compressed = serve(app, asset, **{'Accept-Encoding': 'gzip, deflate'})
+
+    assert 'Content-Encoding' not in plain.headers and plain.get_data() == SCRIPT
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.get_data()) == SCRIPT
+    assert compressed.headers['ETag'] != plain.headers['ETag']
+    assert compressed.headers['Vary'] == plain.headers['Vary'] == 'Accept-Encoding'
+    assert compressed.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+
+def test_revalidated_assets_answer_not_modified(app, manifest):
+    asset = manifest['index.html']
+    etag = serve(app, asset).headers['ETag']
+
+    response = serve(app, asset, **{'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.headers['Cache-Control'] == REVALIDATE_CACHE_CONTROL
+
+def test_app_serves_the_index_for_unknown_paths(client):
+    response = client.get('/some/client/route')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/html'
+    assert client.get('/favicon.ico').headers['Cache-Control'] == REVALIDATE_CACHE_CONTROL
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+
+from src.models.user import Report, Tombstone, db
+from src.routes.sync import SYNC_SAFETY_WINDOW
+
+def submit(client, headers, itin, percentage=80):
+    response = client.post('/api/reports', json={'itin': itin, 'report_date': '2026-10-01', 'percentage_attained': percentage}, headers=headers)
+    assert response.status_code == 201, response.json
+    return response.json['report']['id']
+
+def test_first_sync_returns_own_rows_and_a_cursor(client, login):
+    reader = login('85891')
+    submit(client, reader, 'A1')
+    submit(client, login('80909'), 'B1')
+
+    body = client.get('/api/sync', headers=reader).json
+
+    assert [report['itin'] for report in body['reports']] == ['A1']
+    assert body['escalations'] == []
+    assert body['cursor'] is not None
+
+def test_supervisors_sync_every_reader(client, login):
+    submit(client, login('85891'), 'A1')
+    submit(client, login('80909'), 'B1')
+
+    body = client.get('/api/sync', headers=login('12345')).json
+
+    assert sorted(report['itin'] for report in body['reports']) == ['A1', 'B1']
+
+def test_row_committed_late_inside_the_safety_window_is_returned(app, client, login):
+    reader = login('85891')
+    submit(client, reader, 'A1')
+    cursor = client.get('/api/sync', headers=reader).json['cursor']
+
+    # A transaction that flushed before the cursor was handed out but committed after it
+    late_id = submit(client, reader, 'A2')
+    with app.app_context():
+        stamp = datetime.fromisoformat(cursor) - SYNC_SAFETY_WINDOW / 2
+        db.session.execute(Report.__table__.update().where(Report.id == late_id).values(updated_at=stamp))
+        db.session.commit()
+
+    body = client.get('/api/sync', headers=reader, query_string={'since': cursor}).json
+
+    assert late_id in [report['id'] for report in body['reports']]
+
+def test_rows_older_than_the_safety_window_are_not_resent(app, client, login):
+    reader = login('85891')
+    old_id = submit(client, reader, 'A1')
+    with app.app_context():
+        stamp = datetime.utcnow() - SYNC_SAFETY_WINDOW - timedelta(minutes=5)
+        db.session.execute(Report.__table__.update().where(Report.id == old_id).values(updated_at=stamp))
+        db.session.commit()
+
+    body = client.get('/api/sync', headers=reader, query_string={'since': datetime.utcnow().isoformat()}).json
+
+    assert body['reports'] == []
+
+def test_cursor_never_moves_backwards(client, login):
+    reader = login('85891')
+    submit(client, reader, 'A1')
+    since = (datetime.utcnow() + timedelta(minutes=1)).isoformat()
+
+    body = client.get('/api/sync', headers=reader, query_string={'since': since}).json
+
+    assert body['cursor'] == since
+
+def test_deleted_rows_come_back_as_tombstones(app, client, login):
+    reader = login('85891')
+    report_id = submit(client, reader, 'A1')
+    cursor = client.get('/api/sync', headers=reader).json['cursor']
+
+    with app.app_context():
+        db.session.delete(db.session.get(Report, report_id))
+        db.session.commit()
+        assert Tombstone.query.filter_by(row_id=report_id).count() == 1
+
+    body = client.get('/api/sync', headers=reader, query_string={'since': cursor}).json
+
+    assert [(row['table'], row['id']) for row in body['deleted']] == [('reports', report_id)]
+
+def test_other_readers_tombstones_are_not_synced(app, client, login):
+    report_id = submit(client, login('80909'), 'B1')
+    with app.app_context():
+        db.session.delete(db.session.get(Report, report_id))
+        db.session.commit()
+
+    body = client.get('/api/sync', headers=login('85891')).json
+
+    assert body['deleted'] == []
+
+def test_invalid_cursor_is_rejected(client, login):
+    response = client.get('/api/sync', headers=login('85891'), query_string={'since': 'yesterday'})
+
+    assert response.status_code == 400
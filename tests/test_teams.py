@@ -0,0 +1,124 @@
+import hashlib
+from datetime import date
+
+import pytest
+
+from src.models.teams import compute_scope
+
+def test_supervisor_sees_themselves_and_their_members():
+    assert compute_scope({1: (None, 10)}, {1: [100, 101]}) == {(10, 10), (10, 100), (10, 101)}
+
+def test_scope_reaches_every_nested_team():
+    teams = {1: (None, 10), 2: (1, None), 3: (2, 30)}
+    members = {1: [100], 2: [200], 3: [300]}
+
+    scope = compute_scope(teams, members)
+
+    assert {reader for supervisor, reader in scope if supervisor == 10} == {10, 100, 200, 300}
+    assert {reader for supervisor, reader in scope if supervisor == 30} == {30, 300}
+
+def test_teams_without_a_supervisor_add_no_rows():
+    assert compute_scope({1: (None, None)}, {1: [100]}) == set()
+
+def test_a_looped_hierarchy_still_terminates():
+    assert compute_scope({1: (2, 10), 2: (1, None)}, {1: [100], 2: [200]}) == {(10, 10), (10, 100), (10, 200)}
+
+@pytest.fixture
+def teams(client, login, user_ids, create_user):
+    """North (12345) holds 85891 and 80909 with North-A (86002) below it; South (22222) holds 53050 and 84184"""
+    ids = dict(user_ids, **{number: create_user(number, 'Supervisor') for number in ('22222', '33333')})
+    engineer = login('67890')
+
+    def create(body):
+        response = client.post('/api/teams', json=body, headers=engineer)
+        assert response.status_code == 201, response.json
+        return response.json['team']['id']
+
+    north = create({'name': 'North', 'supervisor_id': ids['12345'], 'member_ids': [ids['85891'], ids['80909']]})
+    create({'name': 'North-A', 'parent_id': north, 'member_ids': [ids['86002']]})
+    create({'name': 'South', 'supervisor_id': ids['22222'], 'member_ids': [ids['53050'], ids['84184']]})
+    return {'north': north, 'ids': ids}
+
+READERS = ('85891', '80909', '86002', '53050', '84184')
+TODAY = date.today().isoformat()
+NORTH = ['80909', '85891', '86002']
+SOUTH = ['53050', '84184']
+
+@pytest.fixture
+def readings(client, login, teams):
+    """One report and one anomaly from every reader; returns the anomaly ids by staff number"""
+    anomalies = {}
+    for number in READERS:
+        headers = login(number)
+        response = client.post('/api/reports', json={'itin': f'I{number}', 'report_date': TODAY, 'percentage_attained': 80}, headers=headers)
+        assert response.status_code == 201, response.json
+        anomalies[number] = client.post('/api/anomalies', json={'type': 'Leak'}, headers=headers).json['anomaly']['id']
+    return anomalies
+
+def staff_numbers(rows):
+    return sorted(row['staff_number'] for row in rows)
+
+def test_only_engineers_manage_teams(client, login):
+    assert client.post('/api/teams', json={'name': 'X'}, headers=login('12345')).status_code == 403
+
+def test_a_team_cannot_be_nested_inside_itself(client, login, teams):
+    nested = client.get('/api/teams', headers=login('67890')).json
+    child = next(team['id'] for team in nested if team['name'] == 'North-A')
+
+    assert client.put(f"/api/teams/{teams['north']}", json={'parent_id': child}, headers=login('67890')).status_code == 400
+
+def test_reports_and_anomalies_are_limited_to_the_team(client, login, readings):
+    for supervisor, expected in (('12345', NORTH), ('22222', SOUTH)):
+        headers = login(supervisor)
+        assert staff_numbers(client.get('/api/reports', headers=headers).json) == expected
+        assert staff_numbers(client.get('/api/anomalies', headers=headers).json) == expected
+        assert client.get('/api/dashboard/supervisor', headers=headers).json['total_reports'] == len(expected)
+
+def test_supervisors_without_a_team_and_engineers_see_everyone(client, login, readings):
+    everyone = sorted(READERS)
+
+    assert staff_numbers(client.get('/api/reports', headers=login('33333')).json) == everyone
+    assert staff_numbers(client.get('/api/reports', headers=login('67890')).json) == everyone
+
+def test_reports_outside_the_team_are_hidden(client, login, readings):
+    south_report = client.get('/api/reports', headers=login('53050')).json[0]['id']
+
+    assert client.get(f'/api/reports/{south_report}', headers=login('12345')).status_code == 403
+    assert client.get(f'/api/reports/{south_report}', headers=login('22222')).status_code == 200
+
+def test_moving_a_member_moves_their_rows(client, login, readings, teams):
+    ids = teams['ids']
+    response = client.put(f"/api/teams/{teams['north']}", json={'member_ids': [ids['85891'], ids['53050']]}, headers=login('67890'))
+    assert response.status_code == 200, response.json
+
+    assert staff_numbers(client.get('/api/reports', headers=login('12345')).json) == ['53050', '85891', '86002']
+    assert staff_numbers(client.get('/api/reports', headers=login('22222')).json) == ['84184']
+
+def test_sync_is_limited_to_the_team(client, login, readings):
+    body = client.get('/api/sync', headers=login('22222')).json
+
+    assert staff_numbers(body['reports']) == SOUTH
+    assert staff_numbers(body['anomalies']) == SOUTH
+
+def test_itins_are_limited_to_the_team(client, login, readings):
+    headers = login('22222')
+    coverage = client.get('/api/itins/coverage', query_string={'start_date': TODAY, 'end_date': TODAY}, headers=headers).json
+
+    assert sorted(coverage['itins']) == ['I53050', 'I84184']
+    assert sorted(report['itin'] for report in client.get('/api/itins/latest', headers=headers).json) == ['I53050', 'I84184']
+    assert client.get('/api/itins/I85891/reports', headers=headers).json == []
+
+def test_attachments_are_limited_to_the_team(client, login, readings):
+    content = b'photo'
+    body = {'filename': 'leak.jpg', 'size': len(content), 'sha256': hashlib.sha256(content).hexdigest()}
+
+    assert client.post(f"/api/anomalies/{readings['85891']}/attachments", json=body, headers=login('22222')).status_code == 403
+    response = client.post(f"/api/anomalies/{readings['53050']}/attachments", json=body, headers=login('22222'))
+    assert response.status_code == 201, response.json
+    assert client.get(f"/api/attachments/{response.json['attachment']['id']}", headers=login('12345')).status_code == 403
+
+def test_anomaly_sla_is_limited_to_the_team(client, login, readings):
+    body = client.get('/api/analytics/anomaly-sla', headers=login('12345')).json
+
+    assert body['total'] == len(NORTH)
+    assert sorted(row['reader'] for row in body['by_reader']) == NORTH
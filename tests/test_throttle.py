@@ -0,0 +1,102 @@
+import pytest
+
+from src.routes import throttle
+from src.routes.throttle import TokenBucketLimiter, try_acquire_all
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Manual time.monotonic for the throttle module"""
+    now = [1000.0]
+    monkeypatch.setattr(throttle.time, 'monotonic', lambda: now[0])
+    return now
+
+def test_burst_is_allowed_then_refused(clock):
+    limiter = TokenBucketLimiter(capacity=3, refill_per_second=1)
+
+    assert [limiter.try_acquire('a') for _ in range(3)] == [0, 0, 0]
+    assert limiter.try_acquire('a') == pytest.approx(1.0)
+
+def test_tokens_refill_over_time(clock):
+    limiter = TokenBucketLimiter(capacity=2, refill_per_second=0.5)
+    limiter.try_acquire('a')
+    limiter.try_acquire('a')
+
+    clock[0] += 1
+    assert limiter.try_acquire('a') == pytest.approx(1.0)
+    clock[0] += 1
+    assert limiter.try_acquire('a') == 0
+
+def test_refill_is_capped_at_capacity(clock):
+    limiter = TokenBucketLimiter(capacity=2, refill_per_second=1)
+    clock[0] += 3600
+
+    assert [limiter.try_acquire('a') for _ in range(3)][-1] > 0
+
+def test_keys_have_separate_buckets(clock):
+    limiter = TokenBucketLimiter(capacity=1, refill_per_second=1)
+
+    assert limiter.try_acquire('a') == 0
+    assert limiter.try_acquire('b') == 0
+    assert limiter.try_acquire('a') > 0
+
+def test_refused_attempt_charges_no_bucket(clock):
+    by_ip = TokenBucketLimiter(capacity=5, refill_per_second=1)
+    by_staff = TokenBucketLimiter(capacity=1, refill_per_second=1)
+    assert try_acquire_all((by_ip, 'ip'), (by_staff, 'staff')) == 0
+
+    for _ in range(3):
+        assert try_acquire_all((by_ip, 'ip'), (by_staff, 'staff')) > 0
+
+    # Only the first attempt was charged to the IP
+    assert [by_ip.try_acquire('ip') for _ in range(5)] == [0, 0, 0, 0, 1.0]
+
+def test_wait_is_the_longest_of_the_empty_buckets(clock):
+    fast = TokenBucketLimiter(capacity=1, refill_per_second=1)
+    slow = TokenBucketLimiter(capacity=1, refill_per_second=0.1)
+    try_acquire_all((fast, 'k'), (slow, 'k'))
+
+    assert try_acquire_all((fast, 'k'), (slow, 'k')) == pytest.approx(10.0)
+
+def test_least_recently_used_bucket_is_evicted(clock):
+    limiter = TokenBucketLimiter(capacity=2, refill_per_second=0.001, max_keys=2)
+    limiter.try_acquire('a')
+    limiter.try_acquire('b')
+    limiter.try_acquire('a')
+    # b is now the least recently charged and makes room for c
+    limiter.try_acquire('c')
+
+    assert list(limiter._buckets) == ['a', 'c']
+    assert limiter.try_acquire('a') > 0
+    assert limiter.try_acquire('b') == 0
+
+def test_reset_restores_a_full_bucket(clock):
+    limiter = TokenBucketLimiter(capacity=1, refill_per_second=0.001)
+    limiter.try_acquire('a')
+    limiter.reset('a')
+
+    assert limiter.try_acquire('a') == 0
+
+def test_login_is_throttled_per_staff_number(client, monkeypatch):
+    monkeypatch.setattr(throttle.login_limiter_by_staff, 'capacity', 3.0)
+    throttle.login_limiter_by_staff.reset('login:85891')
+
+    statuses = [client.post('/api/login', json={'staff_number': '85891', 'pin': '0000'}).status_code for _ in range(4)]
+
+    assert statuses == [401, 401, 401, 429]
+    refused = client.post('/api/login', json={'staff_number': '85891', 'pin': '8589'})
+    assert refused.status_code == 429
+    assert int(refused.headers['Retry-After']) >= 1
+    # Another staff number from the same address is unaffected
+    assert client.post('/api/login', json={'staff_number': '80909', 'pin': '8090'}).status_code == 200
+    throttle.login_limiter_by_staff.reset('login:85891')
+
+def test_successful_login_clears_the_staff_bucket(client, monkeypatch):
+    monkeypatch.setattr(throttle.login_limiter_by_staff, 'capacity', 3.0)
+    throttle.login_limiter_by_staff.reset('login:85891')
+    for _ in range(2):
+        client.post('/api/login', json={'staff_number': '85891', 'pin': '0000'})
+
+    assert client.post('/api/login', json={'staff_number': '85891', 'pin': '8589'}).status_code == 200
+    statuses = [client.post('/api/login', json={'staff_number': '85891', 'pin': '0000'}).status_code for _ in range(3)]
+    assert statuses == [401, 401, 401]
+    throttle.login_limiter_by_staff.reset('login:85891')